@@ -0,0 +1,208 @@
+"""Analytics over the columnar expense store for the Personal Budget Tracker.
+
+With NumPy installed the store's typed arrays are read in place through the
+buffer protocol and every query is vectorized; without it the same queries
+run as plain Python loops. Both paths add up values in the same order, so
+they return the same numbers. The views only live for the duration of a
+call, so the store's arrays stay free to grow.
+"""
+import heapq
+import importlib.util
+from datetime import date
+from itertools import accumulate
+
+from budget_columns import day_ordinal, day_text
+
+# NumPy is optional and slow to import, so it is only loaded on first use
+NUMPY = importlib.util.find_spec('numpy') is not None
+np = None
+
+UNIX_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def load_numpy():
+    global NUMPY, np
+    if NUMPY and np is None:
+        try:
+            import numpy as np
+        except ImportError:
+            NUMPY = False
+    return NUMPY
+
+
+def _month_label(months_since_1970):
+    return f"{1970 + months_since_1970 // 12:04d}-{months_since_1970 % 12 + 1:02d}"
+
+
+def _month_of(ordinal):
+    d = date.fromordinal(ordinal)
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def _percentile(ordered, q):
+    # Linear interpolation between closest ranks, as numpy.percentile does
+    pos = (len(ordered) - 1) * q / 100
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+class Analytics:
+    """Pivots, percentiles, rolling averages and top-N over a ColumnarExpenses.
+
+    Every query takes optional start/end dates ('YYYY-MM-DD', inclusive)
+    and most a category. Pass use_numpy=False to force the pure-Python path.
+    """
+
+    def __init__(self, expenses, use_numpy=True):
+        self.expenses = expenses
+        self.use_numpy = use_numpy and load_numpy()
+
+    # Row selection
+
+    def _bounds(self, start, end):
+        return (day_ordinal(start) if start else None), (day_ordinal(end) if end else None)
+
+    def _mask(self, start=None, end=None, category=None):
+        """NumPy path: (amounts, days, cats) views and a boolean mask or None"""
+        e = self.expenses
+        amounts = np.frombuffer(e.amounts, dtype=np.float64) if len(e) else np.zeros(0)
+        days = np.frombuffer(e.days, dtype=np.int32) if len(e) else np.zeros(0, np.int32)
+        cats = np.frombuffer(e.cats, dtype=np.uint32) if len(e) else np.zeros(0, np.uint32)
+        first, last = self._bounds(start, end)
+        mask = None
+        if first is not None:
+            mask = days >= first
+        if last is not None:
+            mask = days <= last if mask is None else mask & (days <= last)
+        if category:
+            code = e.category_codes.get(category)
+            selected = cats == code if code is not None else np.zeros(len(cats), bool)
+            mask = selected if mask is None else mask & selected
+        return amounts, days, cats, mask
+
+    def _positions(self, start=None, end=None, category=None):
+        """Pure-Python path: positions of the selected rows, in store order"""
+        e = self.expenses
+        first, last = self._bounds(start, end)
+        code = e.category_codes.get(category, -1) if category else None
+        return [i for i, (day, cat) in enumerate(zip(e.days, e.cats))
+                if (first is None or day >= first) and (last is None or day <= last)
+                and (code is None or cat == code)]
+
+    # Queries
+
+    def category_month_pivot(self, start=None, end=None):
+        """(months, categories, table) with table[c][m] the total spent in
+        categories[c] during months[m]; only months and categories with
+        expenses are included, both in ascending order"""
+        e = self.expenses
+        names = e.category_names
+        if self.use_numpy:
+            amounts, days, cats, mask = self._mask(start, end)
+            if mask is not None:
+                amounts, days, cats = amounts[mask], days[mask], cats[mask]
+            if not len(amounts):
+                return [], [], []
+            months = (days.astype(np.int64) - UNIX_EPOCH).astype('datetime64[D]')
+            months = months.astype('datetime64[M]').astype(np.int64)
+            month_ids, month_index = np.unique(months, return_inverse=True)
+            cat_ids, cat_index = np.unique(cats, return_inverse=True)
+            cells = cat_index * len(month_ids) + month_index
+            table = np.bincount(cells, weights=amounts, minlength=len(cat_ids) * len(month_ids))
+            table = table.reshape(len(cat_ids), len(month_ids))
+            order = sorted(range(len(cat_ids)), key=lambda c: names[cat_ids[c]])
+            return ([_month_label(int(m)) for m in month_ids],
+                    [names[cat_ids[c]] for c in order],
+                    [table[c].tolist() for c in order])
+        positions = self._positions(start, end)
+        month_cache = {}
+        cells = {}
+        for i in positions:
+            day = e.days[i]
+            month = month_cache.get(day)
+            if month is None:
+                month = month_cache[day] = _month_of(day)
+            key = (e.cats[i], month)
+            cells[key] = cells.get(key, 0.0) + e.amounts[i]
+        month_ids = sorted({month for _, month in cells})
+        cat_ids = sorted({code for code, _ in cells}, key=lambda c: names[c])
+        return ([_month_label(m) for m in month_ids],
+                [names[c] for c in cat_ids],
+                [[cells.get((c, m), 0.0) for m in month_ids] for c in cat_ids])
+
+    def percentiles(self, qs=(50, 90, 99), start=None, end=None, category=None):
+        """{q: amount} for each percentile q in 0..100, or {} with no expenses"""
+        if self.use_numpy:
+            amounts, _, _, mask = self._mask(start, end, category)
+            if mask is not None:
+                amounts = amounts[mask]
+            if not len(amounts):
+                return {}
+            ordered = np.sort(amounts)
+        else:
+            ordered = sorted(self.expenses.amounts[i] for i in self._positions(start, end, category))
+            if not ordered:
+                return {}
+        return {q: float(_percentile(ordered, q)) for q in qs}
+
+    def rolling_average(self, window=7, start=None, end=None, category=None):
+        """[(date, average)] of daily spending over the trailing `window`
+        days, for every day from the first to the last selected expense
+        (or start/end if given); days without expenses count as zero"""
+        if window < 1:
+            raise ValueError("window must be at least one day")
+        e = self.expenses
+        first, last = self._bounds(start, end)
+        if self.use_numpy:
+            amounts, days, _, mask = self._mask(start, end, category)
+            if mask is not None:
+                amounts, days = amounts[mask], days[mask]
+            if not len(days):
+                return []
+            first = int(days.min()) if first is None else first
+            last = int(days.max()) if last is None else last
+            daily = np.bincount(days - first, weights=amounts, minlength=last - first + 1)
+            running = np.cumsum(daily)
+            sums = running.copy()
+            sums[window:] -= running[:-window]
+            counts = np.minimum(np.arange(1, len(daily) + 1), window)
+            averages = (sums / counts).tolist()
+        else:
+            positions = self._positions(start, end, category)
+            if not positions:
+                return []
+            first = min(e.days[i] for i in positions) if first is None else first
+            last = max(e.days[i] for i in positions) if last is None else last
+            daily = [0.0] * (last - first + 1)
+            for i in positions:
+                daily[e.days[i] - first] += e.amounts[i]
+            running = list(accumulate(daily))
+            averages = [(running[d] - (running[d - window] if d >= window else 0)) / min(d + 1, window)
+                        for d in range(len(daily))]
+        return [(day_text(first + d), average) for d, average in enumerate(averages)]
+
+    def top_expenses(self, n=10, start=None, end=None, category=None):
+        """The n largest expenses as dicts, largest first (older first on ties)"""
+        e = self.expenses
+        if n <= 0:
+            return []
+        if self.use_numpy:
+            amounts, _, _, mask = self._mask(start, end, category)
+            positions = np.flatnonzero(mask) if mask is not None else np.arange(len(amounts))
+            if not len(positions):
+                return []
+            selected = amounts[positions]
+            if len(selected) > n:
+                # Everything strictly above the n-th largest amount, then ties in order
+                threshold = np.partition(selected, len(selected) - n)[len(selected) - n]
+                keep = selected > threshold
+                ties = np.flatnonzero(selected == threshold)[:n - int(keep.sum())]
+                keep[ties] = True
+                positions, selected = positions[keep], selected[keep]
+            order = np.lexsort((positions, -selected))
+            top = positions[order].tolist()
+        else:
+            top = heapq.nsmallest(n, self._positions(start, end, category),
+                                  key=lambda i: (-e.amounts[i], i))
+        return [e.row(e.rowids[i]) for i in top]
@@ -0,0 +1,485 @@
+"""Benchmarks for the Personal Budget Tracker.
+
+Builds seeded synthetic ledgers and times the operations that grow with the
+ledger, printing one JSON document so runs can be compared across commits:
+
+    python budget_bench.py --sizes 1k,10k,100k > before.json
+    python budget_bench.py --sizes 1M --backend journal,sqlite --gui -o after.json
+
+Each size and backend runs in a fresh subprocess, so the peak RSS reported
+is that run's own. --gui also drives the real Tk app, which needs a display:
+without one Xvfb is started if it is installed, otherwise the GUI runs are
+skipped.
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+
+from budget_core import DEFAULT_CATEGORIES, Ledger
+from budget_snapshot import snapshot_path
+from budget_storage import BACKENDS, PartitionedStore, SnapshotStore, SQLiteBackend
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SEED = 1
+SIZES = (1000, 10000, 100000)
+# Runs of whole-ledger operations (load, save, refresh) and samples of
+# single-row ones (add, delete, summary, search)
+REPEAT = 5
+SAMPLES = 200
+END_DATE = '2024-12-31'
+YEARS = 5
+# Weekends see this many times the expenses of a weekday
+WEEKEND_FACTOR = 1.5
+
+# Category, share of expenses, median amount, spread (lognormal sigma), descriptions
+CATEGORY_PROFILES = (
+    ('Food', 0.38, 14.0, 0.7, ('Groceries', 'Coffee', 'Lunch', 'Dinner out', 'Bakery',
+                               'Takeaway pizza', 'Supermarket', 'Farmers market')),
+    ('Transport', 0.22, 9.0, 0.9, ('Bus ticket', 'Train fare', 'Fuel', 'Taxi', 'Parking',
+                                   'Metro card top-up', 'Bike repair')),
+    ('Entertainment', 0.14, 25.0, 0.8, ('Cinema', 'Concert tickets', 'Streaming subscription',
+                                        'Books', 'Video game', 'Museum', 'Bowling')),
+    ('Utilities', 0.08, 85.0, 0.4, ('Electricity bill', 'Water bill', 'Internet',
+                                    'Phone plan', 'Gas bill')),
+    ('Other', 0.18, 30.0, 1.1, ('Pharmacy', 'Haircut', 'Gift', 'Clothes', 'Hardware store',
+                                'Donation', 'Dry cleaning')),
+)
+PLACES = ('Main Street', 'the station', 'downtown', 'the mall', 'Riverside', 'Oak Avenue',
+          'the airport', 'Northgate', 'Market Square', 'Harbour Road', 'the corner shop', 'Elm Park')
+
+
+def generate_expenses(count, seed=SEED, end=END_DATE, years=YEARS):
+    """Yield count expense dicts in date order over the `years` up to end;
+    the same seed always gives the same ledger"""
+    rng = random.Random(seed)
+    last = date.fromisoformat(end).toordinal()
+    first = last - round(365.25 * years) + 1
+    days = []
+    while len(days) < count:
+        day = rng.randint(first, last)
+        # date.fromordinal(day).weekday() without building a date
+        if (day - 1) % 7 >= 5 or rng.random() < 1 / WEEKEND_FACTOR:
+            days.append(day)
+    days.sort()
+    profiles = rng.choices(CATEGORY_PROFILES, weights=[p[1] for p in CATEGORY_PROFILES], k=count)
+    for i, (day, (category, _, median, spread, descriptions)) in enumerate(zip(days, profiles)):
+        description = rng.choice(descriptions)
+        roll = rng.random()
+        if roll < 0.35:
+            description += ' at ' + rng.choice(PLACES)
+        elif roll < 0.5:
+            # Reference numbers give the search index a long tail of rare words
+            description += f" #{rng.randint(1, 99999)}"
+        yield {
+            'id': i + 1,
+            'amount': max(round(rng.lognormvariate(math.log(median), spread), 2), 0.01),
+            'category': category,
+            'description': description,
+            'date': date.fromordinal(day).isoformat()
+        }
+
+
+def write_json_ledger(path, expenses, categories):
+    """Stream expenses to path exactly as JsonBackend.save lays them out"""
+    with open(path, 'w') as f:
+        f.write('{\n    "expenses": [')
+        separator = '\n'
+        for exp in expenses:
+            f.write(separator + '        ' + json.dumps(exp, indent=4).replace('\n', '\n        '))
+            separator = ',\n'
+        f.write('],\n' if separator == '\n' else '\n    ],\n')
+        f.write('    "categories": ' + json.dumps(list(categories), indent=4).replace('\n', '\n    '))
+        f.write('\n}')
+
+
+def write_ledger(backend, json_path, db_path, count, seed=SEED):
+    """Create a synthetic ledger of count expenses for the given backend"""
+    expenses = generate_expenses(count, seed)
+    if backend == 'sqlite':
+        storage = SQLiteBackend(db_path)
+        storage.save(expenses, DEFAULT_CATEGORIES)
+        storage.close(None, None)
+    elif backend == 'partitioned':
+        PartitionedStore(json_path).save(expenses, DEFAULT_CATEGORIES)
+    elif backend == 'binary':
+        storage = SnapshotStore(snapshot_path(json_path))
+        storage.load()
+        storage.save(expenses, DEFAULT_CATEGORIES)
+    else:
+        write_json_ledger(json_path, expenses, DEFAULT_CATEGORIES)
+
+
+def peak_rss():
+    """Peak resident set size of this process in bytes, None where unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def timed(func, runs):
+    """Call func runs times; return the durations in seconds"""
+    samples = []
+    for _ in range(runs):
+        began = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - began)
+    return samples
+
+
+def latency(samples, rows=None):
+    """Percentiles of a list of durations in milliseconds, plus throughput in
+    rows per second when each run handled rows rows, else runs per second"""
+    ordered = sorted(samples)
+
+    def percentile(q):
+        # Nearest rank
+        return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)] * 1000
+
+    elapsed = sum(samples)
+    done = len(samples) * (rows if rows is not None else 1)
+    return {
+        'runs': len(samples),
+        'mean_ms': elapsed / len(samples) * 1000,
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': ordered[-1] * 1000,
+        'throughput': done / elapsed if elapsed else None,
+        'unit': 'rows/s' if rows is not None else 'ops/s'
+    }
+
+
+SEARCHES = (
+    {'text': 'coffee'},
+    {'text': 'gro'},
+    {'text': 'dinner out at'},
+    {'category': 'Transport'},
+    {'text': 'bill', 'category': 'Utilities', 'start': '2024-01-01', 'end': '2024-06-30'},
+    {'start': '2024-12-01', 'end': '2024-12-31'},
+)
+
+
+def bench_core(ledger, count, repeat, samples, rng):
+    """Time the headless Ledger operations; returns {name: latency}"""
+    results = {}
+    results['load'] = latency(timed(ledger.load, repeat), count)
+
+    def save():
+        ledger.save()
+        ledger.writer.flush()
+    results['save'] = latency(timed(save, repeat), count)
+
+    results['summary'] = latency(timed(ledger.summary, samples))
+    results['summary_range'] = latency(timed(lambda: ledger.summary('2024-12-01', '2024-12-31'), samples))
+    results['report_month'] = latency(timed(lambda: ledger.report('month'), samples))
+    analytics = ledger.analytics()
+    analytics.percentiles((50,))  # the first call imports NumPy
+    results['percentiles'] = latency(timed(lambda: analytics.percentiles((50, 90)), repeat), count)
+    results['top_expenses'] = latency(timed(lambda: analytics.top_expenses(5), repeat), count)
+
+    results['search_index_build'] = latency(timed(ledger.search_index, 1), count)
+    queries = iter(SEARCHES * samples)
+    results['search'] = latency(timed(lambda: ledger.search(**next(queries)), samples))
+
+    results['suggest_index_build'] = latency(timed(ledger.suggestion_index, 1), count)
+    # Every keystroke of typing out some past descriptions
+    picks = rng.sample(range(len(ledger.expenses)), min(20, len(ledger.expenses)))
+    typed = [ledger.expenses.descriptions[i] for i in picks]
+    keystrokes = iter([text[:n] for text in typed for n in range(1, len(text) + 1)] * samples)
+    results['suggest'] = latency(timed(lambda: ledger.suggest(next(keystrokes)), samples))
+
+    results['duplicate_index_build'] = latency(timed(ledger.duplicate_index, 1), count)
+    # The check made before each add, half of them against rows already there
+    existing = [ledger.expenses.row(ledger.expenses.rowids[i]) for i in picks]
+    checks = ([(exp['amount'], exp['category'], exp['description'], exp['date']) for exp in existing]
+              + [(1.23, 'Food', text, END_DATE) for text in typed])
+    checks = iter(checks * samples)
+    results['duplicate_check'] = latency(timed(lambda: ledger.exact_duplicates(*next(checks)), samples))
+    results['duplicate_scan'] = latency(timed(ledger.duplicate_groups, 1), count)
+
+    profiles = iter(rng.choices(CATEGORY_PROFILES, k=samples))
+
+    def add():
+        category, _, median, _, descriptions = next(profiles)
+        ledger.add(median, category, descriptions[0], END_DATE)
+    results['add'] = latency(timed(add, samples))
+    results['add_flush'] = latency(timed(ledger.writer.flush, 1))
+
+    rowids = iter(rng.sample(list(ledger.expenses.rowids), min(samples, len(ledger.expenses))))
+    results['delete'] = latency(timed(lambda: ledger.delete(next(rowids)), min(samples, len(ledger.expenses))))
+    results['delete_flush'] = latency(timed(ledger.writer.flush, 1))
+
+    # One tenth of what is left, deleted and written in one go
+    bulk = rng.sample(list(ledger.expenses.rowids), len(ledger.expenses) // 10)
+    results['delete_many'] = latency(timed(lambda: ledger.delete_many(bulk), 1), len(bulk))
+    results['delete_many_flush'] = latency(timed(ledger.writer.flush, 1))
+    return results
+
+
+class QuietMessagebox:
+    """Stands in for tkinter.messagebox so dialogs don't wait for a click"""
+
+    @staticmethod
+    def showinfo(*args, **kwargs):
+        pass
+
+    showerror = showwarning = showinfo
+
+    @staticmethod
+    def askyesno(*args, **kwargs):
+        return True
+
+
+def load_app_module():
+    # The app's file name has a space in it, so it can't be imported by name
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python budget_tracker.py')
+    spec = importlib.util.spec_from_file_location('budget_tracker_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_gui(backend, json_path, db_path, count, repeat, samples):
+    """Time the Tk app's own handlers, including the redraw they cause"""
+    app_module = load_app_module()
+    app_module.STORAGE_BACKEND = backend
+    app_module.DATA_FILE = json_path
+    app_module.SQLITE_FILE = db_path
+    app_module.SAVE_DELAY = 0
+    app_module.messagebox = QuietMessagebox
+    root = app_module.tk.Tk()
+    results = {}
+    try:
+        began = time.perf_counter()
+        app = app_module.BudgetTrackerApp(root)
+        root.update()
+        results['startup'] = latency([time.perf_counter() - began], count)
+
+        def idle(func):
+            def run():
+                func()
+                root.update_idletasks()
+            return run
+
+        began = time.perf_counter()
+        app.tab_control.select(app.view_tab)
+        root.update()
+        results['open_view_tab'] = latency([time.perf_counter() - began], count)
+        results['load_data'] = latency(timed(idle(app.load_data), repeat), count)
+
+        def save_data():
+            app.save_data()
+            app.ledger.writer.flush()
+        results['save_data'] = latency(timed(save_data, repeat), count)
+        results['refresh_view'] = latency(timed(idle(app.refresh_view), repeat), count)
+
+        def delete_expense():
+            app.tree.selection_set(app.tree.get_children()[0])
+            app.on_tree_select()
+            app.delete_expense()
+        runs = min(samples, len(app.ledger.expenses))
+        results['delete_expense'] = latency(timed(idle(delete_expense), runs))
+
+        began = time.perf_counter()
+        app.tab_control.select(app.summary_tab)
+        root.update()
+        results['open_summary_tab'] = latency([time.perf_counter() - began], count)
+
+        def show_summary():
+            # Drop the cached chart so every run redraws it
+            app.chart_key = None
+            app.show_summary()
+
+        def until_shown(func):
+            # The figures and chart come from worker threads; wait until
+            # they are on screen
+            def run():
+                func()
+                while app.tasks.pending():
+                    time.sleep(0.001)
+                    root.update()
+            return run
+        results['show_summary_callback'] = latency(timed(idle(show_summary), repeat))
+        results['show_summary'] = latency(timed(until_shown(show_summary), repeat))
+        results['show_summary_cached'] = latency(timed(until_shown(app.show_summary), samples))
+        app.ledger.close()
+    finally:
+        root.destroy()
+    return results
+
+
+def run_worker(mode, count, backend, args):
+    """Build a ledger in a temporary directory and time it; returns the run's report"""
+    with tempfile.TemporaryDirectory(prefix='budget-bench-') as workdir:
+        json_path = os.path.join(workdir, 'budget_data.json')
+        db_path = os.path.join(workdir, 'budget_data.db')
+        began = time.perf_counter()
+        write_ledger(backend, json_path, db_path, count, args.seed)
+        report = {
+            'mode': mode,
+            'rows': count,
+            'backend': backend,
+            'generate_s': time.perf_counter() - began,
+        }
+        if mode == 'gui':
+            report['operations'] = bench_gui(backend, json_path, db_path, count, args.repeat, args.samples)
+        else:
+            ledger = Ledger(backend, json_path, db_path, save_delay=0)
+            report['operations'] = bench_core(ledger, count, args.repeat, args.samples,
+                                              random.Random(args.seed))
+            ledger.close()
+        report['peak_rss_bytes'] = peak_rss()
+    return report
+
+
+def start_xvfb():
+    """Start Xvfb on a free display; returns (process, ':N') or (None, None)"""
+    if not shutil.which('Xvfb'):
+        return None, None
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(
+        ['Xvfb', '-displayfd', str(write_fd), '-screen', '0', '1280x1024x24', '-nolisten', 'tcp'],
+        pass_fds=(write_fd,), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.close(write_fd)
+    # Xvfb writes the display number once it accepts connections
+    with os.fdopen(read_fd) as f:
+        number = f.readline().strip()
+    if not number:
+        process.kill()
+        return None, None
+    return process, ':' + number
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spawn(mode, count, backend, args, env):
+    """Run one benchmark in a child process and return its report"""
+    command = [sys.executable, os.path.abspath(__file__), '--worker', mode, str(count), backend,
+               '--seed', str(args.seed), '--repeat', str(args.repeat), '--samples', str(args.samples)]
+    print(f"{mode:>4} {count:>12,} rows  {backend:<8}", end=' ', file=sys.stderr, flush=True)
+    began = time.perf_counter()
+    child = subprocess.run(command, capture_output=True, text=True, env=env)
+    print(f"{time.perf_counter() - began:8.1f} s", file=sys.stderr)
+    if child.returncode:
+        lines = child.stderr.strip().splitlines()
+        return {'mode': mode, 'rows': count, 'backend': backend,
+                'error': lines[-1] if lines else f"exit status {child.returncode}"}
+    return json.loads(child.stdout)
+
+
+def parse_size(text):
+    """'1000', '10k' or '1M' -> int"""
+    text = text.strip().lower()
+    scale = {'k': 1000, 'm': 1000000}.get(text[-1:], 1)
+    try:
+        count = int(float(text[:-1] if scale > 1 else text) * scale)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size {text!r}") from None
+    if count < 1:
+        raise argparse.ArgumentTypeError(f"size must be at least 1, got {text!r}")
+    return count
+
+
+def parse_list(parse):
+    return lambda text: [parse(item) for item in text.split(',') if item.strip()]
+
+
+def parse_backend(name):
+    if name not in BACKENDS:
+        raise argparse.ArgumentTypeError(f"unknown backend {name!r}, expected one of {', '.join(BACKENDS)}")
+    return name
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='budget_bench.py', description="Personal Budget Tracker benchmarks")
+    parser.add_argument('--sizes', type=parse_list(parse_size), default=list(SIZES),
+                        help="comma-separated ledger sizes, e.g. 1k,100k,10M (default: 1k,10k,100k)")
+    parser.add_argument('--backend', type=parse_list(parse_backend), default=['journal'],
+                        help=f"comma-separated storage backends from {', '.join(BACKENDS)} (default: journal)")
+    parser.add_argument('--seed', type=int, default=SEED, help=f"generator seed (default: {SEED})")
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help=f"runs of whole-ledger operations (default: {REPEAT})")
+    parser.add_argument('--samples', type=int, default=SAMPLES,
+                        help=f"samples of single-row operations (default: {SAMPLES})")
+    parser.add_argument('--gui', action='store_true', help="also time the Tk app (needs a display or Xvfb)")
+    parser.add_argument('-o', '--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--worker', nargs=3, metavar=('MODE', 'ROWS', 'BACKEND'), help=argparse.SUPPRESS)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.repeat < 1 or args.samples < 1:
+        sys.exit("error: --repeat and --samples must be at least 1")
+    if args.worker:
+        mode, count, backend = args.worker
+        json.dump(run_worker(mode, int(count), backend, args), sys.stdout)
+        return 0
+
+    env = dict(os.environ)
+    xvfb = None
+    gui = 'skipped' if not args.gui else 'display'
+    if args.gui and not env.get('DISPLAY'):
+        xvfb, display = start_xvfb()
+        if xvfb:
+            env['DISPLAY'] = display
+            gui = 'xvfb'
+        else:
+            print("No display and Xvfb not found; skipping the GUI benchmarks.", file=sys.stderr)
+            gui = 'skipped: no display'
+    report = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': importlib.util.find_spec('numpy') is not None,
+        'matplotlib': importlib.util.find_spec('matplotlib') is not None,
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'samples': args.samples,
+        'gui': gui,
+        'runs': []
+    }
+    try:
+        for count in args.sizes:
+            for backend in args.backend:
+                report['runs'].append(spawn('core', count, backend, args, env))
+                if gui in ('display', 'xvfb'):
+                    report['runs'].append(spawn('gui', count, backend, args, env))
+    finally:
+        if xvfb:
+            xvfb.terminate()
+            xvfb.wait()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
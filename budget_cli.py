@@ -0,0 +1,279 @@
+"""Command line interface for the Personal Budget Tracker.
+
+Works on the same ledger files as the desktop app without importing tkinter
+or matplotlib (matplotlib is only loaded for `summary --chart`, NumPy only
+for `analyze`):
+
+    python budget_cli.py add 12.50 Food "Lunch"
+    python budget_cli.py import statement.csv
+    python budget_cli.py delete 42
+    python budget_cli.py search coffee --category Food
+    python budget_cli.py summary --from 2024-01-01
+    python budget_cli.py report --by week --from 2024-01-01 --to 2024-03-31
+    python budget_cli.py analyze pivot --from 2024-01-01
+    python budget_cli.py export march.csv --from 2024-03-01 --to 2024-03-31
+    python budget_cli.py duplicates --exact --merge
+    python budget_cli.py --trace-file trace.json summary
+"""
+import argparse
+import sys
+
+from budget_columns import key_rowid
+from budget_core import DATA_FILE, SQLITE_FILE, STORAGE_BACKEND, Ledger
+from budget_stats import PERIODS
+from budget_storage import BACKENDS
+from budget_trace import TRACER
+
+
+def cmd_add(ledger, args):
+    for exp in ledger.exact_duplicates(args.amount, args.category, args.description, args.date):
+        print(f"warning: same date, amount and description as expense {exp['id']}", file=sys.stderr)
+    _, expense = ledger.add(args.amount, args.category, args.description, args.date)
+    print(f"Added expense {expense['id']}: ${expense['amount']:,.2f} {expense['category']} "
+          f"'{expense['description']}' on {expense['date']}")
+
+
+def cmd_import(ledger, args):
+    rows, rejected = ledger.import_file(args.file)
+    print(f"Imported {rows:,} expenses, skipped {len(rejected):,} invalid rows.")
+    for number, record in rejected[:args.show_rejected]:
+        print(f"  row {number}: {record}")
+
+
+def cmd_delete(ledger, args):
+    rowids = []
+    missing = []
+    for expense_id in args.ids:
+        try:
+            rowids.append(ledger.rowid_of(expense_id))
+        except KeyError:
+            missing.append(expense_id)
+    for expense in ledger.delete_many(rowids):
+        print(f"Deleted expense {expense['id']}: '{expense['description']}'")
+    if missing:
+        raise ValueError(f"no expense with id {', '.join(map(str, missing))}")
+
+
+def cmd_search(ledger, args):
+    category = args.category.strip().title() if args.category else None
+    ledger.ensure_loaded(args.start, args.end)
+    keys = ledger.search(' '.join(args.text), category, args.start, args.end)
+    for key in keys[:args.limit]:
+        exp = ledger.expenses.row(key_rowid(key))
+        print(f"{exp['id']:>7}  {exp['date']}  ${exp['amount']:>10,.2f}  {exp['category']:<14}  {exp['description']}")
+    if len(keys) > args.limit:
+        print(f"... {len(keys) - args.limit:,} more")
+    print(f"{len(keys):,} matching expenses")
+
+
+def cmd_summary(ledger, args):
+    total, rows = ledger.summary(args.start, args.end)
+    if not rows:
+        print("No expenses in this period." if args.start or args.end else "No expenses recorded yet.")
+        return
+    print(f"Total Spending: ${total:,.2f}\n")
+    print("Spending by Category:\n")
+    for cat, amt, percentage in rows:
+        print(f"  • {cat}: ${amt:,.2f} ({percentage:.1f}%)")
+    if args.chart:
+        save_chart(rows, args.chart)
+        print(f"\nChart saved to {args.chart}")
+
+
+def save_chart(rows, path):
+    """Render the Summary tab's pie chart to an image file"""
+    try:
+        from matplotlib.figure import Figure
+    except ImportError:
+        raise ValueError("matplotlib is required for --chart") from None
+    figure = Figure(figsize=(8, 6), facecolor='white')
+    ax = figure.add_subplot()
+    colors = ['#3498DB', '#27AE60', '#E74C3C', '#F39C12', '#9B59B6', '#1ABC9C', '#E67E22']
+    ax.pie([amt for _, amt, _ in rows], labels=[cat for cat, _, _ in rows],
+           autopct='%1.1f%%', colors=colors[:len(rows)], startangle=90)
+    ax.set_title('Spending by Category', fontsize=11, fontweight='bold', pad=12)
+    figure.savefig(path)
+
+
+def cmd_report(ledger, args):
+    rows = ledger.report(args.by, args.start, args.end)
+    if not rows:
+        print("No expenses in this period." if args.start or args.end else "No expenses recorded yet.")
+        return
+    width = max(len(key) for key, _, _ in rows)
+    for key, count, total in rows:
+        print(f"{key:<{width}}  {count:>7,}  ${total:>14,.2f}")
+    count = sum(row[1] for row in rows)
+    total = sum(row[2] for row in rows)
+    print(f"{'Total':<{width}}  {count:>7,}  ${total:>14,.2f}")
+
+
+def cmd_analyze(ledger, args):
+    category = args.category.strip().title() if args.category else None
+    ledger.check_range(args.start, args.end)
+    ledger.ensure_loaded(args.start, args.end)
+    analytics = ledger.analytics(use_numpy=not args.no_numpy)
+    if args.query == 'pivot':
+        months, categories, table = analytics.category_month_pivot(args.start, args.end)
+        if category in categories:
+            table = [table[categories.index(category)]]
+            categories = [category]
+        width = max([len(c) for c in categories] + [8])
+        print(f"{'Category':<{width}}" + ''.join(f"  {m:>10}" for m in months))
+        for name, row in zip(categories, table):
+            print(f"{name:<{width}}" + ''.join(f"  {amount:>10,.2f}" for amount in row))
+    elif args.query == 'percentiles':
+        values = analytics.percentiles((10, 25, 50, 75, 90, 99), args.start, args.end, category)
+        for q, amount in values.items():
+            print(f"p{q:<3} ${amount:,.2f}")
+    elif args.query == 'rolling':
+        for day, average in analytics.rolling_average(args.window, args.start, args.end, category):
+            print(f"{day}  ${average:,.2f}")
+    else:
+        for exp in analytics.top_expenses(args.n, args.start, args.end, category):
+            print(f"{exp['id']:>7}  {exp['date']}  ${exp['amount']:>10,.2f}  "
+                  f"{exp['category']:<14}  {exp['description']}")
+
+
+def cmd_export(ledger, args):
+    written = ledger.export_file(args.file, args.start, args.end, args.category)
+    print(f"Exported {written:,} expenses to {args.file}.")
+
+
+def cmd_duplicates(ledger, args):
+    ledger.ensure_loaded()
+    groups = ledger.duplicate_groups(near=not args.exact)
+    for rowids, exact in groups[:args.limit]:
+        print("Exact duplicates:" if len(exact) == len(rowids) - 1 else "Near duplicates:")
+        for rowid in rowids:
+            exp = ledger.expenses.row(rowid)
+            mark = 'keep' if rowid == rowids[0] else 'same' if rowid in exact else 'near'
+            print(f"  {mark}  {exp['id']:>7}  {exp['date']}  ${exp['amount']:>10,.2f}  "
+                  f"{exp['category']:<14}  {exp['description']}")
+    if len(groups) > args.limit:
+        print(f"... {len(groups) - args.limit:,} more groups")
+    extra = sum(len(rowids) - 1 for rowids, _ in groups)
+    print(f"{len(groups):,} groups, {extra:,} expenses beyond the first of each")
+    if args.merge:
+        deleted = ledger.merge_duplicates(groups)
+        print(f"Deleted {len(deleted):,} duplicates, kept the earliest of each group.")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='budget_cli.py', description="Personal Budget Tracker")
+    parser.add_argument('--backend', choices=BACKENDS, default=STORAGE_BACKEND,
+                        help=f"storage backend (default: {STORAGE_BACKEND})")
+    parser.add_argument('--data', default=DATA_FILE, help=f"JSON ledger file (default: {DATA_FILE})")
+    parser.add_argument('--db', default=SQLITE_FILE, help=f"SQLite ledger file (default: {SQLITE_FILE})")
+    parser.add_argument('--trace-file', metavar='JSON',
+                        help="print timing spans to stderr and write a Chrome trace")
+    parser.add_argument('--profile', metavar='PROF', help="write cProfile stats")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="add an expense")
+    add.add_argument('amount')
+    add.add_argument('category')
+    add.add_argument('description')
+    add.add_argument('--date', help="YYYY-MM-DD (default: today)")
+    add.set_defaults(func=cmd_add)
+
+    imp = commands.add_parser('import', help="import a CSV, JSONL or .btcol file")
+    imp.add_argument('file')
+    imp.add_argument('--show-rejected', type=int, default=10, metavar='N',
+                     help="print the first N rejected rows (default: 10)")
+    imp.set_defaults(func=cmd_import)
+
+    delete = commands.add_parser('delete', help="delete expenses by id")
+    delete.add_argument('ids', type=int, nargs='+')
+    delete.set_defaults(func=cmd_delete)
+
+    search = commands.add_parser('search', help="find expenses by description, category and date")
+    search.add_argument('text', nargs='*', help="words in the description (the last may be a prefix)")
+    search.add_argument('--category')
+    search.add_argument('--from', dest='start', metavar='YYYY-MM-DD')
+    search.add_argument('--to', dest='end', metavar='YYYY-MM-DD')
+    search.add_argument('--limit', type=int, default=50, help="rows to print (default: 50)")
+    search.set_defaults(func=cmd_search)
+
+    summary = commands.add_parser('summary', help="total and spending by category")
+    summary.add_argument('--chart', metavar='IMAGE', help="also save a pie chart (needs matplotlib)")
+    summary.add_argument('--from', dest='start', metavar='YYYY-MM-DD')
+    summary.add_argument('--to', dest='end', metavar='YYYY-MM-DD')
+    summary.set_defaults(func=cmd_summary)
+
+    report = commands.add_parser('report', help="count and total per period or category")
+    report.add_argument('--by', choices=PERIODS + ('category',), default='month')
+    report.add_argument('--from', dest='start', metavar='YYYY-MM-DD')
+    report.add_argument('--to', dest='end', metavar='YYYY-MM-DD')
+    report.set_defaults(func=cmd_report)
+
+    analyze = commands.add_parser('analyze', help="pivots, percentiles, rolling averages, top expenses")
+    analyze.add_argument('query', choices=('pivot', 'percentiles', 'rolling', 'top'))
+    analyze.add_argument('--from', dest='start', metavar='YYYY-MM-DD')
+    analyze.add_argument('--to', dest='end', metavar='YYYY-MM-DD')
+    analyze.add_argument('--category')
+    analyze.add_argument('--window', type=int, default=7, help="days for rolling (default: 7)")
+    analyze.add_argument('-n', type=int, default=10, help="expenses for top (default: 10)")
+    analyze.add_argument('--no-numpy', action='store_true', help="use the pure-Python fallback")
+    analyze.set_defaults(func=cmd_analyze)
+
+    export = commands.add_parser('export', help="export to CSV, JSONL or .btcol")
+    export.add_argument('file')
+    export.add_argument('--from', dest='start', metavar='YYYY-MM-DD')
+    export.add_argument('--to', dest='end', metavar='YYYY-MM-DD')
+    export.add_argument('--category')
+    export.set_defaults(func=cmd_export)
+
+    duplicates = commands.add_parser('duplicates', help="find (and merge) duplicate expenses")
+    duplicates.add_argument('--exact', action='store_true',
+                            help="only same date, amount and description, not near duplicates")
+    duplicates.add_argument('--merge', action='store_true',
+                            help="delete all but the earliest expense of each group")
+    duplicates.add_argument('--limit', type=int, default=50, help="groups to print (default: 50)")
+    duplicates.set_defaults(func=cmd_duplicates)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.trace_file:
+        TRACER.enable(keep_events=True)
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    status = run(args)
+    if args.profile:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    if args.trace_file:
+        print(TRACER.report(), file=sys.stderr)
+        TRACER.write_chrome_trace(args.trace_file)
+    return status
+
+
+def run(args):
+    # Nothing waits for a quiet spell here; close() writes everything at once
+    ledger = Ledger(args.backend, args.data, args.db, save_delay=0)
+    try:
+        ledger.load()
+    except (ValueError, OSError) as e:
+        # Don't close: that could write the empty ledger over the real one
+        print(f"error: failed to load data: {e}", file=sys.stderr)
+        return 1
+    status = 0
+    try:
+        args.func(ledger, args)
+    except (ValueError, OSError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        status = 1
+    try:
+        ledger.close()
+    except OSError as e:
+        print(f"error: failed to save data: {e}", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
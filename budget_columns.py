@@ -0,0 +1,288 @@
+"""Columnar in-memory expense store for the Personal Budget Tracker."""
+import bisect
+import mmap
+import sys
+from array import array
+from datetime import date
+
+# View keys pack (-day ordinal, rowid) into one int: ascending key order is
+# newest date first, then insertion order
+ROWID_BITS = 40
+ROWID_MASK = (1 << ROWID_BITS) - 1
+
+
+def day_ordinal(text):
+    """'YYYY-MM-DD' -> proleptic Gregorian ordinal"""
+    return date(int(text[:4]), int(text[5:7]), int(text[8:10])).toordinal()
+
+
+def day_text(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+def view_key(day, rowid):
+    return (-day << ROWID_BITS) | rowid
+
+
+def key_rowid(key):
+    return key & ROWID_MASK
+
+
+class TextHeap:
+    """A list of strings kept UTF-8 encoded in one buffer and decoded on access.
+
+    Stands in for ColumnarExpenses.descriptions when a store is read from a
+    binary snapshot: `data` is the file's description heap, usually a view
+    of a memory map, and nothing is decoded until a row is read. Strings
+    added later are encoded into `extra`; offsets from len(data) on point
+    there. Slices and copies share both buffers, which only ever grow.
+    """
+
+    def __init__(self, data=b'', starts=None, ends=None, extra=None):
+        self.data = data
+        self.base = len(data)
+        self.starts = array('q') if starts is None else starts
+        self.ends = array('q') if ends is None else ends
+        self.extra = bytearray() if extra is None else extra
+
+    def __len__(self):
+        return len(self.starts)
+
+    def encoded(self, i):
+        """The UTF-8 bytes of string i, without decoding them"""
+        start, end = self.starts[i], self.ends[i]
+        if start >= self.base:
+            return bytes(self.extra[start - self.base:end - self.base])
+        return self.data[start:end]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return TextHeap(self.data, self.starts[i], self.ends[i], self.extra)
+        return str(self.encoded(i), 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self.starts)):
+            yield self[i]
+
+    def __delitem__(self, i):
+        del self.starts[i]
+        del self.ends[i]
+
+    def __iadd__(self, other):
+        if other.data is not self.data or other.extra is not self.extra:
+            raise ValueError("can only join slices of the same heap")
+        self.starts += other.starts
+        self.ends += other.ends
+        return self
+
+    def append(self, text):
+        encoded = text.encode('utf-8')
+        start = self.base + len(self.extra)
+        self.extra += encoded
+        self.starts.append(start)
+        self.ends.append(start + len(encoded))
+
+    def __sizeof__(self):
+        size = object.__sizeof__(self) + sys.getsizeof(self.starts) + sys.getsizeof(self.ends)
+        # A mapped file is page cache rather than this process's memory
+        if not isinstance(getattr(self.data, 'obj', None), mmap.mmap):
+            size += len(self.data)
+        return size + sys.getsizeof(self.extra)
+
+
+class ColumnarExpenses:
+    """Expenses held as parallel typed arrays instead of one dict per row.
+
+    Amounts are doubles, ids and rowids 64-bit ints, dates day ordinals and
+    categories small codes into a shared name table; only descriptions stay
+    Python strings, or a TextHeap when read from a binary snapshot. Every
+    row also gets a rowid that increases with insertion and never changes,
+    which is how views refer to rows. Iterating yields the familiar expense
+    dicts, built on demand, so storage backends and aggregates keep working
+    unchanged.
+    """
+
+    def __init__(self, expenses=()):
+        self.rowids = array('q')
+        self.ids = array('q')
+        self.amounts = array('d')
+        self.days = array('i')
+        self.cats = array('I')
+        self.descriptions = []
+        self.category_names = []
+        self.category_codes = {}
+        self.next_rowid = 0
+        for exp in expenses:
+            self.append(exp)
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def __iter__(self):
+        for i in range(len(self.rowids)):
+            yield self._row_at(i)
+
+    def category_code(self, name):
+        code = self.category_codes.get(name)
+        if code is None:
+            code = self.category_codes[name] = len(self.category_names)
+            self.category_names.append(name)
+        return code
+
+    def append(self, exp):
+        """Add an expense dict and return its rowid"""
+        rowid = self.next_rowid
+        self.next_rowid += 1
+        self.rowids.append(rowid)
+        self.ids.append(exp['id'])
+        self.amounts.append(exp['amount'])
+        self.days.append(day_ordinal(exp['date']))
+        self.cats.append(self.category_code(exp['category']))
+        self.descriptions.append(exp['description'])
+        return rowid
+
+    def position(self, rowid):
+        i = bisect.bisect_left(self.rowids, rowid)
+        if i == len(self.rowids) or self.rowids[i] != rowid:
+            raise KeyError(rowid)
+        return i
+
+    def _row_at(self, i):
+        return {
+            'id': self.ids[i],
+            'amount': self.amounts[i],
+            'category': self.category_names[self.cats[i]],
+            'description': self.descriptions[i],
+            'date': day_text(self.days[i])
+        }
+
+    def row(self, rowid):
+        """The expense dict for a rowid"""
+        return self._row_at(self.position(rowid))
+
+    def pop(self, rowid):
+        """Remove a row and return its expense dict"""
+        i = self.position(rowid)
+        exp = self._row_at(i)
+        for column in (self.rowids, self.ids, self.amounts, self.days, self.cats, self.descriptions):
+            del column[i]
+        return exp
+
+    def pop_many(self, rowids):
+        """Remove many rows and return their expense dicts in rowid order.
+
+        Each pop() shifts the rest of every column, so instead the kept
+        stretches between removed rows are copied once into new columns.
+        """
+        positions = sorted(self.position(rowid) for rowid in set(rowids))
+        removed = [self._row_at(i) for i in positions]
+        bounds = [-1] + positions + [len(self.rowids)]
+        for name in ('rowids', 'ids', 'amounts', 'days', 'cats', 'descriptions'):
+            column = getattr(self, name)
+            kept = column[:0]
+            for lo, hi in zip(bounds, bounds[1:]):
+                kept += column[lo + 1:hi]
+            setattr(self, name, kept)
+        return removed
+
+    def key(self, rowid):
+        return view_key(self.days[self.position(rowid)], rowid)
+
+    def sorted_keys(self):
+        """View keys of every row, newest date first"""
+        return array('q', sorted(map(view_key, self.days, self.rowids)))
+
+    def slice(self, start, stop):
+        """Independent copy of the rows at positions start:stop"""
+        other = ColumnarExpenses()
+        other.rowids = self.rowids[start:stop]
+        other.ids = self.ids[start:stop]
+        other.amounts = self.amounts[start:stop]
+        other.days = self.days[start:stop]
+        other.cats = self.cats[start:stop]
+        other.descriptions = self.descriptions[start:stop]
+        other.category_names = list(self.category_names)
+        other.category_codes = dict(self.category_codes)
+        other.next_rowid = self.next_rowid
+        return other
+
+    def chunks(self, size):
+        """Yield the rows present now as slices of at most size rows.
+
+        Progress is tracked by rowid rather than position, so rows may be
+        added or removed between chunks: removed rows are skipped and rows
+        added after the first chunk are not included.
+        """
+        rowid, stop = 0, self.next_rowid
+        while True:
+            i = bisect.bisect_left(self.rowids, rowid)
+            j = min(i + size, bisect.bisect_left(self.rowids, stop))
+            if i >= j:
+                return
+            rowid = self.rowids[j - 1] + 1
+            yield self.slice(i, j)
+
+    def copy(self):
+        """Independent copy, e.g. for a background save"""
+        other = ColumnarExpenses()
+        other.rowids = array('q', self.rowids)
+        other.ids = array('q', self.ids)
+        other.amounts = array('d', self.amounts)
+        other.days = array('i', self.days)
+        other.cats = array('I', self.cats)
+        other.descriptions = self.descriptions[:]
+        other.category_names = list(self.category_names)
+        other.category_codes = dict(self.category_codes)
+        other.next_rowid = self.next_rowid
+        return other
+
+    def memory_usage(self):
+        """Bytes held by the columns, description strings included"""
+        size = sum(sys.getsizeof(column) for column in
+                   (self.rowids, self.ids, self.amounts, self.days, self.cats, self.descriptions))
+        if isinstance(self.descriptions, list):
+            size += sum(sys.getsizeof(d) for d in self.descriptions)
+        size += sys.getsizeof(self.category_names) + sys.getsizeof(self.category_codes)
+        size += sum(sys.getsizeof(c) for c in self.category_names)
+        return size
+
+
+def dict_list_memory(expenses):
+    """Bytes held by a list of expense dicts, counting shared objects once"""
+    seen = set()
+
+    def sizeof(obj):
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        return sys.getsizeof(obj)
+
+    size = sizeof(expenses)
+    for exp in expenses:
+        size += sizeof(exp)
+        for key, value in exp.items():
+            size += sizeof(key) + sizeof(value)
+    return size
+
+
+def memory_report(expenses):
+    """Bytes per expense as a list of dicts and as columns"""
+    count = max(len(expenses), 1)
+    before = dict_list_memory(expenses)
+    after = ColumnarExpenses(expenses).memory_usage()
+    return {
+        'expenses': len(expenses),
+        'dict_bytes_per_expense': before / count,
+        'columnar_bytes_per_expense': after / count,
+        'saving': 1 - after / before if before else 0
+    }
+
+
+if __name__ == '__main__':
+    import json
+    with open(sys.argv[1] if len(sys.argv) > 1 else 'budget_data.json') as f:
+        report = memory_report(json.load(f).get('expenses', []))
+    print(f"Expenses:             {report['expenses']:,}")
+    print(f"List of dicts:        {report['dict_bytes_per_expense']:.1f} bytes/expense")
+    print(f"Columnar store:       {report['columnar_bytes_per_expense']:.1f} bytes/expense")
+    print(f"Saving:               {report['saving']:.0%}")
@@ -0,0 +1,537 @@
+"""GUI-free ledger core for the Personal Budget Tracker.
+
+Nothing here imports tkinter or matplotlib, so the Tk app, the command line
+tool (budget_cli.py) and scripts all share the same ledger logic.
+"""
+import heapq
+from collections import Counter
+from datetime import datetime
+
+from budget_analytics import Analytics
+from budget_columns import ColumnarExpenses, day_ordinal
+from budget_duplicates import DuplicateIndex, duplicate_extras, find_duplicates
+from budget_io import (EXPORT_CHUNK_SIZE, IMPORT_BATCH_SIZE, batched, clean_expense,
+                       export_expenses, parse_expenses, read_records)
+from budget_search import IdIndex, SearchIndex, SuggestionIndex, normalize_description, tokenize
+from budget_stats import SummaryAggregates
+from budget_storage import BackgroundWriter, IdAllocator, open_backend
+from budget_trace import TRACER
+
+DATA_FILE = 'budget_data.json'
+SQLITE_FILE = 'budget_data.db'
+# Storage backend: 'json' rewrites DATA_FILE on every change, 'journal' appends
+# each add/delete to DATA_FILE + '.journal' and folds it back on save and exit,
+# 'sqlite' keeps an indexed ledger in SQLITE_FILE (migrated from DATA_FILE once),
+# 'partitioned' keeps one journal ledger per year and starts with this year only,
+# 'binary' is 'journal' with a memory-mapped binary snapshot instead of JSON
+STORAGE_BACKEND = 'journal'
+# Changes are written on a background thread once no new change has arrived
+# for this many seconds, so bursts of adds and deletes become one write
+SAVE_DELAY = 0.5
+DEFAULT_CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Utilities', 'Other']
+# Latest uses of a description looked at to predict its category and amount
+USUAL_EXPENSE_LOOKBACK = 20
+
+
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def largest_expenses(expenses, n):
+    """The n largest of expenses, largest first and earliest first on ties"""
+    return heapq.nsmallest(n, expenses, key=lambda exp: (-exp['amount'], exp['date']))
+
+
+def check_date(date):
+    """Raise ValueError unless date is a real 'YYYY-MM-DD' date"""
+    try:
+        datetime.strptime(date, "%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid date {date!r}, expected YYYY-MM-DD") from None
+
+
+class Ledger:
+    """Expenses, categories and running totals on top of a storage backend.
+
+    Every change updates the columnar store and the summary aggregates in
+    memory and is queued with a BackgroundWriter; call close() to write
+    everything out. Call sync() now and then to merge what other instances
+    sharing the files changed. Invalid input raises ValueError.
+
+    With a partitioned backend only some years are in memory. Queries over
+    a date range read the years it covers first, all-time totals come from
+    the partition manifest, and search() and analytics() cover what is in
+    memory (see ensure_loaded() and load_older()).
+    """
+
+    def __init__(self, backend=STORAGE_BACKEND, data_file=DATA_FILE,
+                 sqlite_file=SQLITE_FILE, save_delay=SAVE_DELAY):
+        self.expenses = ColumnarExpenses()
+        self.categories = set(DEFAULT_CATEGORIES)
+        self.stats = SummaryAggregates()
+        # Built on first search, id lookup, suggestion or duplicate check,
+        # then maintained on every add and delete
+        self.index = None
+        self.by_id = None
+        self.suggestions = None
+        self.duplicates = None
+        self.storage = open_backend(backend, data_file, sqlite_file)
+        self.id_allocator = IdAllocator(self.storage.path)
+        self.writer = BackgroundWriter(self.storage, delay=save_delay)
+        self.save_failed = False
+        self.compaction_queued = False
+
+    def load(self):
+        # Queued writes must land before the file is read back
+        self.writer.flush()
+        with TRACER.span('storage.load'):
+            expenses, categories = self.storage.load()
+        with TRACER.span('columns.build'):
+            # A binary snapshot arrives as columns already
+            self.expenses = expenses if isinstance(expenses, ColumnarExpenses) else ColumnarExpenses(expenses)
+        self.categories.update(categories)
+        with TRACER.span('aggregates.rebuild'):
+            self.stats.rebuild(self.expenses)
+        self.index = None
+        self.by_id = None
+        self.suggestions = None
+        self.duplicates = None
+
+    def save(self):
+        """Queue a full save"""
+        with TRACER.span('columns.copy'):
+            expenses = self.expenses.copy()
+        self.writer.save(expenses, list(self.categories))
+
+    def add(self, amount, category, description, date=None):
+        """Validate and add one expense; returns (rowid, expense)"""
+        amount, category, description = clean_expense(amount, category, description)
+        date = date or today()
+        check_date(date)
+        self.ensure_loaded(date, date)
+        expense = {
+            'id': self.new_ids(1),
+            'amount': amount,
+            'category': category,
+            'description': description,
+            'date': date
+        }
+        rowid = self._insert(expense)
+        if self.storage.incremental:
+            self.writer.add(expense)
+        else:
+            self.save()
+        return rowid, expense
+
+    def add_many(self, batch):
+        """Add already validated expenses (without ids) with a single write"""
+        if batch:
+            self.ensure_loaded(min(exp['date'] for exp in batch), max(exp['date'] for exp in batch))
+        for expense_id, expense in enumerate(batch, self.new_ids(len(batch))):
+            expense['id'] = expense_id
+            self._insert(expense)
+        if self.storage.incremental:
+            self.writer.add_many(batch)
+        else:
+            self.save()
+
+    def delete(self, rowid):
+        """Remove the row with this rowid; returns its expense dict"""
+        expense = self._remove(rowid)
+        if self.storage.incremental:
+            self.writer.delete(expense['id'])
+        else:
+            self.save()
+        return expense
+
+    def delete_many(self, rowids):
+        """Remove many rows with one pass over the store and a single write;
+        returns their expense dicts in rowid order"""
+        rowids = sorted(set(rowids))
+        with TRACER.span('columns.pop_many'):
+            expenses = self.expenses.pop_many(rowids)
+        for rowid, expense in zip(rowids, expenses):
+            self._unindex(rowid, expense)
+        if self.storage.incremental:
+            self.writer.delete_many([expense['id'] for expense in expenses])
+        else:
+            self.save()
+        return expenses
+
+    def new_ids(self, count):
+        """First of count new, never used expense ids"""
+        return self.id_allocator.reserve(count, self._free_id)
+
+    def _free_id(self):
+        highest = max(self.expenses.ids, default=0)
+        for part in self.storage.partition_summaries():
+            highest = max(highest, part['max_id'])
+        return highest + 1
+
+    def _insert(self, expense):
+        """Add an expense to memory only; returns its rowid"""
+        self.categories.add(expense['category'])
+        rowid = self.expenses.append(expense)
+        self.stats.add(expense)
+        if self.index is not None:
+            self.index.add(rowid, expense)
+        if self.by_id is not None:
+            self.by_id.add(rowid, expense['id'])
+        if self.suggestions is not None:
+            self.suggestions.add(rowid, expense)
+        if self.duplicates is not None:
+            self.duplicates.add(rowid, day_ordinal(expense['date']), expense['amount'], expense['description'])
+        return rowid
+
+    def _remove(self, rowid):
+        """Remove a row from memory only; returns its expense dict"""
+        expense = self.expenses.pop(rowid)
+        self._unindex(rowid, expense)
+        return expense
+
+    def _unindex(self, rowid, expense):
+        """Take a row already popped from the store out of the aggregates and indexes"""
+        self.stats.remove(expense)
+        if self.index is not None:
+            self.index.remove(rowid, expense)
+        if self.by_id is not None:
+            self.by_id.remove(rowid, expense['id'])
+        if self.suggestions is not None:
+            self.suggestions.remove(rowid, expense)
+        if self.duplicates is not None:
+            self.duplicates.remove(rowid, day_ordinal(expense['date']), expense['amount'], expense['description'])
+
+    def id_index(self):
+        if self.by_id is None:
+            with TRACER.span('ids.build_index'):
+                self.by_id = IdIndex(self.expenses)
+        return self.by_id
+
+    def rowid_of(self, expense_id):
+        """Rowid of the first expense with this id, reading every partition
+        if it isn't in memory; raises KeyError"""
+        rowids = self.id_index().lookup(expense_id)
+        if rowids:
+            return rowids[0]
+        if self.ensure_loaded():
+            return self.rowid_of(expense_id)
+        raise KeyError(expense_id)
+
+    def count(self):
+        """Number of expenses, including partitions not in memory"""
+        return len(self.expenses) + sum(part['count'] for part in self.storage.partition_summaries())
+
+    def ensure_loaded(self, start=None, end=None):
+        """Read the partitions holding dates in start..end (None for open)
+        that aren't in memory yet; returns the rowids they added"""
+        return self.load_partitions(self.storage.unloaded_partitions(start, end))
+
+    def load_older(self, start=None, end=None):
+        """Read the newest partition in start..end not in memory yet that
+        has expenses; returns the rowids it added ([] once none is left)"""
+        names = self.storage.unloaded_partitions(start, end)
+        while names:
+            rowids = self.load_partitions([names.pop()])
+            if rowids:
+                return rowids
+        return []
+
+    def load_partitions(self, names):
+        if not names:
+            return []
+        # A queued full save must not see the new years without their rows
+        self.writer.flush()
+        with TRACER.span('storage.load_partitions'):
+            expenses = self.storage.load_partitions(names)
+        return [self._insert(exp) for exp in expenses]
+
+    def sync(self):
+        """Merge the changes other instances made to the ledger files.
+
+        Returns None if there were none, else (added rowids, removed
+        [(view key, expense)]) so views can update in place. Our own queued
+        changes are written first, and only the difference is applied to
+        the store, aggregates and search index, never a full reload.
+        """
+        if not self.storage.changed():
+            return None
+        self.writer.flush()
+        with TRACER.span('storage.read_changes'):
+            change = self.storage.read_changes()
+        if change is None:
+            return None
+        if change[0] == 'ops':
+            ops = change[1]
+        else:
+            expenses, categories = change[1:3]
+            self.categories.update(categories)
+            with TRACER.span('ledger.diff'):
+                ops = self._diff(expenses, *change[3:])
+            # The backend re-read the files, so re-check compaction afresh
+            self.compaction_queued = False
+        added = {}
+        removed = []
+        for op, arg in ops:
+            if op == 'add':
+                added[self._insert(arg)] = True
+                continue
+            # A journal delete drops every expense with that id, as on load
+            rowids = [arg] if op == 'remove' else self.id_index().lookup(arg)
+            for rowid in rowids:
+                key = self.expenses.key(rowid)
+                expense = self._remove(rowid)
+                if added.pop(rowid, None) is None:
+                    removed.append((key, expense))
+        return list(added), removed
+
+    def _diff(self, expenses, span=None):
+        """[('add', expense) / ('remove', rowid)] turning memory into expenses,
+        or just the rows dated within span (first day, last day) if given"""
+        ordinals = {}
+
+        def key(exp):
+            day = ordinals.get(exp['date'])
+            if day is None:
+                day = ordinals[exp['date']] = day_ordinal(exp['date'])
+            return exp['id'], exp['amount'], exp['category'], exp['description'], day
+
+        wanted = {}
+        for exp in expenses:
+            k = key(exp)
+            wanted[k] = wanted.get(k, 0) + 1
+        e = self.expenses
+        names = e.category_names
+        ops = []
+        for row in zip(e.rowids, e.ids, e.amounts, e.cats, e.descriptions, e.days):
+            if span and not span[0] <= row[5] <= span[1]:
+                continue
+            k = (row[1], row[2], names[row[3]], row[4], row[5])
+            if wanted.get(k):
+                wanted[k] -= 1
+            else:
+                ops.append(('remove', row[0]))
+        for exp in expenses:
+            k = key(exp)
+            if wanted.get(k):
+                wanted[k] -= 1
+                ops.append(('add', exp))
+        return ops
+
+    def search_index(self):
+        if self.index is None:
+            with TRACER.span('search.build_index'):
+                self.index = SearchIndex(self.expenses)
+        return self.index
+
+    def suggestion_index(self):
+        if self.suggestions is None:
+            with TRACER.span('suggest.build_index'):
+                self.suggestions = SuggestionIndex(self.expenses)
+        return self.suggestions
+
+    def adopt_suggestion_index(self, index, version):
+        """Use a SuggestionIndex built elsewhere, e.g. on a worker thread from
+        a copy of the expenses, unless they have changed since stats.version
+        was version"""
+        if self.suggestions is None and version == self.stats.version:
+            self.suggestions = index
+
+    def suggest(self, text, build=True):
+        """Past descriptions in memory starting with text, the most used and
+        most recently used first (see SuggestionIndex.suggest). With
+        build=False a missing index isn't built here: [] until one is
+        adopted, so a keystroke never waits for the build."""
+        if not build and self.suggestions is None:
+            return []
+        with TRACER.span('suggest.query'):
+            return self.suggestion_index().suggest(text)
+
+    def usual_expense(self, description, build=True):
+        """(category, amount) most often recorded with a description lately,
+        the latest winning ties; None for a description never used (or, with
+        build=False, before the suggestion index exists)"""
+        if not build and self.suggestions is None:
+            return None
+        rowids = self.suggestion_index().recent_rows(description, USUAL_EXPENSE_LOOKBACK)
+        if not rowids:
+            return None
+        rows = [self.expenses.row(rowid) for rowid in rowids]
+        # Counter keeps first-seen order among equal counts, and rows run newest first
+        category = Counter(exp['category'] for exp in rows).most_common(1)[0][0]
+        amount = Counter(exp['amount'] for exp in rows if exp['category'] == category).most_common(1)[0][0]
+        return category, amount
+
+    def duplicate_index(self):
+        if self.duplicates is None:
+            with TRACER.span('duplicates.build_index'):
+                self.duplicates = DuplicateIndex(self.expenses)
+        return self.duplicates
+
+    def adopt_duplicate_index(self, index, version):
+        """Use a DuplicateIndex built elsewhere, as adopt_suggestion_index"""
+        if self.duplicates is None and version == self.stats.version:
+            self.duplicates = index
+
+    def exact_duplicates(self, amount, category, description, date=None):
+        """Expenses that add() with the same arguments would duplicate: the
+        same date, the same amount to the cent and the same description up to
+        case and spacing. Validates like add()"""
+        amount, category, description = clean_expense(amount, category, description)
+        date = date or today()
+        check_date(date)
+        self.ensure_loaded(date, date)
+        text = normalize_description(description)
+        matches = []
+        with TRACER.span('duplicates.lookup'):
+            # The index holds hashes: check the rows themselves
+            for rowid in self.duplicate_index().lookup(day_ordinal(date), amount, description):
+                exp = self.expenses.row(rowid)
+                if (exp['date'] == date and round(exp['amount'] * 100) == round(amount * 100)
+                        and normalize_description(exp['description']) == text):
+                    matches.append(exp)
+        return matches
+
+    def duplicate_groups(self, near=True, cancelled=None):
+        """Exact and, unless near is False, near duplicates among the
+        expenses in memory as (rowids, exact) groups, the row to keep first
+        (see budget_duplicates.find_duplicates)"""
+        with TRACER.span('duplicates.scan'):
+            return find_duplicates(self.expenses, near=near, cancelled=cancelled)
+
+    def merge_duplicates(self, groups, exact_only=False):
+        """Keep the first row of each (rowids, exact) group and delete the
+        rest, or only its exact copies, with a single write; returns the
+        deleted expense dicts"""
+        return self.delete_many(duplicate_extras(groups, exact_only))
+
+    def search(self, text='', category=None, start=None, end=None):
+        """View keys of matching expenses in memory, newest first (see
+        SearchIndex.search); a date range reads the partitions it covers"""
+        self.check_range(start, end)
+        if start or end:
+            self.ensure_loaded(start, end)
+        elif self.index is None and not category and not tokenize(text):
+            # Just date order: no need to build the index (and decode every description)
+            return self.expenses.sorted_keys()
+        index = self.search_index()
+        with TRACER.span('search.query'):
+            return index.search(text, category, start, end)
+
+    def import_file(self, path, default_date=None):
+        """Import a CSV, JSONL or columnar file; returns (rows, rejected records)"""
+        rejected = []
+        rows = 0
+        records = parse_expenses(read_records(path), default_date or today(), rejected)
+        for batch in batched(records, IMPORT_BATCH_SIZE):
+            self.add_many(batch)
+            rows += len(batch)
+        return rows, rejected
+
+    def export_file(self, path, start=None, end=None, category=None):
+        """Export synchronously (see budget_io.export_expenses); returns rows written"""
+        self.check_range(start, end)
+        self.ensure_loaded(start, end)
+        if category:
+            category = category.strip().title()
+        return export_expenses(self.expenses.chunks(EXPORT_CHUNK_SIZE), path, start, end, category)
+
+    def check_range(self, start, end):
+        for date in (start, end):
+            if date:
+                check_date(date)
+
+    def summary(self, start=None, end=None):
+        """(total, [(category, amount, percentage), ...] largest first),
+        optionally limited to a date range"""
+        if start or end:
+            self.check_range(start, end)
+            self.ensure_loaded(start, end)
+            totals = {cat: amt for cat, (amt, _) in self.stats.range_category_totals(start, end).items()}
+            total = sum(totals.values())
+        else:
+            total = self.stats.total
+            totals = self.stats.category_totals()
+            for part in self.storage.partition_summaries():
+                total += part['total']
+                for cat, (amount, _) in part['categories'].items():
+                    totals[cat] = totals.get(cat, 0) + amount
+        rows = sorted(totals.items(), key=lambda x: x[1], reverse=True)
+        return total, [(cat, amt, (amt / total * 100) if total > 0 else 0) for cat, amt in rows]
+
+    def analytics(self, use_numpy=True):
+        """Analytics over the expenses in memory (NumPy is imported on first use)"""
+        return Analytics(self.expenses, use_numpy)
+
+    def top_expenses(self, n=10, start=None, end=None):
+        """The n largest expenses, largest first; all-time lists take the
+        partitions not in memory from the manifest"""
+        self.check_range(start, end)
+        if start or end:
+            self.ensure_loaded(start, end)
+        top = self.analytics().top_expenses(n, start, end)
+        if not (start or end):
+            top = largest_expenses(top + self.stored_top_expenses(n), n)
+        return top
+
+    def stored_top_expenses(self, n=10):
+        """Candidates for the n largest all-time expenses among the partitions
+        not in memory, from the manifest; merge with largest_expenses()"""
+        return [exp for part in self.storage.partition_summaries() for exp in part['top'][:n]]
+
+    def report(self, by='month', start=None, end=None):
+        """[(period or category, count, total), ...] in key order; by is
+        'day', 'week', 'month', 'year' or 'category'"""
+        self.check_range(start, end)
+        # All-time months, years and categories come from the manifest for
+        # partitions not in memory; anything else needs their expenses
+        parts = [] if start or end or by in ('day', 'week') else self.storage.partition_summaries()
+        if not parts:
+            self.ensure_loaded(start, end)
+        if by == 'category':
+            totals = {cat: list(v) for cat, v in self.stats.range_category_totals(start, end).items()}
+            for part in parts:
+                for cat, (amount, count) in part['categories'].items():
+                    entry = totals.setdefault(cat, [0.0, 0])
+                    entry[0] += amount
+                    entry[1] += count
+            return [(cat, totals[cat][1], totals[cat][0]) for cat in sorted(totals)]
+        rows = self.stats.rollup(by, start, end)
+        if parts:
+            merged = {label: [count, amount] for label, count, amount in rows}
+            for part in parts:
+                for month, (amount, count) in part['months'].items():
+                    entry = merged.setdefault(month if by == 'month' else month[:4], [0, 0.0])
+                    entry[0] += count
+                    entry[1] += amount
+            rows = [(label, count, amount) for label, (count, amount) in sorted(merged.items())]
+        return rows
+
+    def writer_results(self):
+        """Yield (ok, message) for each finished background write"""
+        while not self.writer.results.empty():
+            ok, message = self.writer.results.get()
+            if not ok:
+                # The data is still in memory; a full save will write all of it
+                self.save_failed = True
+            yield ok, message
+
+    def compact_if_needed(self):
+        # Fold a long journal back into its snapshot; the copies are queued
+        # behind every change made so far, so they match the journal exactly
+        if self.storage.needs_compaction():
+            if not self.compaction_queued:
+                self.save()
+                self.compaction_queued = True
+        else:
+            self.compaction_queued = False
+
+    def close(self):
+        """Write every queued change, retrying failed writes with a full save"""
+        self.writer.flush()
+        for _ in self.writer_results():
+            pass
+        if self.save_failed:
+            self.storage.save(self.expenses, self.categories)
+            self.save_failed = False
+        self.storage.close(self.expenses, self.categories)
+        self.id_allocator.release()
@@ -0,0 +1,221 @@
+"""Duplicate detection for the Personal Budget Tracker.
+
+Exact duplicates share a date, an amount to the cent and a description up
+to case and spacing. DuplicateIndex keeps a hash of that key for every row,
+so checking a new expense before it is added is one dict lookup.
+
+Near duplicates come from find_duplicates(), one pass over the rows in date
+order. Each description is cut into character shingles and summarized by
+MinHash values in bands, and each amount falls in a bucket on a log scale
+twice as wide as NEAR_DUPLICATE_AMOUNT allows. Only rows sharing a whole
+band and a neighbouring amount bucket within NEAR_DUPLICATE_DAYS of each
+other are compared, so the pass stays close to linear however many expenses a
+day holds; a pair counts when the amounts are within NEAR_DUPLICATE_AMOUNT
+of each other and the shingle sets' Jaccard similarity reaches
+NEAR_DUPLICATE_SIMILARITY.
+"""
+import math
+import zlib
+
+from budget_search import normalize_description
+
+# Expenses up to this many days apart can be near duplicates
+NEAR_DUPLICATE_DAYS = 2
+# ... when their amounts differ by at most this fraction
+NEAR_DUPLICATE_AMOUNT = 0.02
+# ... and their descriptions share this much of their shingles
+NEAR_DUPLICATE_SIMILARITY = 0.6
+# Characters per shingle
+SHINGLE_SIZE = 3
+# MinHash bands and values per band: descriptions with similarity s share a
+# band with probability 1 - (1 - s ** MINHASH_ROWS) ** MINHASH_BANDS, about
+# 83% at the default threshold and 99% at 0.8
+MINHASH_BANDS = 4
+MINHASH_ROWS = 2
+HASH_MASK = (1 << 64) - 1
+# Odd multipliers, one MinHash function each
+MINHASH_MULTIPLIERS = tuple((0x9E3779B97F4A7C15 * (2 * k + 1)) & HASH_MASK
+                            for k in range(MINHASH_BANDS * MINHASH_ROWS))
+
+
+def duplicate_key(day, amount, description):
+    """What exact duplicates have in common, hashed"""
+    return hash((day, round(amount * 100), normalize_description(description)))
+
+
+class DuplicateIndex:
+    """Exact-duplicate key -> rowid, kept in step on add and delete.
+
+    Keys are hashes, so a lookup can return a rowid that only collides;
+    callers compare the rows themselves. A key shared by several rows maps
+    to a tuple of rowids, as in IdIndex.
+    """
+
+    def __init__(self, expenses):
+        self.rowids = {}
+        normalized = {}
+        for rowid, day, amount, description in zip(expenses.rowids, expenses.days,
+                                                   expenses.amounts, expenses.descriptions):
+            text = normalized.get(description)
+            if text is None:
+                text = normalized[description] = normalize_description(description)
+            self._add(hash((day, round(amount * 100), text)), rowid)
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def _add(self, key, rowid):
+        known = self.rowids.get(key)
+        if known is None:
+            self.rowids[key] = rowid
+        elif isinstance(known, tuple):
+            self.rowids[key] = known + (rowid,)
+        else:
+            self.rowids[key] = (known, rowid)
+
+    def add(self, rowid, day, amount, description):
+        self._add(duplicate_key(day, amount, description), rowid)
+
+    def remove(self, rowid, day, amount, description):
+        key = duplicate_key(day, amount, description)
+        known = self.rowids.get(key)
+        if known == rowid:
+            del self.rowids[key]
+        elif isinstance(known, tuple):
+            rest = tuple(r for r in known if r != rowid)
+            self.rowids[key] = rest if len(rest) > 1 else rest[0]
+
+    def lookup(self, day, amount, description):
+        """Rowids whose key hashes the same, oldest first; () if none"""
+        known = self.rowids.get(duplicate_key(day, amount, description))
+        if known is None:
+            return ()
+        return known if isinstance(known, tuple) else (known,)
+
+
+def shingles(text):
+    """The set of SHINGLE_SIZE-character pieces of a normalized description"""
+    text = f" {text} "
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def minhash_bands(pieces):
+    """MINHASH_BANDS tuples of MINHASH_ROWS MinHash values for a shingle set"""
+    # crc32 rather than hash(), which changes from run to run for strings,
+    # so a scan finds the same groups every time
+    hashes = [zlib.crc32(piece.encode('utf-8')) for piece in pieces]
+    values = [min((h * multiplier) & HASH_MASK for h in hashes) for multiplier in MINHASH_MULTIPLIERS]
+    return [tuple(values[band:band + MINHASH_ROWS]) for band in range(0, len(values), MINHASH_ROWS)]
+
+
+def similarity(a, b):
+    """Jaccard similarity of two normalized descriptions' shingles"""
+    if a == b:
+        return 1.0
+    a, b = shingles(a), shingles(b)
+    return len(a & b) / len(a | b)
+
+
+def find_duplicates(expenses, days=NEAR_DUPLICATE_DAYS, amount=NEAR_DUPLICATE_AMOUNT,
+                    threshold=NEAR_DUPLICATE_SIMILARITY, near=True, cancelled=None):
+    """Groups of duplicate rows in a ColumnarExpenses store, oldest first.
+
+    Each group is (rowids, exact) with the rowids in date order; the first
+    is the one to keep when merging, and exact lists the rows that are
+    exact copies of an earlier row in the group, so deleting just those
+    loses nothing. Rows with the same exact key always share a group. The
+    first of each such set is compared with the others for near matches,
+    and joins a group only through a direct match with its first row, so a
+    purchase repeated every day pairs up instead of chaining into one long
+    group. near=False gives the exact groups alone. Returns None if
+    cancelled (an Event) is set part way.
+    """
+    rowids, row_days, amounts, descriptions = expenses.rowids, expenses.days, expenses.amounts, expenses.descriptions
+    order = sorted(range(len(expenses)), key=lambda i: (row_days[i], rowids[i]))
+    # Log-scale buckets twice as wide as the largest gap between matching
+    # amounts: a match is in the same bucket or the neighbour on the nearer side
+    width = -2 * math.log1p(-amount)
+    described = {}
+    texts = []
+    # Exact key -> position of the first row with it, and first row -> the
+    # positions of its exact copies
+    firsts = {}
+    copies = {}
+    members = {}
+    # (band, amount bucket) -> [(position in order, day, amount), ...] for
+    # the group leaders within the window; only a leader can be matched
+    recent = {}
+    # Day -> the keys its leaders were filed under, to forget them later
+    filed_on = {}
+    current = None
+    for pos, i in enumerate(order):
+        if cancelled is not None and pos % 10000 == 0 and cancelled.is_set():
+            return None
+        day, value, description = row_days[i], amounts[i], descriptions[i]
+        summary = described.get(description)
+        if summary is None:
+            text = normalize_description(description)
+            summary = described[description] = (text, minhash_bands(shingles(text)) if near else None)
+        text, signature = summary
+        texts.append(text)
+        key = (day, round(value * 100), text)
+        first = firsts.get(key)
+        if first is not None:
+            copies.setdefault(first, []).append(pos)
+            continue
+        firsts[key] = pos
+        if not near:
+            continue
+        if day != current:
+            current = day
+            cutoff = day - days
+            for old in [d for d in filed_on if d < cutoff]:
+                for band_key in filed_on.pop(old):
+                    window = recent.get(band_key)
+                    if window is not None:
+                        kept = [entry for entry in window if entry[1] >= cutoff]
+                        if kept:
+                            recent[band_key] = kept
+                        else:
+                            del recent[band_key]
+            filed = filed_on[day] = []
+        place = math.log(value) / width if value > 0 else 0.0
+        bucket = math.floor(place)
+        side = bucket + 1 if place - bucket >= 0.5 else bucket - 1
+        leader = None
+        for band in signature:
+            for nearby in (bucket, side):
+                for other, other_day, other_value in recent.get((band, nearby), ()):
+                    if ((leader is None or other < leader) and other_day >= cutoff
+                            and abs(value - other_value) <= amount * max(value, other_value)
+                            and similarity(text, texts[other]) >= threshold):
+                        leader = other
+        if leader is not None:
+            members.setdefault(leader, []).append(pos)
+            continue
+        entry = (pos, day, value)
+        for band in signature:
+            band_key = (band, bucket)
+            window = recent.get(band_key)
+            if window is None:
+                recent[band_key] = [entry]
+            else:
+                window.append(entry)
+            filed.append(band_key)
+    # A first row with copies that joined a near group brings them along
+    joined = {pos for near_rows in members.values() for pos in near_rows}
+    groups = []
+    for leader in sorted((members.keys() | copies.keys()) - joined):
+        positions = [leader] + members.get(leader, [])
+        exact = sorted(pos for first in positions for pos in copies.get(first, ()))
+        positions = sorted(positions + exact)
+        groups.append(([rowids[order[pos]] for pos in positions], [rowids[order[pos]] for pos in exact]))
+    return groups
+
+
+def duplicate_extras(groups, exact_only=False):
+    """The rowids merging groups would delete: all but the first of each,
+    or just the exact copies"""
+    if exact_only:
+        return [rowid for _, exact in groups for rowid in exact]
+    return [rowid for rowids, _ in groups for rowid in rowids[1:]]
@@ -0,0 +1,399 @@
+"""Streaming import and export of expenses for the Personal Budget Tracker."""
+import csv
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime
+
+from budget_columns import day_ordinal, day_text
+
+IMPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_FIELDS = ['id', 'date', 'description', 'amount', 'category']
+# Seconds a worker keeps offering its last message after a cancel
+FINAL_MESSAGE_WAIT = 5.0
+
+# Columnar binary export: the magic, then one block per chunk of rows, then an
+# empty block. A block is a '<II' header (rows, bytes of JSON metadata), the
+# metadata (the category names the codes refer to), then the ids, amounts,
+# day ordinals, category codes and description byte lengths as little-endian
+# arrays, then the UTF-8 descriptions back to back.
+COLUMNAR_SUFFIX = '.btcol'
+COLUMNAR_MAGIC = b'BTCOL\x01\n'
+BLOCK_HEADER = struct.Struct('<II')
+
+# Accepted column names for each field, compared case-insensitively
+FIELD_ALIASES = {
+    'amount': ('amount', 'debit', 'value'),
+    'category': ('category', 'type'),
+    'description': ('description', 'desc', 'memo', 'payee', 'details', 'narrative'),
+    'date': ('date', 'transaction date', 'posted date', 'posting date')
+}
+
+
+def clean_expense(amount, category, description):
+    """Validate and normalize fields the way the Add Expense form does.
+
+    Returns (amount, category, description); raises ValueError if the amount
+    is not a positive number or the category or description is empty.
+    """
+    amount = float(amount)
+    category = category.strip().title()
+    description = description.strip()
+    if amount <= 0 or not category or not description:
+        raise ValueError("amount must be positive and category and description are required")
+    return amount, category, description
+
+
+def read_records(path, progress=None):
+    """Yield one dict per CSV row, JSONL line or columnar export row, keys lowercased.
+
+    progress(bytes_read) is called as the file is consumed, so callers can
+    report a fraction of the file size.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == COLUMNAR_SUFFIX:
+        yield from read_columnar(path, progress)
+        return
+    is_csv = suffix == '.csv'
+    with open(path, 'rb') as f:
+        def lines():
+            read = 0
+            for raw in f:
+                read += len(raw)
+                if progress:
+                    progress(read)
+                yield raw.decode('utf-8-sig')
+        if is_csv:
+            reader = csv.reader(lines())
+            header = [name.strip().lower() for name in next(reader, [])]
+            for row in reader:
+                yield dict(zip(header, row))
+        else:
+            for line in lines():
+                if line.strip():
+                    record = json.loads(line)
+                    yield {str(k).lower(): v for k, v in record.items()}
+
+
+def _field(record, name):
+    for alias in FIELD_ALIASES[name]:
+        value = record.get(alias)
+        if value not in (None, ''):
+            return value
+    return ''
+
+
+def parse_expenses(records, default_date, rejected):
+    """Turn raw records into expense dicts without ids.
+
+    Invalid records are skipped and appended to rejected as (number, record).
+    """
+    for number, record in enumerate(records, 1):
+        try:
+            amount = str(_field(record, 'amount')).replace('$', '').replace(',', '')
+            amount, category, desc = clean_expense(
+                amount, str(_field(record, 'category')), str(_field(record, 'description')))
+            date = str(_field(record, 'date')).strip()[:10] or default_date
+            # Rejects anything that isn't a real Y-M-D date and zero-pads the rest
+            date = datetime.strptime(date, "%Y-%m-%d").date().isoformat()
+        except (ValueError, TypeError):
+            rejected.append((number, record))
+            continue
+        yield {'amount': amount, 'category': category, 'description': desc, 'date': date}
+
+
+def _put(messages, message, cancelled, final=False):
+    """Put message on a bounded queue without blocking forever.
+
+    Gives up once cancelled is set, except that a final message is still
+    offered for FINAL_MESSAGE_WAIT seconds so a UI that is still polling
+    learns how the job ended. Returns whether the message was queued.
+    """
+    deadline = time.monotonic() + FINAL_MESSAGE_WAIT
+    while not cancelled.is_set() or (final and time.monotonic() < deadline):
+        try:
+            messages.put(message, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ImportJob:
+    """Reads, parses and validates a statement on a worker thread.
+
+    Results are put on `messages` for the UI thread to poll:
+    ('batch', expenses), ('progress', fraction, rows, rejected) and finally
+    ('done', rows, rejected, cancelled) or ('error', message). The queue is
+    bounded, so the reader never gets far ahead of the UI.
+    """
+
+    def __init__(self, path, default_date, batch_size=IMPORT_BATCH_SIZE):
+        self.path = path
+        self.default_date = default_date
+        self.batch_size = batch_size
+        self.messages = queue.Queue(maxsize=4)
+        self.rejected = []
+        self.cancelled = threading.Event()
+        self._bytes_read = 0
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def _put(self, message, final=False):
+        return _put(self.messages, message, self.cancelled, final)
+
+    def _on_progress(self, bytes_read):
+        self._bytes_read = bytes_read
+
+    def _run(self):
+        rows = 0
+        try:
+            size = os.path.getsize(self.path) or 1
+            records = read_records(self.path, self._on_progress)
+            expenses = parse_expenses(records, self.default_date, self.rejected)
+            for batch in batched(expenses, self.batch_size):
+                if self.cancelled.is_set() or not self._put(('batch', batch)):
+                    break
+                rows += len(batch)
+                self._put(('progress', self._bytes_read / size, rows, len(self.rejected)))
+        except Exception as e:
+            self._put(('error', str(e)), final=True)
+            return
+        self._put(('done', rows, len(self.rejected), self.cancelled.is_set()), final=True)
+
+
+def _little_endian(column):
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def _read_column(f, typecode, count):
+    column = array(typecode)
+    column.frombytes(f.read(column.itemsize * count))
+    if len(column) != count:
+        raise ValueError("truncated columnar file")
+    if sys.byteorder == 'big':
+        column.byteswap()
+    return column
+
+
+def read_columnar(path, progress=None):
+    """Yield the expense dicts stored in a columnar export, block by block"""
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError("not a columnar expense export")
+        while True:
+            header = f.read(BLOCK_HEADER.size)
+            if len(header) != BLOCK_HEADER.size:
+                raise ValueError("truncated columnar file")
+            rows, meta_size = BLOCK_HEADER.unpack(header)
+            if not rows:
+                return
+            categories = json.loads(f.read(meta_size).decode('utf-8'))['categories']
+            ids = _read_column(f, 'q', rows)
+            amounts = _read_column(f, 'd', rows)
+            days = _read_column(f, 'i', rows)
+            cats = _read_column(f, 'I', rows)
+            lengths = _read_column(f, 'I', rows)
+            text = f.read(sum(lengths))
+            if progress:
+                progress(f.tell())
+            start = 0
+            for i in range(rows):
+                end = start + lengths[i]
+                yield {
+                    'id': ids[i],
+                    'amount': amounts[i],
+                    'category': categories[cats[i]],
+                    'description': text[start:end].decode('utf-8'),
+                    'date': day_text(days[i])
+                }
+                start = end
+
+
+def export_format(path):
+    """'csv', 'jsonl' or 'columnar', from the file extension"""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == COLUMNAR_SUFFIX:
+        return 'columnar'
+    if suffix in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    return 'csv'
+
+
+def filter_chunk(chunk, start=None, end=None, category=None):
+    """Positions in a ColumnarExpenses chunk that pass the filters.
+
+    start and end are inclusive 'YYYY-MM-DD' dates; category is a name.
+    Only the day and category columns are read.
+    """
+    lo = day_ordinal(start) if start else None
+    hi = day_ordinal(end) if end else None
+    code = chunk.category_codes.get(category) if category else None
+    if category and code is None:
+        return []
+    return [i for i, (day, cat) in enumerate(zip(chunk.days, chunk.cats))
+            if (lo is None or day >= lo) and (hi is None or day <= hi)
+            and (code is None or cat == code)]
+
+
+def _write_text_rows(f, fmt, chunk, positions):
+    names = chunk.category_names
+    rows = ((chunk.ids[i], day_text(chunk.days[i]), chunk.descriptions[i],
+             chunk.amounts[i], names[chunk.cats[i]]) for i in positions)
+    if fmt == 'csv':
+        csv.writer(f).writerows(rows)
+    else:
+        f.writelines(json.dumps(dict(zip(EXPORT_FIELDS, row))) + '\n' for row in rows)
+
+
+def _write_block(f, chunk, positions):
+    encoded = [chunk.descriptions[i].encode('utf-8') for i in positions]
+    meta = json.dumps({'categories': chunk.category_names}).encode('utf-8')
+    f.write(BLOCK_HEADER.pack(len(positions), len(meta)))
+    f.write(meta)
+    for column in (chunk.ids, chunk.amounts, chunk.days, chunk.cats):
+        f.write(_little_endian(array(column.typecode, (column[i] for i in positions))))
+    f.write(_little_endian(array('I', map(len, encoded))))
+    f.write(b''.join(encoded))
+
+
+def export_expenses(chunks, path, start=None, end=None, category=None,
+                    progress=None, cancelled=None):
+    """Write ColumnarExpenses chunks to path, one chunk in memory at a time.
+
+    The format follows the extension (see export_format). The file is written
+    to a temporary file and renamed into place, so a failed or cancelled
+    export leaves nothing behind. progress(rows_scanned, rows_written) is
+    called after each chunk; cancelled() returning true stops the export.
+    Returns the number of rows written, or None if cancelled.
+    """
+    fmt = export_format(path)
+    tmp_path = path + '.tmp'
+    scanned = written = 0
+    try:
+        if fmt == 'columnar':
+            f = open(tmp_path, 'wb')
+        else:
+            f = open(tmp_path, 'w', newline='' if fmt == 'csv' else None, encoding='utf-8')
+        with f:
+            if fmt == 'columnar':
+                f.write(COLUMNAR_MAGIC)
+            elif fmt == 'csv':
+                csv.writer(f).writerow(EXPORT_FIELDS)
+            for chunk in chunks:
+                if cancelled and cancelled():
+                    break
+                positions = filter_chunk(chunk, start, end, category)
+                if positions:
+                    if fmt == 'columnar':
+                        _write_block(f, chunk, positions)
+                    else:
+                        _write_text_rows(f, fmt, chunk, positions)
+                scanned += len(chunk)
+                written += len(positions)
+                if progress:
+                    progress(scanned, written)
+            stopped = bool(cancelled and cancelled())
+            if not stopped:
+                if fmt == 'columnar':
+                    f.write(BLOCK_HEADER.pack(0, 0))
+                f.flush()
+                os.fsync(f.fileno())
+        if stopped:
+            os.remove(tmp_path)
+            return None
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return written
+
+
+class ExportJob:
+    """Writes an export on a worker thread.
+
+    The UI thread slices the ledger into chunks with
+    ColumnarExpenses.chunks() and hands them over with feed(), then calls
+    finish(). The chunk queue is bounded, so only a few chunks are held at
+    once whatever the ledger size. Results are put on `messages`, which is
+    bounded too: ('progress', scanned, written) and finally
+    ('done', written, cancelled) or ('error', message).
+    """
+
+    def __init__(self, path, start=None, end=None, category=None):
+        self.path = path
+        self.start_date = start
+        self.end_date = end
+        self.category = category
+        self.chunks = queue.Queue(maxsize=4)
+        self.messages = queue.Queue(maxsize=4)
+        self.cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def feed(self, chunk):
+        """Queue a chunk; returns False if the queue is full"""
+        try:
+            self.chunks.put_nowait(chunk)
+            return True
+        except queue.Full:
+            return False
+
+    def finish(self):
+        """Mark the end of the chunks; returns False if the queue is full"""
+        return self.feed(None)
+
+    def _put(self, message, final=False):
+        return _put(self.messages, message, self.cancelled, final)
+
+    def _received(self):
+        while not self.cancelled.is_set():
+            try:
+                chunk = self.chunks.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if chunk is None:
+                return
+            yield chunk
+
+    def _run(self):
+        try:
+            written = export_expenses(
+                self._received(), self.path, self.start_date, self.end_date, self.category,
+                progress=lambda scanned, written: self._put(('progress', scanned, written)),
+                cancelled=self.cancelled.is_set)
+        except Exception as e:
+            self._put(('error', str(e)), final=True)
+            return
+        self._put(('done', written or 0, written is None), final=True)
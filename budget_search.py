@@ -0,0 +1,390 @@
+"""Search indexes for the Personal Budget Tracker."""
+import bisect
+import heapq
+import math
+import operator
+import re
+from array import array
+
+from budget_columns import ROWID_MASK, day_ordinal, view_key
+
+TOKEN_RE = re.compile(r'\w+')
+# Descriptions suggested per prefix while typing
+SUGGESTION_COUNT = 8
+# Prefixes shared by more descriptions than this keep their best ones ranked
+# instead of ranking every match on each keystroke
+SUGGESTION_SCAN_LIMIT = 200
+# A description used twice as often ranks level with one last used this
+# many days more recently
+SUGGESTION_HALF_LIFE = 30
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def normalize_description(text):
+    """Lowercased with each run of whitespace as one space"""
+    return ' '.join(text.casefold().split())
+
+
+def _discard(postings, key):
+    i = bisect.bisect_left(postings, key)
+    if i < len(postings) and postings[i] == key:
+        del postings[i]
+
+
+class SearchIndex:
+    """Indexes over a ColumnarExpenses store, kept in step on add and delete.
+
+    `tokens` maps each lowercased word of a description to the rows that
+    contain it and `categories` maps each category to its rows. Rows are
+    recorded by view key, so every posting list is already in date order
+    and a date range is a bisect away. `vocabulary` is the sorted word list
+    used for prefix matches and `keys` holds every row's view key.
+    """
+
+    def __init__(self, expenses):
+        all_keys = list(map(view_key, expenses.days, expenses.rowids))
+        order = sorted(range(len(all_keys)), key=all_keys.__getitem__)
+        self.keys = array('q', [all_keys[i] for i in order])
+        self.tokens = {}
+        by_code = {}
+        descriptions, cats = expenses.descriptions, expenses.cats
+        # Walking the rows in key order keeps every posting list sorted
+        for i in order:
+            key = all_keys[i]
+            for token in set(tokenize(descriptions[i])):
+                postings = self.tokens.get(token)
+                if postings is None:
+                    postings = self.tokens[token] = array('q')
+                postings.append(key)
+            postings = by_code.get(cats[i])
+            if postings is None:
+                postings = by_code[cats[i]] = array('q')
+            postings.append(key)
+        self.categories = {expenses.category_names[code]: postings
+                           for code, postings in by_code.items()}
+        self.vocabulary = sorted(self.tokens)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, rowid, expense):
+        key = view_key(day_ordinal(expense['date']), rowid)
+        for token in set(tokenize(expense['description'])):
+            postings = self.tokens.get(token)
+            if postings is None:
+                postings = self.tokens[token] = array('q')
+                bisect.insort(self.vocabulary, token)
+            bisect.insort(postings, key)
+        bisect.insort(self.categories.setdefault(expense['category'], array('q')), key)
+        bisect.insort(self.keys, key)
+
+    def remove(self, rowid, expense):
+        key = view_key(day_ordinal(expense['date']), rowid)
+        for token in set(tokenize(expense['description'])):
+            postings = self.tokens.get(token)
+            if postings is None:
+                continue
+            _discard(postings, key)
+            if not postings:
+                del self.tokens[token]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+        postings = self.categories.get(expense['category'])
+        if postings is not None:
+            _discard(postings, key)
+        _discard(self.keys, key)
+
+    def _prefix_tokens(self, prefix):
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        j = i
+        while j < len(self.vocabulary) and self.vocabulary[j].startswith(prefix):
+            j += 1
+        return self.vocabulary[i:j]
+
+    @staticmethod
+    def _clip(postings, first, last):
+        """The part of a key-sorted sequence between first and last inclusive"""
+        return postings[bisect.bisect_left(postings, first):bisect.bisect_right(postings, last)]
+
+    def search(self, text='', category=None, start=None, end=None):
+        """View keys of the matching rows, newest first.
+
+        Every word of text must appear in the description, the last one
+        possibly as the start of a word, so results narrow as you type.
+        start and end are inclusive 'YYYY-MM-DD' dates.
+        """
+        # Keys run from the newest date to the oldest
+        first = view_key(day_ordinal(end), 0) if end else -1 << 63
+        last = view_key(day_ordinal(start), ROWID_MASK) if start else (1 << 63) - 1
+        words = tokenize(text)
+        lists = [self.tokens.get(word, array('q')) for word in words[:-1]]
+        if category:
+            lists.append(self.categories.get(category, array('q')))
+        if words:
+            matches = self._prefix_tokens(words[-1])
+            if len(matches) == 1:
+                lists.append(self.tokens[matches[0]])
+            elif len(matches) > 1:
+                # Several words share the prefix: take their union
+                union = set()
+                for token in matches:
+                    union.update(self._clip(self.tokens[token], first, last))
+                lists.append(union)
+            else:
+                return array('q')
+        if not lists:
+            return self._clip(self.keys, first, last)
+        lists = [self._clip(keys, first, last) if isinstance(keys, array) else keys
+                 for keys in lists]
+        if len(lists) == 1 and isinstance(lists[0], array):
+            return lists[0]
+        lists.sort(key=len)
+        found = set(lists[0])
+        for keys in lists[1:]:
+            found.intersection_update(keys)
+        return array('q', sorted(found))
+
+    def matches(self, expense, text='', category=None, start=None, end=None):
+        """Whether one expense passes the same filters as search()"""
+        if category and expense['category'] != category:
+            return False
+        if (start and expense['date'] < start) or (end and expense['date'] > end):
+            return False
+        words = tokenize(text)
+        if words:
+            tokens = set(tokenize(expense['description']))
+            if any(word not in tokens for word in words[:-1]):
+                return False
+            if not any(token.startswith(words[-1]) for token in tokens):
+                return False
+        return True
+
+
+class IdIndex:
+    """Expense id -> rowid, so finding an expense by id is one dict lookup.
+
+    Ids are unique for everything the ledger adds, but ledgers written
+    before ids were allocated may repeat one; such an id maps to a tuple
+    of rowids instead of a single one.
+    """
+
+    def __init__(self, expenses):
+        self.rowids = {}
+        for expense_id, rowid in zip(expenses.ids, expenses.rowids):
+            self.add(rowid, expense_id)
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def add(self, rowid, expense_id):
+        known = self.rowids.get(expense_id)
+        if known is None:
+            self.rowids[expense_id] = rowid
+        elif isinstance(known, tuple):
+            self.rowids[expense_id] = known + (rowid,)
+        else:
+            self.rowids[expense_id] = (known, rowid)
+
+    def remove(self, rowid, expense_id):
+        known = self.rowids.get(expense_id)
+        if known == rowid:
+            del self.rowids[expense_id]
+        elif isinstance(known, tuple):
+            rest = tuple(r for r in known if r != rowid)
+            self.rowids[expense_id] = rest if len(rest) > 1 else rest[0]
+
+    def lookup(self, expense_id):
+        """Rowids of the expenses with this id, oldest first; () if none"""
+        known = self.rowids.get(expense_id)
+        if known is None:
+            return ()
+        return known if isinstance(known, tuple) else (known,)
+
+
+class SuggestionIndex:
+    """Past descriptions for as-you-type suggestions, kept in step on add and delete.
+
+    Descriptions that differ only in case and spacing share one entry in
+    `entries`: [score, last day, text as last written, rowids, days], the
+    rowids ascending with their days alongside. The score rises with both
+    how often and how recently the description was used. `keys` is the
+    sorted list of entry keys, so the entries starting with a prefix are a
+    bisect away; prefixes with too many of them to rank on every keystroke
+    keep their best entries in `top`, updated as scores change.
+    """
+
+    def __init__(self, expenses):
+        # Group positions by exact text first: far fewer texts than rows
+        # need normalizing, and each group's columns come out in one call
+        positions = {}
+        for i, description in enumerate(expenses.descriptions):
+            group = positions.get(description)
+            if group is None:
+                positions[description] = [i]
+            else:
+                group.append(i)
+        self.entries = {}
+        for description, group in positions.items():
+            pick = operator.itemgetter(*group) if len(group) > 1 else lambda column: (column[group[0]],)
+            rowids, days = pick(expenses.rowids), pick(expenses.days)
+            key = normalize_description(description)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = [0.0, max(days), description, array('q', rowids), array('i', days)]
+                continue
+            # Texts differing only in case or spacing: merge in rowid order
+            if max(days) >= entry[1]:
+                entry[1] = max(days)
+                entry[2] = description
+            merged = sorted(zip(entry[3] + array('q', rowids), entry[4] + array('i', days)))
+            entry[3] = array('q', [rowid for rowid, _ in merged])
+            entry[4] = array('i', [day for _, day in merged])
+        for entry in self.entries.values():
+            entry[0] = self._score(entry)
+        self.keys = sorted(self.entries)
+        self.top = {}
+        self._rank_broad_prefixes()
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def _score(entry):
+        # Ranking by count * 2 ** ((last day - today) / half-life) without
+        # depending on today, so scores only change when their rows do
+        return SUGGESTION_HALF_LIFE * math.log2(len(entry[3])) + entry[1]
+
+    def _range(self, prefix, first=0, last=None):
+        first = bisect.bisect_left(self.keys, prefix, first, len(self.keys) if last is None else last)
+        return first, bisect.bisect_left(self.keys, prefix + '\U0010ffff', first,
+                                         len(self.keys) if last is None else last)
+
+    def _rank(self, first, last):
+        entries = self.entries
+        return heapq.nlargest(SUGGESTION_COUNT, [(entries[key][0], key) for key in self.keys[first:last]])
+
+    def _rank_broad_prefixes(self):
+        # Find the broad prefixes level by level, each split into its broad
+        # children and runs of keys under narrow ones; then rank them deepest
+        # first, each from its broad children's rankings and its runs, so
+        # every key is scored once
+        keys = self.keys
+        found = []
+        ranges = [('', 0, len(keys))]
+        length = 1
+        while ranges:
+            broad = []
+            for parent, first, last in ranges:
+                parts = []
+                i = first
+                while i < last:
+                    if len(keys[i]) < length:
+                        j = i + 1
+                    else:
+                        prefix = keys[i][:length]
+                        j = self._range(prefix, i, last)[1]
+                        if j - i > SUGGESTION_SCAN_LIMIT:
+                            broad.append((prefix, i, j))
+                            parts.append(prefix)
+                            i = j
+                            continue
+                    if parts and not isinstance(parts[-1], str) and parts[-1][1] == i:
+                        parts[-1] = (parts[-1][0], j)
+                    else:
+                        parts.append((i, j))
+                    i = j
+                if parent:
+                    found.append((parent, parts))
+            ranges = broad
+            length += 1
+        for prefix, parts in reversed(found):
+            ranked = []
+            for part in parts:
+                ranked += self.top[part] if isinstance(part, str) else self._rank(*part)
+            self.top[prefix] = heapq.nlargest(SUGGESTION_COUNT, ranked)
+
+    def add(self, rowid, expense):
+        key = normalize_description(expense['description'])
+        day = day_ordinal(expense['date'])
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries[key] = [None, day, expense['description'], array('q'), array('i')]
+            bisect.insort(self.keys, key)
+        elif day >= entry[1]:
+            entry[1] = day
+            entry[2] = expense['description']
+        old = entry[0]
+        # Rowids only grow, so appending keeps them in order
+        entry[3].append(rowid)
+        entry[4].append(day)
+        entry[0] = self._score(entry)
+        self._rescore(key, old, entry[0])
+
+    def remove(self, rowid, expense):
+        key = normalize_description(expense['description'])
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        rowids = entry[3]
+        i = bisect.bisect_left(rowids, rowid)
+        if i == len(rowids) or rowids[i] != rowid:
+            return
+        day = entry[4][i]
+        del rowids[i]
+        del entry[4][i]
+        old = entry[0]
+        if rowids:
+            if day == entry[1]:
+                entry[1] = max(entry[4])
+            entry[0] = self._score(entry)
+        else:
+            del self.entries[key]
+            del self.keys[bisect.bisect_left(self.keys, key)]
+            entry[0] = None
+        self._rescore(key, old, entry[0])
+
+    def _rescore(self, key, old, new):
+        """Bring the ranked lists of key's prefixes up to date"""
+        for length in range(1, len(key) + 1):
+            prefix = key[:length]
+            top = self.top.get(prefix)
+            if top is None:
+                continue
+            if new is None or (old is not None and new < old):
+                # Only a listed entry that dropped can let one from outside
+                # the list in: rank the prefix again when next asked for it
+                if any(item[1] == key for item in top):
+                    del self.top[prefix]
+            else:
+                top = [item for item in top if item[1] != key]
+                top.append((new, key))
+                top.sort(reverse=True)
+                self.top[prefix] = top[:SUGGESTION_COUNT]
+
+    def suggest(self, text):
+        """Up to SUGGESTION_COUNT past descriptions starting with text, ignoring
+        case and spacing; the most used and most recently used first"""
+        prefix = normalize_description(text)
+        if not prefix:
+            return []
+        if text[-1].isspace():
+            prefix += ' '
+        first, last = self._range(prefix)
+        if last - first <= SUGGESTION_SCAN_LIMIT:
+            top = self._rank(first, last)
+        else:
+            top = self.top.get(prefix)
+            if top is None:
+                top = self.top[prefix] = self._rank(first, last)
+        return [self.entries[key][2] for _, key in top]
+
+    def recent_rows(self, description, count):
+        """Rowids of the latest count uses of a description, newest first"""
+        entry = self.entries.get(normalize_description(description))
+        if entry is None:
+            return []
+        rowids, days = entry[3], entry[4]
+        order = heapq.nlargest(count, range(len(rowids)), key=lambda i: (days[i], rowids[i]))
+        return [rowids[i] for i in order]
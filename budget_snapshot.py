@@ -0,0 +1,139 @@
+"""Binary snapshot format for the Personal Budget Tracker.
+
+A snapshot holds a whole ledger as fixed-width columns, so opening one maps
+the file and copies each column into a typed array in one go instead of
+parsing JSON and building a dict per expense. Descriptions stay UTF-8 in
+the mapping (see budget_columns.TextHeap) until a row is shown or searched.
+
+Layout, little-endian throughout, every column aligned to its item size
+(the 32-bit days and cats together take 8 bytes a row, so ends lands on
+an 8-byte boundary again):
+
+    magic       b'BTSNAP\\x01\\n'
+    header      rows, heap bytes, metadata bytes ('<QQQ')
+    ids         int64 per row
+    amounts     float64 per row
+    days        int32 per row, date ordinals
+    cats        uint32 per row, codes into the metadata's name table
+    ends        int64 per row, where each description ends in the heap
+    heap        the UTF-8 descriptions back to back
+    metadata    JSON: category name table, ledger categories, journal_seq
+
+The 'binary' backend (budget_storage.SnapshotStore) keeps a journal next to
+the snapshot just like the JSON one. To convert a ledger either way run
+python budget_storage.py budget_data.json budget_data.btsnap (or the
+reverse).
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from budget_columns import ColumnarExpenses, TextHeap
+
+SNAPSHOT_SUFFIX = '.btsnap'
+SNAPSHOT_MAGIC = b'BTSNAP\x01\n'
+SNAPSHOT_HEADER = struct.Struct('<QQQ')
+# Fixed-width columns in file order; ends follows them
+COLUMNS = (('ids', 'q'), ('amounts', 'd'), ('days', 'i'), ('cats', 'I'))
+# Bytes per row across the columns and ends
+ROW_BYTES = 32
+# Descriptions encoded per write
+WRITE_BATCH = 10000
+
+
+def snapshot_path(json_path):
+    """budget_data.btsnap for budget_data.json"""
+    return os.path.splitext(json_path)[0] + SNAPSHOT_SUFFIX
+
+
+def _little_endian(column):
+    if sys.byteorder == 'big':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def write_snapshot(f, expenses, categories, journal_seq=0):
+    """Write a ColumnarExpenses store to f, a binary file open for writing
+    that can seek. Descriptions already in a TextHeap are copied as bytes."""
+    rows = len(expenses)
+    f.write(SNAPSHOT_MAGIC + SNAPSHOT_HEADER.pack(0, 0, 0))
+    for name, _ in COLUMNS:
+        f.write(_little_endian(getattr(expenses, name)))
+    # The ends are only known once the heap is written: leave room for them
+    ends_at = f.tell()
+    f.seek(ends_at + 8 * rows)
+    descriptions = expenses.descriptions
+    if isinstance(descriptions, TextHeap):
+        encode = descriptions.encoded
+    else:
+        encode = lambda i: descriptions[i].encode('utf-8')
+    ends = array('q')
+    end = 0
+    for first in range(0, rows, WRITE_BATCH):
+        batch = [encode(i) for i in range(first, min(first + WRITE_BATCH, rows))]
+        for text in batch:
+            end += len(text)
+            ends.append(end)
+        f.write(b''.join(batch))
+    meta = json.dumps({
+        'category_names': expenses.category_names,
+        'categories': list(categories),
+        'journal_seq': journal_seq
+    }).encode('utf-8')
+    f.write(meta)
+    f.seek(ends_at)
+    f.write(_little_endian(ends))
+    f.seek(len(SNAPSHOT_MAGIC))
+    f.write(SNAPSHOT_HEADER.pack(rows, end, len(meta)))
+
+
+def read_snapshot(path):
+    """(ColumnarExpenses, categories, journal_seq) from a snapshot file.
+
+    The fixed-width columns are copied out of the mapping one memcpy each;
+    the descriptions stay in it and are decoded when read. Raises
+    ValueError for a file that isn't a complete snapshot.
+    """
+    start = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < start:
+            raise ValueError(f"{path} is not a budget snapshot")
+        if os.name == 'nt':
+            # Windows can't replace a mapped file, and compaction replaces the
+            # snapshot while the ledger may still hold its descriptions
+            data = f.read()
+        else:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(data)
+    if view[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise ValueError(f"{path} is not a budget snapshot")
+    rows, heap_size, meta_size = SNAPSHOT_HEADER.unpack_from(view, len(SNAPSHOT_MAGIC))
+    if start + ROW_BYTES * rows + heap_size + meta_size != len(view):
+        raise ValueError(f"{path} is truncated")
+
+    def column(typecode, offset):
+        values = array(typecode)
+        values.frombytes(view[offset:offset + values.itemsize * rows])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        return values
+
+    expenses = ColumnarExpenses()
+    offset = start
+    for name, typecode in COLUMNS:
+        setattr(expenses, name, column(typecode, offset))
+        offset += getattr(expenses, name).itemsize * rows
+    ends = column('q', offset)
+    offset += 8 * rows
+    starts = array('q', bytes(8)) + ends[:-1] if rows else array('q')
+    expenses.descriptions = TextHeap(view[offset:offset + heap_size], starts, ends)
+    meta = json.loads(str(view[offset + heap_size:], 'utf-8'))
+    expenses.rowids = array('q', range(rows))
+    expenses.next_rowid = rows
+    expenses.category_names = meta['category_names']
+    expenses.category_codes = {name: code for code, name in enumerate(expenses.category_names)}
+    return expenses, meta['categories'], meta['journal_seq']
@@ -0,0 +1,294 @@
+"""Running summary aggregates for the Personal Budget Tracker."""
+from array import array
+from datetime import date
+
+from budget_columns import ColumnarExpenses, day_ordinal, day_text
+
+# Float sums drift slightly after many adds and deletes
+TOLERANCE = 1e-6
+PERIODS = ('day', 'week', 'month', 'year')
+
+
+def _bump(sums, counts, key, amount, delta):
+    count = counts.get(key, 0) + delta
+    if count:
+        counts[key] = count
+        sums[key] = sums.get(key, 0) + amount * delta
+    else:
+        # Last expense for this key; drop it instead of keeping a drifted 0.0
+        counts.pop(key, None)
+        sums.pop(key, None)
+
+
+class PrefixSums:
+    """Amounts and counts per day in Fenwick trees (binary indexed trees).
+
+    Adding an expense and totalling any date range are both O(log days).
+    The trees cover first_day onwards and grow when a date falls outside
+    them; the plain per-day values are kept too, so growing is one O(days)
+    rebuild.
+    """
+
+    def __init__(self, day_sums=None, day_counts=None):
+        self.first_day = 0
+        self.amounts = array('d')
+        self.counts = array('q')
+        self.build(day_sums or {}, day_counts or {})
+
+    def build(self, day_sums, day_counts):
+        """(Re)build from {day ordinal: amount} and {day ordinal: count}"""
+        if day_counts:
+            self.first_day = min(day_counts)
+            size = max(day_counts) - self.first_day + 1
+        else:
+            size = 0
+        self.amounts = array('d', bytes(8 * size))
+        self.counts = array('q', bytes(8 * size))
+        for day, count in day_counts.items():
+            self.amounts[day - self.first_day] = day_sums[day]
+            self.counts[day - self.first_day] = count
+        self._build_trees()
+
+    def _build_trees(self):
+        # Linear-time Fenwick construction over 1-based trees
+        size = len(self.amounts)
+        self.amount_tree = array('d', [0.0]) + self.amounts
+        self.count_tree = array('q', [0]) + self.counts
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                self.amount_tree[parent] += self.amount_tree[i]
+                self.count_tree[parent] += self.count_tree[i]
+
+    def _grow(self, day):
+        size = len(self.amounts)
+        if not size:
+            self.first_day = day
+            pad_before, pad_after = 0, 1
+        elif day < self.first_day:
+            pad_before, pad_after = self.first_day - day, 0
+        else:
+            # Leave room ahead so adding today's expenses rarely regrows
+            pad_before, pad_after = 0, max(day - self.first_day + 1 - size, size)
+        self.first_day -= pad_before
+        self.amounts = array('d', bytes(8 * pad_before)) + self.amounts + array('d', bytes(8 * pad_after))
+        self.counts = array('q', bytes(8 * pad_before)) + self.counts + array('q', bytes(8 * pad_after))
+        self._build_trees()
+
+    def add(self, day, amount, count=1):
+        """Add amount (and count expenses) on a day ordinal; negative to remove"""
+        if not self.first_day <= day < self.first_day + len(self.amounts):
+            self._grow(day)
+        i = day - self.first_day
+        self.amounts[i] += amount
+        self.counts[i] += count
+        i += 1
+        size = len(self.amounts)
+        while i <= size:
+            self.amount_tree[i] += amount
+            self.count_tree[i] += count
+            i += i & -i
+
+    def _prefix(self, i):
+        """Totals of the first i days covered"""
+        amount, count = 0.0, 0
+        i = min(i, len(self.amounts))
+        while i > 0:
+            amount += self.amount_tree[i]
+            count += self.count_tree[i]
+            i -= i & -i
+        return amount, count
+
+    def total(self, first_day=None, last_day=None):
+        """(amount, count) from first_day to last_day inclusive, ordinals or None for open"""
+        lo = 0 if first_day is None else max(first_day - self.first_day, 0)
+        hi = len(self.amounts) if last_day is None else last_day - self.first_day + 1
+        if hi <= lo:
+            return 0.0, 0
+        high_amount, high_count = self._prefix(hi)
+        low_amount, low_count = self._prefix(lo)
+        count = high_count - low_count
+        # An empty range reports exactly 0 rather than float drift
+        return (high_amount - low_amount if count else 0.0), count
+
+
+def period_ranges(period, first_day, last_day):
+    """Yield (label, first, last) day ordinals for each day, ISO week, month
+    or year touching first_day..last_day, clipped to that range"""
+    if period not in PERIODS:
+        raise ValueError(f"unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+    start = date.fromordinal(first_day)
+    if period == 'week':
+        start = date.fromordinal(first_day - start.weekday())
+    elif period == 'month':
+        start = start.replace(day=1)
+    elif period == 'year':
+        start = start.replace(month=1, day=1)
+    while start.toordinal() <= last_day:
+        if period == 'day':
+            end = start
+            label = start.isoformat()
+        elif period == 'week':
+            end = date.fromordinal(start.toordinal() + 6)
+            year, week, _ = start.isocalendar()
+            label = f"{year}-W{week:02d}"
+        elif period == 'month':
+            following = (start.replace(year=start.year + 1, month=1) if start.month == 12
+                         else start.replace(month=start.month + 1))
+            end = date.fromordinal(following.toordinal() - 1)
+            label = start.strftime("%Y-%m")
+        else:
+            end = start.replace(month=12, day=31)
+            label = str(start.year)
+        yield label, max(start.toordinal(), first_day), min(end.toordinal(), last_day)
+        start = date.fromordinal(end.toordinal() + 1)
+
+
+class SummaryAggregates:
+    """Total, per-category, per-day and per-month sums kept up to date on every
+    add and delete, so a summary costs O(categories) instead of O(expenses).
+
+    `days` and `category_days` are PrefixSums over the day ordinal, overall
+    and per category, so totals for any date range cost O(log days).
+    """
+
+    def __init__(self, expenses=()):
+        # Bumped on every change so views can tell when their copy is stale
+        self.version = 0
+        self.rebuild(expenses)
+
+    def rebuild(self, expenses):
+        self.version += 1
+        self.total = 0
+        self.count = 0
+        self.category_sums = {}
+        self.category_counts = {}
+        self.day_sums = {}
+        self.day_counts = {}
+        self.month_sums = {}
+        self.month_counts = {}
+        # Per (category, date) totals, only to seed the prefix sums below
+        pair_sums = {}
+        pair_counts = {}
+        if isinstance(expenses, ColumnarExpenses):
+            self._rebuild_columns(expenses, pair_sums, pair_counts)
+        else:
+            for exp in expenses:
+                self._apply(exp, 1)
+                _bump(pair_sums, pair_counts, (exp['category'], exp['date']), exp['amount'], 1)
+        ordinals = {text: day_ordinal(text) for text in self.day_counts}
+        self.days = PrefixSums({ordinals[d]: v for d, v in self.day_sums.items()},
+                               {ordinals[d]: c for d, c in self.day_counts.items()})
+        by_category = {}
+        for (category, text), count in pair_counts.items():
+            sums, counts = by_category.setdefault(category, ({}, {}))
+            sums[ordinals[text]] = pair_sums[category, text]
+            counts[ordinals[text]] = count
+        self.category_days = {category: PrefixSums(sums, counts)
+                              for category, (sums, counts) in by_category.items()}
+
+    def _rebuild_columns(self, expenses, pair_sums, pair_counts):
+        """Fill the totals straight from the columns, without building an
+        expense dict (and decoding a description) per row"""
+        code_sums = {}
+        code_counts = {}
+        for code, day, amount in zip(expenses.cats, expenses.days, expenses.amounts):
+            key = code, day
+            code_sums[key] = code_sums.get(key, 0) + amount
+            code_counts[key] = code_counts.get(key, 0) + 1
+        names = expenses.category_names
+        texts = {}
+        for (code, day), count in code_counts.items():
+            text = texts.get(day)
+            if text is None:
+                text = texts[day] = day_text(day)
+            amount = code_sums[code, day]
+            pair_sums[names[code], text] = amount
+            pair_counts[names[code], text] = count
+            self.count += count
+            self.total += amount
+            for sums, counts, key in ((self.category_sums, self.category_counts, names[code]),
+                                      (self.day_sums, self.day_counts, text),
+                                      (self.month_sums, self.month_counts, text[:7])):
+                sums[key] = sums.get(key, 0) + amount
+                counts[key] = counts.get(key, 0) + count
+
+    def _apply(self, exp, delta):
+        amount = exp['amount']
+        self.version += 1
+        self.count += delta
+        self.total = self.total + amount * delta if self.count else 0
+        _bump(self.category_sums, self.category_counts, exp['category'], amount, delta)
+        _bump(self.day_sums, self.day_counts, exp['date'], amount, delta)
+        _bump(self.month_sums, self.month_counts, exp['date'][:7], amount, delta)
+
+    def _index(self, exp, delta):
+        day = day_ordinal(exp['date'])
+        self.days.add(day, exp['amount'] * delta, delta)
+        category_days = self.category_days.get(exp['category'])
+        if category_days is None:
+            category_days = self.category_days[exp['category']] = PrefixSums()
+        category_days.add(day, exp['amount'] * delta, delta)
+
+    def add(self, exp):
+        self._apply(exp, 1)
+        self._index(exp, 1)
+
+    def remove(self, exp):
+        self._apply(exp, -1)
+        self._index(exp, -1)
+
+    def category_totals(self):
+        return dict(self.category_sums)
+
+    @staticmethod
+    def _bounds(start, end):
+        return (day_ordinal(start) if start else None), (day_ordinal(end) if end else None)
+
+    def range_total(self, start=None, end=None):
+        """(amount, count) between two 'YYYY-MM-DD' dates inclusive; None is open"""
+        return self.days.total(*self._bounds(start, end))
+
+    def range_category_totals(self, start=None, end=None):
+        """{category: (amount, count)} between two dates, categories with expenses only"""
+        first, last = self._bounds(start, end)
+        totals = {}
+        for category, category_days in self.category_days.items():
+            amount, count = category_days.total(first, last)
+            if count:
+                totals[category] = (amount, count)
+        return totals
+
+    def rollup(self, period, start=None, end=None):
+        """[(label, count, amount)] per day, ISO week, month or year, oldest
+        first, skipping periods without expenses. The range defaults to the
+        first and last dates with expenses."""
+        if not self.day_counts:
+            return []
+        first, last = self._bounds(start or min(self.day_counts), end or max(self.day_counts))
+        rows = []
+        for label, lo, hi in period_ranges(period, first, last):
+            amount, count = self.days.total(lo, hi)
+            if count:
+                rows.append((label, count, amount))
+        return rows
+
+    def verify(self, expenses):
+        """Compare against a full recompute over expenses; return the mismatches"""
+        fresh = SummaryAggregates(expenses)
+        problems = []
+        if abs(self.total - fresh.total) > TOLERANCE or self.count != fresh.count:
+            problems.append(f"total: {self.total} ({self.count}) != {fresh.total} ({fresh.count})")
+        for name in ('category', 'day', 'month'):
+            sums, fresh_sums = getattr(self, name + '_sums'), getattr(fresh, name + '_sums')
+            counts, fresh_counts = getattr(self, name + '_counts'), getattr(fresh, name + '_counts')
+            for key in set(sums) | set(fresh_sums):
+                if (counts.get(key) != fresh_counts.get(key)
+                        or abs(sums.get(key, 0) - fresh_sums.get(key, 0)) > TOLERANCE):
+                    problems.append(f"{name} {key}: {sums.get(key)} != {fresh_sums.get(key)}")
+        for category in set(self.category_sums) | set(fresh.category_sums):
+            mine = self.range_category_totals().get(category, (0, 0))
+            theirs = fresh.range_category_totals().get(category, (0, 0))
+            if mine[1] != theirs[1] or abs(mine[0] - theirs[0]) > TOLERANCE:
+                problems.append(f"prefix sums {category}: {mine} != {theirs}")
+        return problems
@@ -0,0 +1,1148 @@
+"""Storage engines for the Personal Budget Tracker.
+
+Several app instances may share one ledger. Writes to the JSON files happen
+under an advisory lock on DATA_FILE + '.lock', and every backend can tell
+whether another instance changed the files (changed()) and report just what
+changed (read_changes()) so the ledger can merge it in place.
+
+The partitioned backend splits the journal ledger into one file per year and
+only reads older years when asked to (see PartitionedStore); the binary one
+keeps its snapshot in the memory-mapped format of budget_snapshot.
+
+Run as a script to convert a ledger between the formats:
+
+    python budget_storage.py budget_data.json budget_data.btsnap
+"""
+import contextlib
+import heapq
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+from budget_columns import ColumnarExpenses
+from budget_snapshot import SNAPSHOT_SUFFIX, read_snapshot, snapshot_path, write_snapshot
+from budget_trace import TRACER
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+JOURNAL_SUFFIX = '.journal'
+LOCK_SUFFIX = '.lock'
+# budget_data.json -> budget_data.manifest.json next to budget_data.2024.json etc.
+MANIFEST_SUFFIX = '.manifest.json'
+# Largest expenses recorded per partition, for all-time top lists
+MANIFEST_TOP_EXPENSES = 10
+# The next free expense id is kept in DATA_FILE + '.ids' (or the database's)
+# and reserved this many ids at a time, so most adds never touch the file
+IDS_SUFFIX = '.ids'
+ID_BLOCK = 64
+# Number of journal records after which the log is folded into the snapshot
+COMPACT_THRESHOLD = 500
+
+
+def _fsync_dir(path):
+    """Flush the directory entry of path so a rename survives a crash"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return  # Windows has no directory fsync
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def file_lock(path, shared=False):
+    """Hold an advisory lock on path + '.lock' for the duration of the block.
+
+    Readers take it shared and writers exclusive, so app instances sharing
+    a ledger never interleave their writes. Locks are per open file, so two
+    threads of one process exclude each other too; don't nest them. Yields
+    the lock file for bump_generation().
+    """
+    with open(path + LOCK_SUFFIX, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        else:
+            # msvcrt only has exclusive locks; LK_LOCK retries for 10 seconds
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield f
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def read_generation(path):
+    """How many times the files of the ledger at path have been replaced.
+
+    The count lives in the lock file. mtime and size alone can't tell two
+    quick rewrites apart, and renamed temp files recycle inode numbers.
+    """
+    try:
+        with open(path + LOCK_SUFFIX, 'rb') as f:
+            return int(f.read() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def bump_generation(lock):
+    """Count one more replacement; call with the exclusive lock held"""
+    lock.seek(0)
+    generation = int(lock.read() or 0) + 1
+    lock.truncate(0)
+    lock.write(b'%d' % generation)
+    lock.flush()
+    return generation
+
+
+def file_stamp(path):
+    """(generation, mtime, size) of the ledger file at path, with None for
+    mtime and size if it doesn't exist; mtime and size catch edits made
+    without the lock"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return read_generation(path), None, None
+    return read_generation(path), st.st_mtime_ns, st.st_size
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def record_key(exp):
+    return exp['id'], exp['amount'], exp['category'], exp['description'], exp['date']
+
+
+def replay(expenses, ops):
+    """Apply ('add', expense) and ('delete', id) operations to a list of
+    expenses; a delete removes every earlier expense with that id"""
+    live = [True] * len(expenses)
+    positions = {}
+    for i, exp in enumerate(expenses):
+        positions.setdefault(exp['id'], []).append(i)
+    for op, arg in ops:
+        if op == 'add':
+            positions.setdefault(arg['id'], []).append(len(expenses))
+            expenses.append(arg)
+            live.append(True)
+        else:
+            for i in positions.pop(arg, []):
+                live[i] = False
+    return [exp for exp, alive in zip(expenses, live) if alive]
+
+
+def replay_columns(expenses, ops):
+    """replay() on a ColumnarExpenses, in place; returns it"""
+    positions = None  # expense id -> rowids, built on the first delete
+    doomed = []
+    for op, arg in ops:
+        if op == 'add':
+            rowid = expenses.append(arg)
+            if positions is not None:
+                positions.setdefault(arg['id'], []).append(rowid)
+            continue
+        if positions is None:
+            positions = {}
+            for rowid, expense_id in zip(expenses.rowids, expenses.ids):
+                positions.setdefault(expense_id, []).append(rowid)
+        doomed += positions.pop(arg, [])
+    if doomed:
+        expenses.pop_many(doomed)
+    return expenses
+
+
+def replace_atomic(path, write, mode='w'):
+    """Call write(f) on a temp file, fsync it, then rename it over path"""
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, mode) as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def write_atomic(path, data, indent=4):
+    """Write data as JSON to a temp file, fsync it, then rename it over path"""
+    replace_atomic(path, lambda f: json.dump(data, f, indent=indent))
+
+
+class IdAllocator:
+    """Hands out expense ids that are never reused, across restarts and
+    between instances sharing a ledger.
+
+    Ids are reserved from the counter in path + '.ids' a block at a time
+    under the ledger's file lock. release() hands back what is left of the
+    block unless another instance reserved after it, in which case those
+    ids are skipped: ids always increase but may have gaps.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.counter_path = path + IDS_SUFFIX
+        self.next_id = 0
+        self.limit = 0  # end of the reserved block
+
+    def reserve(self, count, floor):
+        """First of count consecutive new ids. floor() is called once, on
+        the first reservation and before taking the lock (it may need it),
+        for the smallest id the ledger's existing expenses leave free
+        (ledgers from before the counter have none)."""
+        if self.next_id + count > self.limit:
+            lowest = self.limit or floor()
+            with file_lock(self.path):
+                first = max(self._stored(), lowest)
+                self.next_id, self.limit = first, first + max(count, ID_BLOCK)
+                write_atomic(self.counter_path, {'next_id': self.limit})
+        first = self.next_id
+        self.next_id += count
+        return first
+
+    def release(self):
+        """Return the unused rest of the block to the counter if it is still the last one"""
+        if self.next_id < self.limit:
+            with file_lock(self.path):
+                if self._stored() == self.limit:
+                    write_atomic(self.counter_path, {'next_id': self.next_id})
+            self.limit = self.next_id
+
+    def _stored(self):
+        try:
+            with open(self.counter_path, 'r') as f:
+                return json.load(f)['next_id']
+        except FileNotFoundError:
+            return 1
+
+
+class StorageBackend:
+    """Interface the app persists expenses through.
+
+    Backends with incremental = False cannot record a single add or delete and
+    are saved in full instead. Totals and other queries are answered from
+    memory by the ledger (see budget_stats.SummaryAggregates), whatever the
+    backend.
+    """
+    incremental = False
+
+    def load(self):
+        """Return (expenses, categories)"""
+        raise NotImplementedError
+
+    def save(self, expenses, categories):
+        raise NotImplementedError
+
+    def add(self, expense):
+        raise NotImplementedError
+
+    def delete(self, expense_id):
+        raise NotImplementedError
+
+    def apply(self, ops):
+        """Write a batch of ('add', expense) / ('delete', id) operations"""
+        for op, arg in ops:
+            getattr(self, op)(arg)
+
+    def needs_compaction(self):
+        """True when a full save would make the next load cheaper"""
+        return False
+
+    def changed(self):
+        """True if another instance may have changed the ledger since we
+        last read or wrote it; cheap enough to poll"""
+        return False
+
+    def read_changes(self):
+        """What other instances changed since we last looked: None,
+        ('ops', [('add', expense) / ('delete', id), ...]) or ('snapshot',
+        expenses, categories) with the whole ledger to compare against. A
+        fourth snapshot item (first day, last day) limits the comparison to
+        the expenses dated in that range."""
+        return None
+
+    def unloaded_partitions(self, start=None, end=None):
+        """Names of partitions not read yet holding dates in start..end
+        ('YYYY-MM-DD', None for open), oldest first"""
+        return []
+
+    def load_partitions(self, names):
+        """Read these partitions; returns their expenses"""
+        return []
+
+    def partition_summaries(self):
+        """summarize_partition() entries for the partitions not read yet"""
+        return []
+
+    def close(self, expenses, categories):
+        """Flush anything outstanding before the app exits"""
+
+
+class JsonBackend(StorageBackend):
+    """The original single JSON file, rewritten in full on every save.
+
+    To rewrite the file without dropping another instance's changes, it
+    remembers which expenses the ledger's copy was built from (`base`,
+    hashes of the records) and merges what changed in the file since into
+    the expenses being saved. Until read_changes() hands the merged file to
+    the ledger, every save merges again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None
+        self.base = Counter()
+        self.merged = False  # a save took in changes the ledger hasn't seen
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return [], []
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        return data.get('expenses', []), data.get('categories', [])
+
+    def load(self):
+        with file_lock(self.path, shared=True):
+            expenses, categories = self._read()
+            self.stamp = file_stamp(self.path)
+        self.base = Counter(hash(record_key(exp)) for exp in expenses)
+        return expenses, categories
+
+    def save(self, expenses, categories):
+        expenses = list(expenses)
+        categories = list(categories)
+        with file_lock(self.path) as lock:
+            stamp = file_stamp(self.path)
+            # The ledger holds what it asks us to save, merged or not
+            base = Counter(hash(record_key(exp)) for exp in expenses)
+            # A deleted file has nothing to merge; ours simply replaces it
+            if stamp[1] is None:
+                self.merged = False
+            elif stamp != self.stamp or self.merged:
+                theirs, their_categories = self._read()
+                hashes = [hash(record_key(exp)) for exp in theirs]
+                fresh = Counter(hashes) - self.base
+                gone = self.base - Counter(hashes)
+                if gone:
+                    kept = []
+                    for exp in expenses:
+                        h = hash(record_key(exp))
+                        if gone[h]:
+                            gone[h] -= 1
+                        else:
+                            kept.append(exp)
+                    expenses = kept
+                for exp, h in zip(theirs, hashes):
+                    if fresh[h]:
+                        fresh[h] -= 1
+                        expenses.append(exp)
+                categories += [c for c in their_categories if c not in categories]
+                self.merged = True
+            write_atomic(self.path, {'expenses': expenses, 'categories': categories})
+            bump_generation(lock)
+            self.stamp = file_stamp(self.path)
+        self.base = base
+
+    def changed(self):
+        return self.merged or file_stamp(self.path) != self.stamp
+
+    def read_changes(self):
+        self.merged = False
+        return ('snapshot',) + self.load()
+
+
+def _journal_op(record):
+    if record['op'] == 'add':
+        return 'add', record['expense']
+    return 'delete', record['id']
+
+
+class JournalStore(StorageBackend):
+    """JSON snapshot plus an append-only log of single add/delete records.
+
+    Every record carries a sequence number and the snapshot remembers the
+    last sequence it contains, so replay after a crash mid-compaction never
+    applies a record twice.
+
+    Instances sharing the files append under the file lock, first reading
+    any records others appended since (`offset` is how far into the journal
+    this instance has read) so sequence numbers stay unique. Those records
+    wait in `incoming` until read_changes() hands them to the ledger. A
+    compaction bumps the lock file's generation and starts the new journal
+    with a 'snapshot' marker carrying the snapshot's sequence number, so
+    other instances reread it from the start and number on from there.
+    """
+    incremental = True
+
+    def __init__(self, path):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.seq = 0  # last sequence number written
+        self.pending = 0  # journal records not yet folded into the snapshot
+        self.snapshot_seq = 0  # last sequence number held by the snapshot
+        self.stamp = None  # file_stamp() of the snapshot we last read or wrote
+        self.offset = 0  # bytes of the journal read so far
+        self.generation = 0  # read_generation() when that journal was started
+        self.incoming = []  # other instances' operations not yet read_changes()d
+        self._lock = threading.Lock()  # guards seq and the journal file
+        self._torn = False
+
+    def load(self):
+        """Return (expenses, categories) from the snapshot plus the journal tail"""
+        with file_lock(self.path) as lock:
+            return self._load(lock)
+
+    def _read_snapshot(self):
+        """(expenses, categories, journal_seq) from the snapshot file"""
+        if not os.path.exists(self.path):
+            return [], [], 0
+        with open(self.path, 'r') as f:
+            data = json.load(f)
+        return data.get('expenses', []), list(data.get('categories', [])), data.get('journal_seq', 0)
+
+    def _write_snapshot(self, expenses, categories, seq):
+        write_atomic(self.path, {
+            'expenses': expenses,
+            'categories': categories,
+            'journal_seq': seq
+        })
+
+    def _replay(self, expenses, ops):
+        return replay(list(expenses), ops)
+
+    def _load(self, lock):
+        expenses, categories, snapshot_seq = self._read_snapshot()
+
+        # Replay in order; an id may be deleted and later re-added
+        self.seq, self.pending, self.snapshot_seq = snapshot_seq, 0, snapshot_seq
+        records = list(self._read_journal())
+        if self._torn:
+            # Drop the partial line so later appends start on a fresh line
+            self._rewrite_journal(records)
+            bump_generation(lock)
+        self.stamp = file_stamp(self.path)
+        self.offset, self.generation = _file_size(self.journal_path), self.stamp[0]
+        self.incoming = []
+        ops = []
+        for record in records:
+            if record['seq'] <= snapshot_seq or record['op'] == 'snapshot':
+                continue
+            self.seq = record['seq']
+            self.pending += 1
+            ops.append(_journal_op(record))
+            if record['op'] == 'add' and record['expense']['category'] not in categories:
+                categories.append(record['expense']['category'])
+        return self._replay(expenses, ops), categories
+
+    def _catch_up(self):
+        """Move records other instances appended since offset into incoming
+        (call with the file lock held)"""
+        generation = read_generation(self.path)
+        if generation != self.generation:
+            # Another instance compacted the journal: read the new one from the start
+            self.offset, self.generation = 0, generation
+        if _file_size(self.journal_path) == self.offset:
+            return
+        with open(self.journal_path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        # A line still being written has no newline yet; leave it for later
+        complete = data[:data.rfind(b'\n') + 1]
+        self.offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record['seq'] > self.seq:
+                self.seq = record['seq']
+                if record['op'] != 'snapshot':
+                    self.pending += 1
+                    self.incoming.append(_journal_op(record))
+
+    def _read_journal(self):
+        self._torn = False
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    self._torn = True  # torn final write from a crash
+                    return
+
+    def _rewrite_journal(self, records):
+        tmp_path = self.journal_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        _fsync_dir(self.journal_path)
+
+    def _append(self, records):
+        # One write and one fsync however many records are in the batch
+        with file_lock(self.path), self._lock:
+            self._catch_up()
+            lines = []
+            for record in records:
+                self.seq += 1
+                record['seq'] = self.seq
+                lines.append(json.dumps(record) + '\n')
+            with open(self.journal_path, 'a') as f:
+                f.writelines(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self.offset = _file_size(self.journal_path)
+            self.pending += len(records)
+
+    def add(self, expense):
+        self._append([{'op': 'add', 'expense': expense}])
+
+    def delete(self, expense_id):
+        self._append([{'op': 'delete', 'id': expense_id}])
+
+    def apply(self, ops):
+        self._append([
+            {'op': 'add', 'expense': arg} if op == 'add' else {'op': 'delete', 'id': arg}
+            for op, arg in ops
+        ])
+
+    def needs_compaction(self):
+        return self.pending >= COMPACT_THRESHOLD
+
+    def close(self, expenses, categories):
+        # Fold the journal into the snapshot so the next start reads one file
+        if self.pending:
+            self.save(expenses, categories)
+
+    def save(self, expenses, categories):
+        """Fold the journal into a new snapshot of expenses and categories.
+
+        The lists must reflect every record this instance wrote, which holds
+        when saves and appends go through the same BackgroundWriter queue;
+        records other instances appended are folded in as well. If another
+        instance replaced the snapshot since we read it, ours would undo
+        its changes, so nothing is written until read_changes() catches up.
+        Returns the expenses written, None if nothing was.
+        """
+        with file_lock(self.path) as lock:
+            if file_stamp(self.path) != self.stamp:
+                return None
+            with self._lock:
+                self._catch_up()
+                seq = self.seq
+                expenses = self._replay(expenses, self.incoming)
+                categories = list(categories)
+                categories += [arg['category'] for op, arg in self.incoming
+                               if op == 'add' and arg['category'] not in categories]
+            self._write_snapshot(expenses, categories, seq)
+            self.snapshot_seq = seq
+            with self._lock:
+                # Nothing can append while we hold the file lock, but keep
+                # any record past seq rather than trust that
+                tail = [r for r in self._read_journal() if r['seq'] > seq]
+                self._rewrite_journal([{'op': 'snapshot', 'seq': seq}] + tail)
+                bump_generation(lock)
+                self.stamp = file_stamp(self.path)
+                self.offset, self.generation = _file_size(self.journal_path), self.stamp[0]
+                self.pending = len(tail)
+        return expenses
+
+    def changed(self):
+        return (bool(self.incoming) or file_stamp(self.path) != self.stamp
+                or _file_size(self.journal_path) != self.offset)
+
+    def read_changes(self):
+        with file_lock(self.path) as lock:
+            if file_stamp(self.path) != self.stamp:
+                # Another instance folded the journal into a new snapshot
+                return ('snapshot',) + self._load(lock)
+            with self._lock:
+                self._catch_up()
+                ops, self.incoming = self.incoming, []
+        return ('ops', ops) if ops else None
+
+
+class SnapshotStore(JournalStore):
+    """JournalStore with a binary snapshot (see budget_snapshot) instead of
+    JSON. load() maps the file rather than parsing it and returns a
+    ColumnarExpenses whose descriptions are only decoded when read; saves
+    copy descriptions that are still undecoded straight across as bytes.
+    """
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path):
+            return ColumnarExpenses(), [], 0
+        return read_snapshot(self.path)
+
+    def _write_snapshot(self, expenses, categories, seq):
+        replace_atomic(self.path, lambda f: write_snapshot(f, expenses, categories, seq), 'wb')
+
+    def _replay(self, expenses, ops):
+        if not isinstance(expenses, ColumnarExpenses):
+            return replay_columns(ColumnarExpenses(expenses), ops)
+        # The ledger may hand over its own store: never change it
+        return replay_columns(expenses.copy(), ops) if ops else expenses
+
+
+def summarize_partition(expenses, stamp):
+    """Manifest entry for one partition: count, total and highest id,
+    [amount, count] per category and per 'YYYY-MM' month, its largest
+    expenses, and the stamp of the files it was computed from"""
+    total = 0.0
+    max_id = 0
+    categories = {}
+    months = {}
+    for exp in expenses:
+        amount = exp['amount']
+        total += amount
+        max_id = max(max_id, exp['id'])
+        for table, key in ((categories, exp['category']), (months, exp['date'][:7])):
+            entry = table.get(key)
+            if entry is None:
+                table[key] = [amount, 1]
+            else:
+                entry[0] += amount
+                entry[1] += 1
+    return {
+        'count': len(expenses),
+        'total': total,
+        'max_id': max_id,
+        'categories': categories,
+        'months': months,
+        'top': heapq.nlargest(MANIFEST_TOP_EXPENSES, expenses, key=lambda exp: exp['amount']),
+        'stamp': stamp
+    }
+
+
+class PartitionedStore(StorageBackend):
+    """The journal ledger split into one JournalStore per calendar year.
+
+    budget_data.json becomes budget_data.2024.json, budget_data.2023.json
+    and so on, plus budget_data.manifest.json holding summarize_partition()
+    for each year. load() reads the manifest and the current year only;
+    load_partitions() reads older years when a query reaches into them, and
+    partition_summaries() answers all-time totals for the rest from the
+    manifest. An entry is only trusted while its stamp matches the year's
+    files; otherwise the year is read once to recompute it.
+    """
+    incremental = True
+
+    def __init__(self, path):
+        self.path = path
+        self.root, self.ext = os.path.splitext(path)
+        self.manifest_path = self.root + MANIFEST_SUFFIX
+        self.manifest = {}  # year -> summarize_partition() entry
+        self.manifest_stamp = None
+        self.categories = []
+        self.stores = {}  # year -> JournalStore, for the years read so far
+        self.year_of = {}  # expense id -> year, to route deletes
+
+    def partition_path(self, year):
+        return f"{self.root}.{year}{self.ext}"
+
+    def _stamp(self, year):
+        path = self.partition_path(year)
+        return list(file_stamp(path)) + [_file_size(path + JOURNAL_SUFFIX)]
+
+    def _store_stamp(self, store):
+        # What _stamp() was under the store's file lock in its load() or save()
+        return list(store.stamp) + [store.offset]
+
+    def years(self):
+        """Every year with a partition file, journal or manifest entry"""
+        folder = os.path.dirname(os.path.abspath(self.path))
+        prefix = os.path.basename(self.root) + '.'
+        found = set(self.manifest)
+        for name in os.listdir(folder):
+            if name.endswith(JOURNAL_SUFFIX):
+                name = name[:-len(JOURNAL_SUFFIX)]
+            if name.startswith(prefix) and name.endswith(self.ext):
+                year = name[len(prefix):len(name) - len(self.ext)]
+                if len(year) == 4 and year.isdigit():
+                    found.add(year)
+        return found
+
+    def _read_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, 'r') as f:
+                data = json.load(f)
+            self.manifest = data.get('partitions', {})
+            self.categories = list(data.get('categories', []))
+        self.manifest_stamp = file_stamp(self.manifest_path)
+
+    def _write_manifest(self, entries, categories):
+        """Store these {year: entry or None} on top of the manifest on disk"""
+        with file_lock(self.path):
+            # Keep what other instances recorded since we read it
+            self._read_manifest()
+            for year, entry in entries.items():
+                if entry is None:
+                    self.manifest.pop(year, None)
+                else:
+                    self.manifest[year] = entry
+            self.categories += [c for c in categories if c not in self.categories]
+            write_atomic(self.manifest_path, {'partitions': self.manifest, 'categories': self.categories})
+            self.manifest_stamp = file_stamp(self.manifest_path)
+
+    def load(self):
+        """Return (expenses, categories) for the current year (and any later one)"""
+        if (not os.path.exists(self.manifest_path) and not self.years()
+                and (os.path.exists(self.path) or os.path.exists(self.path + JOURNAL_SUFFIX))):
+            self._migrate()
+        self._read_manifest()
+        self.stores = {}
+        self.year_of = {}
+        current = str(date.today().year)
+        expenses = self.load_partitions({current} | {year for year in self.years() if year > current})
+        return expenses, list(self.categories)
+
+    def _migrate(self):
+        # Split an unpartitioned ledger (snapshot and journal) by year; the
+        # original files are left in place
+        expenses, categories = JournalStore(self.path).load()
+        self.save(expenses, categories)
+        self.stores = {}
+
+    def unloaded_partitions(self, start=None, end=None):
+        first = start[:4] if start else '0000'
+        last = end[:4] if end else '9999'
+        return sorted(year for year in self.years()
+                      if year not in self.stores and first <= year <= last)
+
+    def load_partitions(self, names):
+        expenses = []
+        for year in sorted(names):
+            if year in self.stores:
+                continue
+            store = JournalStore(self.partition_path(year))
+            rows, categories = store.load()
+            self.stores[year] = store
+            for exp in rows:
+                self.year_of[exp['id']] = year
+            self.categories += [c for c in categories if c not in self.categories]
+            expenses += rows
+        return expenses
+
+    def partition_summaries(self):
+        stale = {}
+        unloaded = [year for year in self.years() if year not in self.stores]
+        for year in unloaded:
+            entry = self.manifest.get(year)
+            # Entries written before max_id was recorded are recomputed too
+            if entry is None or entry['stamp'] != self._stamp(year) or 'max_id' not in entry:
+                # Written since the manifest entry was made: read it once
+                store = JournalStore(self.partition_path(year))
+                rows, _ = store.load()
+                stale[year] = summarize_partition(rows, self._store_stamp(store))
+        if stale:
+            self._write_manifest(stale, [])
+        return [self.manifest[year] for year in unloaded]
+
+    def _store(self, year):
+        store = self.stores.get(year)
+        if store is None:
+            # A year that had no files when the ledger looked (it reads
+            # existing ones with load_partitions() before adding to them).
+            # Another instance may have started it since; its expenses
+            # reach the ledger through read_changes() like any other.
+            store = self.stores[year] = JournalStore(self.partition_path(year))
+            rows, _ = store.load()
+            store.incoming = [('add', exp) for exp in rows]
+        return store
+
+    def add(self, expense):
+        self.apply([('add', expense)])
+
+    def delete(self, expense_id):
+        self.apply([('delete', expense_id)])
+
+    def apply(self, ops):
+        # One journal write per year touched
+        by_year = {}
+        for op, arg in ops:
+            if op == 'add':
+                year = self.year_of[arg['id']] = arg['date'][:4]
+            else:
+                year = self.year_of.pop(arg, None)
+                if year is None:
+                    continue
+            by_year.setdefault(year, []).append((op, arg))
+        for year, year_ops in by_year.items():
+            self._store(year).apply(year_ops)
+
+    def needs_compaction(self):
+        return any(store.needs_compaction() for store in list(self.stores.values()))
+
+    def save(self, expenses, categories):
+        """Write a snapshot of each year read so far and update its manifest
+        entry; expenses must hold exactly those years, so no save may be
+        queued while load_partitions() runs"""
+        categories = list(categories)
+        by_year = {year: [] for year in list(self.stores)}
+        for exp in expenses:
+            by_year.setdefault(exp['date'][:4], []).append(exp)
+        entries = {}
+        for year, rows in by_year.items():
+            store = self._store(year)
+            written = store.save(rows, categories)
+            # Not written: another instance replaced the snapshot, so the
+            # entry is recomputed from the files once needed
+            entries[year] = (summarize_partition(written, self._store_stamp(store))
+                             if written is not None else None)
+        self._write_manifest(entries, categories)
+
+    def close(self, expenses, categories):
+        if any(store.pending for store in self.stores.values()):
+            self.save(expenses, categories)
+
+    def changed(self):
+        return (file_stamp(self.manifest_path) != self.manifest_stamp
+                or any(store.changed() for store in list(self.stores.values())))
+
+    def read_changes(self):
+        """Changes to one year at a time; changed() stays true until all are read"""
+        if file_stamp(self.manifest_path) != self.manifest_stamp:
+            self._read_manifest()
+        for year, store in list(self.stores.items()):
+            if not store.changed():
+                continue
+            change = store.read_changes()
+            if change is None:
+                continue
+            if change[0] == 'ops':
+                for op, arg in change[1]:
+                    if op == 'add':
+                        self.year_of[arg['id']] = year
+                    else:
+                        self.year_of.pop(arg, None)
+                return change
+            _, rows, categories = change
+            for exp in rows:
+                self.year_of[exp['id']] = year
+            span = date(int(year), 1, 1).toordinal(), date(int(year), 12, 31).toordinal()
+            return 'snapshot', rows, categories, span
+        return None
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite ledger with indexes on id, date and category.
+
+    Every batch of adds and deletes is one committed transaction, and
+    deletes by id are indexed lookups.
+    """
+    incremental = True
+
+    def __init__(self, path):
+        self.path = path
+        # Written from the BackgroundWriter thread, queried from the UI thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS expenses (
+                seq INTEGER PRIMARY KEY,
+                id INTEGER NOT NULL,
+                amount REAL NOT NULL,
+                category TEXT NOT NULL,
+                description TEXT NOT NULL,
+                date TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_expenses_id ON expenses (id);
+            CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date);
+            CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category, amount);
+            CREATE TABLE IF NOT EXISTS categories (name TEXT PRIMARY KEY);
+        ''')
+        self.conn.commit()
+        self.data_version = self._data_version()
+
+    def _data_version(self):
+        # Changes whenever another connection commits to the database
+        with self._lock:
+            return self.conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def load(self):
+        with self._lock, self.conn:
+            # One read transaction, so data_version matches what was read
+            self.conn.execute('BEGIN')
+            # seq keeps insertion order, matching the JSON list
+            rows = self.conn.execute(
+                'SELECT id, amount, category, description, date FROM expenses ORDER BY seq').fetchall()
+            categories = [row[0] for row in self.conn.execute('SELECT name FROM categories')]
+            self.data_version = self.conn.execute('PRAGMA data_version').fetchone()[0]
+        expenses = [
+            {'id': row[0], 'amount': row[1], 'category': row[2],
+             'description': row[3], 'date': row[4]}
+            for row in rows
+        ]
+        return expenses, categories
+
+    def save(self, expenses, categories):
+        """Replace the whole ledger, unless another connection has committed
+        since we last read it: every change of ours is already in the
+        database then, and rewriting it would undo theirs"""
+        with self._lock, self.conn:
+            # Take the write lock first so the check and the rewrite are atomic
+            self.conn.execute('BEGIN IMMEDIATE')
+            if self.conn.execute('PRAGMA data_version').fetchone()[0] != self.data_version:
+                return
+            self.conn.execute('DELETE FROM expenses')
+            self.conn.execute('DELETE FROM categories')
+            self.conn.executemany(
+                'INSERT INTO expenses (id, amount, category, description, date) '
+                'VALUES (:id, :amount, :category, :description, :date)',
+                expenses)
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO categories (name) VALUES (?)',
+                [(c,) for c in categories])
+
+    def _add(self, expense):
+        self.conn.execute(
+            'INSERT INTO expenses (id, amount, category, description, date) '
+            'VALUES (:id, :amount, :category, :description, :date)',
+            expense)
+        self.conn.execute(
+            'INSERT OR IGNORE INTO categories (name) VALUES (?)',
+            (expense['category'],))
+
+    def _delete(self, expense_id):
+        self.conn.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+
+    def add(self, expense):
+        self.apply([('add', expense)])
+
+    def delete(self, expense_id):
+        self.apply([('delete', expense_id)])
+
+    def apply(self, ops):
+        # The whole batch is one transaction
+        with self._lock, self.conn:
+            for op, arg in ops:
+                if op == 'add':
+                    self._add(arg)
+                else:
+                    self._delete(arg)
+
+    def close(self, expenses, categories):
+        with self._lock:
+            self.conn.close()
+
+    def changed(self):
+        return self._data_version() != self.data_version
+
+    def read_changes(self):
+        return ('snapshot',) + self.load()
+
+
+class BackgroundWriter:
+    """Runs a backend's writes on a dedicated thread, coalescing bursts.
+
+    Operations are queued from the UI thread and written once no new one has
+    arrived for `delay` seconds: everything before the last queued save is
+    covered by that save's snapshot and dropped, and the adds and deletes
+    after it go to the backend as one batch. Each write reports
+    (ok, message) on the `results` queue for the UI thread to poll.
+    """
+
+    def __init__(self, backend, delay=0.5):
+        self.backend = backend
+        self.delay = delay
+        self.results = queue.Queue()
+        self._ops = []
+        self._last_submit = 0
+        self._busy = False
+        self._urgent = False
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def add(self, expense):
+        self._submit(('add', expense))
+
+    def add_many(self, expenses):
+        self._submit(*[('add', expense) for expense in expenses])
+
+    def delete(self, expense_id):
+        self._submit(('delete', expense_id))
+
+    def delete_many(self, expense_ids):
+        self._submit(*[('delete', expense_id) for expense_id in expense_ids])
+
+    def save(self, expenses, categories):
+        """Queue a full save; pass copies, the lists are written later"""
+        self._submit(('save', (expenses, categories)))
+
+    def _submit(self, *ops):
+        with self._cond:
+            self._ops.extend(ops)
+            self._last_submit = time.monotonic()
+            self._cond.notify()
+
+    def pending(self):
+        with self._cond:
+            return bool(self._ops) or self._busy
+
+    def flush(self):
+        """Write everything queued now and block until it is on disk"""
+        with self._cond:
+            self._urgent = True
+            self._cond.notify()
+            while self._ops or self._busy:
+                self._cond.wait()
+            self._urgent = False
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Debounce: wait for a quiet spell unless asked to flush
+                while not self._stopping:
+                    if self._ops:
+                        remaining = self._last_submit + self.delay - time.monotonic()
+                        if self._urgent or remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                if self._stopping and not self._ops:
+                    return
+                ops, self._ops = self._ops, []
+                self._busy = True
+            try:
+                self._write(ops)
+                self.results.put((True, f"{len(ops)} change(s) saved"))
+            except Exception as e:
+                self.results.put((False, str(e)))
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def _write(self, ops):
+        saves = [i for i, (op, _) in enumerate(ops) if op == 'save']
+        if saves:
+            expenses, categories = ops[saves[-1]][1]
+            if self.backend.incremental:
+                # Record the changes the snapshot covers as well: if another
+                # instance has replaced the files, the backend skips the
+                # snapshot and these are what carries our changes over
+                earlier = [op for op in ops[:saves[-1]] if op[0] != 'save']
+                if earlier:
+                    with TRACER.span('storage.apply'):
+                        self.backend.apply(earlier)
+            with TRACER.span('storage.save'):
+                self.backend.save(expenses, categories)
+            ops = ops[saves[-1] + 1:]
+        if ops:
+            with TRACER.span('storage.apply'):
+                self.backend.apply(ops)
+
+
+def migrate_json_to_sqlite(json_path, db_path):
+    """Copy a JSON ledger (and any journal tail) into a new SQLite database"""
+    expenses, categories = JournalStore(json_path).load()
+    backend = SQLiteBackend(db_path)
+    backend.save(expenses, categories)
+    return backend
+
+
+# convert_ledger() formats by file extension
+LEDGER_FORMATS = {'.json': JournalStore, SNAPSHOT_SUFFIX: SnapshotStore, '.db': SQLiteBackend}
+
+
+def _ledger_format(path):
+    store = LEDGER_FORMATS.get(os.path.splitext(path)[1].lower())
+    if store is None:
+        raise ValueError(f"{path}: expected a {', '.join(LEDGER_FORMATS)} file")
+    return store
+
+
+def convert_ledger(source, target):
+    """Copy the ledger at source (snapshot and journal tail) into a new one
+    at target, each in the format its extension names; returns the number
+    of expenses copied"""
+    source_format, target_format = _ledger_format(source), _ledger_format(target)
+    if not os.path.exists(source) and not os.path.exists(source + JOURNAL_SUFFIX):
+        raise FileNotFoundError(f"{source} does not exist")
+    if os.path.exists(target):
+        raise FileExistsError(f"{target} already exists")
+    source_store = source_format(source)
+    expenses, categories = source_store.load()
+    if source_format is SQLiteBackend:
+        source_store.close(None, None)
+    target_store = target_format(target)
+    if target_format is SQLiteBackend:
+        target_store.save(expenses, categories)
+        target_store.close(None, None)
+    else:
+        target_store.load()
+        target_store.save(expenses, categories)
+    return len(expenses)
+
+
+BACKENDS = ('json', 'journal', 'sqlite', 'partitioned', 'binary')
+
+
+def open_backend(name, json_path, db_path):
+    """Create the backend selected by name.
+
+    The first time the SQLite, partitioned or binary backend is chosen, an
+    existing JSON ledger is migrated into the new database, split by year
+    or converted to a binary snapshot.
+    """
+    if name == 'json':
+        return JsonBackend(json_path)
+    if name == 'journal':
+        return JournalStore(json_path)
+    if name == 'sqlite':
+        if not os.path.exists(db_path) and os.path.exists(json_path):
+            return migrate_json_to_sqlite(json_path, db_path)
+        return SQLiteBackend(db_path)
+    if name == 'partitioned':
+        return PartitionedStore(json_path)
+    if name == 'binary':
+        path = snapshot_path(json_path)
+        if (not os.path.exists(path) and not os.path.exists(path + JOURNAL_SUFFIX)
+                and (os.path.exists(json_path) or os.path.exists(json_path + JOURNAL_SUFFIX))):
+            convert_ledger(json_path, path)
+        return SnapshotStore(path)
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) != 3:
+        sys.exit("usage: python budget_storage.py <source> <target>  (.json, .btsnap or .db files)")
+    try:
+        count = convert_ledger(sys.argv[1], sys.argv[2])
+    except (OSError, ValueError) as e:
+        sys.exit(f"error: {e}")
+    print(f"Converted {count:,} expenses from {sys.argv[1]} to {sys.argv[2]}")
@@ -0,0 +1,71 @@
+"""Background tasks for the Personal Budget Tracker's Tk app.
+
+TaskRunner runs functions on a small thread pool and hands their results
+back to the Tk thread, which calls poll() from root.after:
+
+    runner.submit('summary', compute, start, end, on_done=show)
+
+Tasks are named and at most one per name is live: submitting again cancels
+the older one. A task that hasn't started is dropped from the pool; one
+that has is told through the Event passed as its first argument and should
+return early at its next check. Either way its callbacks never run.
+
+Threads rather than processes: the tasks read the ledger's columns, which
+would otherwise be pickled for every request, and the heavy lifting
+(NumPy, matplotlib's Agg renderer) spends much of its time outside the GIL.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+TASK_WORKERS = 2
+
+
+class TaskRunner:
+    """Named, cancellable tasks on a thread pool, finished on the caller's thread"""
+
+    def __init__(self, workers=TASK_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='budget-task')
+        self.tasks = {}
+
+    def submit(self, name, func, *args, on_done, on_error=None):
+        """Run func(cancelled, *args) on the pool, cancelling any task already
+        called name. poll() later calls on_done(result), or on_error(exception)
+        if func raised (the exception is re-raised without on_error)."""
+        self.cancel(name)
+        cancelled = threading.Event()
+        future = self.executor.submit(func, cancelled, *args)
+        self.tasks[name] = (future, cancelled, on_done, on_error)
+
+    def cancel(self, name):
+        task = self.tasks.pop(name, None)
+        if task is not None:
+            future, cancelled, _, _ = task
+            cancelled.set()
+            future.cancel()
+
+    def pending(self, name=None):
+        """Whether the named task, or any task, is still waiting for poll()"""
+        return name in self.tasks if name else bool(self.tasks)
+
+    def poll(self):
+        """Call the callbacks of the tasks that have finished; True while
+        others are still running"""
+        for name, (future, _, on_done, on_error) in list(self.tasks.items()):
+            if not future.done():
+                continue
+            del self.tasks[name]
+            try:
+                result = future.result()
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+            else:
+                on_done(result)
+        return bool(self.tasks)
+
+    def shutdown(self):
+        """Cancel everything and let the workers go without waiting for them"""
+        for name in list(self.tasks):
+            self.cancel(name)
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,131 @@
+"""Timing spans for the Personal Budget Tracker.
+
+TRACER is shared by the ledger core, the Tk app and the command line tool.
+It starts disabled; while disabled span() hands back one shared no-op
+context manager and wrap()/instrument() leave functions untouched, so the
+spans left in the code cost next to nothing.
+
+    with TRACER.span('storage.load'):
+        ...
+
+Each span adds to a per-name count, total and longest duration. With
+events kept, every span is also recorded for a Chrome trace, which
+chrome://tracing and https://ui.perfetto.dev open.
+"""
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+NULL_SPAN = contextlib.nullcontext()
+# Events kept for a Chrome trace; later spans are only counted
+MAX_EVENTS = 1000000
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'began')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.began = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.began, time.perf_counter() - self.began)
+
+
+class Tracer:
+    """Counts and durations per span name, optionally with every span as an event.
+
+    `totals` and `recent` map a name to [count, total seconds, longest
+    seconds]; `recent` only covers the time since the last take_recent().
+    Spans may be recorded from any thread.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.keep_events = False
+        self.totals = {}
+        self.recent = {}
+        self.events = []
+        self.dropped = 0
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enable(self, keep_events=False):
+        self.enabled = True
+        self.keep_events = keep_events
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, began, duration):
+        with self._lock:
+            for table in (self.totals, self.recent):
+                entry = table.get(name)
+                if entry is None:
+                    table[name] = [1, duration, duration]
+                else:
+                    entry[0] += 1
+                    entry[1] += duration
+                    if duration > entry[2]:
+                        entry[2] = duration
+            if self.keep_events:
+                if len(self.events) < MAX_EVENTS:
+                    self.events.append((name, began, duration, threading.get_ident()))
+                else:
+                    self.dropped += 1
+
+    def wrap(self, func, name=None):
+        """func timed as a span named name (default func's name); func itself while disabled"""
+        if not self.enabled:
+            return func
+        name = name or func.__name__
+
+        @functools.wraps(func)
+        def traced(*args, **kwargs):
+            with _Span(self, name):
+                return func(*args, **kwargs)
+        return traced
+
+    def instrument(self, obj, names):
+        """Replace the named methods on obj with traced ones; nothing while disabled"""
+        if self.enabled:
+            for name in names:
+                setattr(obj, name, self.wrap(getattr(obj, name)))
+
+    def take_recent(self):
+        """The `recent` table, starting a new one"""
+        with self._lock:
+            recent, self.recent = self.recent, {}
+        return recent
+
+    def report(self):
+        """The totals as a text table, most total time first"""
+        rows = sorted(self.totals.items(), key=lambda item: item[1][1], reverse=True)
+        width = max([len(name) for name in self.totals] + [4])
+        lines = [f"{'Span':<{width}}  {'Count':>8}  {'Total ms':>10}  {'Mean ms':>9}  {'Max ms':>9}"]
+        for name, (count, total, longest) in rows:
+            lines.append(f"{name:<{width}}  {count:>8,}  {total * 1000:>10.1f}  "
+                         f"{total / count * 1000:>9.2f}  {longest * 1000:>9.2f}")
+        return '\n'.join(lines)
+
+    def write_chrome_trace(self, path):
+        """Write the kept events in Chrome's trace event format"""
+        pid = os.getpid()
+        with self._lock:
+            events = [{'name': name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                       'ts': (began - self.origin) * 1e6, 'dur': duration * 1e6}
+                      for name, began, duration, tid in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms',
+                       'otherData': {'dropped_events': self.dropped}}, f)
+
+
+TRACER = Tracer()
@@ -1,21 +1,56 @@
-import json
+import base64
+import bisect
+import contextlib
+import importlib.util
+import io
 import os
-from datetime import datetime
+import queue
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+# Startup clock for REPORT_STARTUP_TIME, started before tkinter is imported
+START_TIME = time.perf_counter()
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
-try:
-    import matplotlib.pyplot as plt
-    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-    MATPLOTLIB = True
-except ImportError:
-    MATPLOTLIB = False
-try:
-    import pandas as pd
-    PANDAS = True
-except ImportError:
-    PANDAS = False
-
-DATA_FILE = 'budget_data.json'
+# matplotlib is slow to import, so it is only checked for here and imported
+# the first time the Summary tab is opened (see load_chart_libraries)
+MATPLOTLIB = importlib.util.find_spec('matplotlib') is not None
+mpl_style = None
+Figure = None
+FigureCanvasAgg = None
+from budget_analytics import Analytics
+from budget_columns import key_rowid
+from budget_core import DATA_FILE, SAVE_DELAY, SQLITE_FILE, STORAGE_BACKEND, Ledger, largest_expenses
+from budget_duplicates import DuplicateIndex, duplicate_extras, find_duplicates
+from budget_io import EXPORT_CHUNK_SIZE, ExportJob, ImportJob
+from budget_search import SUGGESTION_COUNT, SuggestionIndex
+from budget_tasks import TaskRunner
+from budget_trace import TRACER
+
+# Above this many expenses the View tab only creates Treeview items for the
+# rows on screen and pages the rest in as it scrolls
+VIRTUAL_TABLE_THRESHOLD = 5000
+# The View tab's filters are applied once typing pauses for this many ms
+FILTER_DELAY_MS = 250
+# Cross-check the running summary totals against a full recompute whenever
+# the summary is generated (debugging aid)
+VERIFY_AGGREGATES = False
+# Print the time from startup until the window is first drawn
+REPORT_STARTUP_TIME = '--startup-time' in sys.argv
+# Tracing: --trace shows a live timing readout under the status bar and prints
+# a table of spans on exit, --trace-file PATH also writes a Chrome trace and
+# --profile PATH writes cProfile stats (for pstats or snakeviz) on exit
+TRACE_FILE = sys.argv[sys.argv.index('--trace-file') + 1] if '--trace-file' in sys.argv[:-1] else None
+PROFILE_FILE = sys.argv[sys.argv.index('--profile') + 1] if '--profile' in sys.argv[:-1] else None
+TRACE = '--trace' in sys.argv or TRACE_FILE is not None
+TRACE_READOUT_MS = 500
+# App methods timed as spans while tracing, on top of every Tk callback
+TRACED_METHODS = ('load_data', 'save_data', 'add_expense', 'refresh_view', 'render_virtual',
+                  'apply_filters', 'load_older', 'delete_expense', 'show_summary', 'show_chart')
+# How often the Tk thread checks for finished summary and chart tasks
+TASK_POLL_MS = 50
 
 # Premium color scheme with elegant tones
 COLORS = {
@@ -49,14 +84,161 @@ FONTS = {
     'treeview_heading': ('Segoe UI', 9, 'bold')
 }
 
+# Summary tab period presets and breakdowns (see period_bounds)
+SUMMARY_PERIODS = ("All time", "This week", "This month", "Last month",
+                   "This year", "Last 12 months", "Custom")
+SUMMARY_BREAKDOWNS = {"None": None, "Daily": 'day', "Weekly": 'week', "Monthly": 'month', "Yearly": 'year'}
+SUMMARY_TOP_EXPENSES = 5
+# Keys in the description field that steer the suggestion list rather than edit the text
+SUGGESTION_KEYS = ('Up', 'Down', 'Return', 'KP_Enter', 'Escape', 'Tab')
+# Groups listed in the duplicate review window; Merge All Exact covers them all
+DUPLICATE_GROUPS_SHOWN = 500
+
+
+def period_bounds(name, today):
+    """('YYYY-MM-DD' or None, 'YYYY-MM-DD' or None) for a SUMMARY_PERIODS preset"""
+    if name == "This week":
+        start = today - timedelta(days=today.weekday())
+    elif name == "This month":
+        start = today.replace(day=1)
+    elif name == "Last month":
+        end = today.replace(day=1) - timedelta(days=1)
+        return end.replace(day=1).isoformat(), end.isoformat()
+    elif name == "This year":
+        start = today.replace(month=1, day=1)
+    elif name == "Last 12 months":
+        start = (today.replace(day=1, year=today.year - 1) + timedelta(days=32)).replace(day=1)
+    else:
+        return None, None
+    return start.isoformat(), today.isoformat()
+
+
+def load_chart_libraries():
+    # The chart is drawn off-screen with the Agg renderer on a worker thread,
+    # so neither pyplot nor the Tk backend is needed
+    global MATPLOTLIB, mpl_style, Figure, FigureCanvasAgg
+    if MATPLOTLIB and Figure is None:
+        try:
+            import matplotlib.style as mpl_style
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+        except ImportError:
+            MATPLOTLIB = False
+
+
+def summary_details(cancelled, expenses, start, end, stored_top):
+    """(percentiles 50 and 90, largest expenses) for a summary; runs on a
+    worker thread over a copy of the ledger's columns"""
+    with TRACER.span('summary.analytics'):
+        analytics = Analytics(expenses)
+        typical = analytics.percentiles((50, 90), start, end)
+        if cancelled.is_set():
+            return None
+        top = analytics.top_expenses(SUMMARY_TOP_EXPENSES, start, end)
+        if stored_top:
+            top = largest_expenses(top + stored_top, SUMMARY_TOP_EXPENSES)
+    return typical, top
+
+
+def build_suggestion_index(cancelled, expenses):
+    return SuggestionIndex(expenses)
+
+
+def build_duplicate_index(cancelled, expenses):
+    return DuplicateIndex(expenses)
+
+
+def scan_duplicates(cancelled, expenses):
+    with TRACER.span('duplicates.scan'):
+        return find_duplicates(expenses, cancelled=cancelled)
+
+
+# matplotlib's style and rc settings are global, so charts are drawn one at a time
+CHART_LOCK = threading.Lock()
+
+
+def chart_style():
+    # Modern chart styling, applied only while the chart is drawn
+    for name in ('seaborn-v0_8-darkgrid', 'seaborn-darkgrid'):
+        if name in mpl_style.available:
+            return mpl_style.context(name)
+    return contextlib.nullcontext()
+
+
+def render_chart(cancelled, cat_totals):
+    """The category pie as PNG bytes; runs on a worker thread.
+
+    Each chart gets a fresh Figure on an Agg canvas: nothing registers it
+    with pyplot, so it is freed once the image is taken.
+    """
+    with CHART_LOCK:
+        if cancelled.is_set():
+            return None
+        with TRACER.span('summary.chart'), chart_style():
+            figure = Figure(figsize=(8, 6), facecolor='white')
+            canvas = FigureCanvasAgg(figure)
+            ax = figure.add_subplot()
+            
+            # Color palette
+            colors = ['#3498DB', '#27AE60', '#E74C3C', '#F39C12', '#9B59B6', '#1ABC9C', '#E67E22']
+            
+            wedges, texts, autotexts = ax.pie(
+                cat_totals.values(),
+                labels=cat_totals.keys(),
+                autopct='%1.1f%%',
+                colors=colors[:len(cat_totals)],
+                startangle=90,
+                textprops={'fontsize': 8, 'fontweight': 'bold'}
+            )
+            
+            ax.set_title("Spending by Category", fontsize=12, fontweight='bold', pad=20, 
+                        fontfamily='serif', color=COLORS['text_primary'])
+            
+            # Make percentage text more visible
+            for autotext in autotexts:
+                autotext.set_color('white')
+                autotext.set_fontweight('bold')
+            
+            figure.tight_layout()
+            png = io.BytesIO()
+            canvas.print_png(png)
+    return png.getvalue()
+
+
+class TracedCallWrapper(tk.CallWrapper):
+    """Times each Tk callback (event handlers, commands, after) as a 'tk <name>' span"""
+
+    def __init__(self, func, subst, widget):
+        super().__init__(func, subst, widget)
+        self.span_name = 'tk ' + getattr(func, '__name__', type(func).__name__)
+
+    def __call__(self, *args):
+        with TRACER.span(self.span_name):
+            return super().__call__(*args)
+
+
 class BudgetTrackerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Personal Budget Tracker")
         self.root.geometry("1000x700")
         self.root.configure(bg=COLORS['bg_light'])
-        self.expenses = []
-        self.categories = set(['Food', 'Transport', 'Entertainment', 'Utilities', 'Other'])
+        if TRACER.enabled:
+            # Callbacks registered from here on go through TracedCallWrapper
+            tk.CallWrapper = TracedCallWrapper
+            TRACER.instrument(self, TRACED_METHODS)
+        # Expenses, categories, totals and persistence all live in the ledger;
+        # this class only presents them
+        self.ledger = Ledger(STORAGE_BACKEND, DATA_FILE, SQLITE_FILE, SAVE_DELAY)
+        self.import_job = None
+        self.export_job = None
+        # Summary figures and the chart are worked out off the Tk thread
+        self.tasks = TaskRunner()
+        self.polling_tasks = False
+        self.summary_version = None
+        self.duplicates_window = None
+        self.tree = None  # set once the View tab is built
+        self.startup_time = None
         self.load_data()
         
         # Configure style
@@ -80,6 +262,31 @@ class BudgetTrackerApp:
         )
         title_label.pack(pady=18)
         
+        # Status bar for background save results
+        self.status_var = tk.StringVar()
+        self.status_label = tk.Label(
+            root,
+            textvariable=self.status_var,
+            font=FONTS['body'],
+            bg=COLORS['bg_card'],
+            fg=COLORS['text_secondary'],
+            anchor='w',
+            padx=12
+        )
+        self.status_label.pack(fill=tk.X, side=tk.BOTTOM)
+        if TRACER.enabled:
+            self.trace_var = tk.StringVar(value="⏱ Tracing...")
+            tk.Label(
+                root,
+                textvariable=self.trace_var,
+                font=FONTS['body'],
+                bg=COLORS['bg_card'],
+                fg=COLORS['text_secondary'],
+                anchor='w',
+                padx=12
+            ).pack(fill=tk.X, side=tk.BOTTOM)
+            self.root.after(TRACE_READOUT_MS, self.update_trace_readout)
+        
         # Tabs with modern styling
         self.tab_control = ttk.Notebook(root, style='Custom.TNotebook')
         self.add_tab = tk.Frame(self.tab_control, bg=COLORS['bg_light'])
@@ -90,20 +297,43 @@ class BudgetTrackerApp:
         self.tab_control.add(self.summary_tab, text="Summary")
         self.tab_control.pack(expand=1, fill="both", padx=10, pady=10)
         
+        # Only the Add tab is built up front; the others are built when first opened
+        self.tab_builders = {
+            str(self.view_tab): self.setup_view_tab,
+            str(self.summary_tab): self.setup_summary_tab
+        }
+        self.tab_control.bind('<<NotebookTabChanged>>', self.on_tab_changed)
         self.setup_add_tab()
-        self.setup_view_tab()
-        self.setup_summary_tab()
         
         # Menu with elegant styling
         menubar = tk.Menu(root, font=FONTS['body'], bg=COLORS['bg_card'], fg=COLORS['text_primary'])
         filemenu = tk.Menu(menubar, tearoff=0, font=FONTS['body'], bg=COLORS['bg_card'], fg=COLORS['text_primary'])
         filemenu.add_command(label="Save", command=self.save_data)
         filemenu.add_command(label="Load", command=lambda: self.load_data(show_message=True))
+        filemenu.add_command(label="Import...", command=self.import_file)
+        filemenu.add_command(label="Export...", command=self.export_file)
+        filemenu.add_command(label="Find Duplicates...", command=self.find_duplicates)
         filemenu.add_separator()
-        filemenu.add_command(label="Exit", command=root.quit)
+        filemenu.add_command(label="Exit", command=self.on_exit)
         menubar.add_cascade(label="File", menu=filemenu)
         root.config(menu=menubar)
+        root.protocol("WM_DELETE_WINDOW", self.on_exit)
+        root.after_idle(self.report_startup)
+        self.poll_writer()
     
+    def on_tab_changed(self, event=None):
+        builder = self.tab_builders.pop(self.tab_control.select(), None)
+        if builder:
+            builder()
+
+    def report_startup(self):
+        # Idle callbacks run once pending redraws are done, i.e. after the first frame
+        self.root.update_idletasks()
+        self.startup_time = time.perf_counter() - START_TIME
+        if REPORT_STARTUP_TIME:
+            print(f"Time to first frame: {self.startup_time * 1000:.0f} ms")
+        self.build_indexes()
+
     def create_scrollable_frame(self, parent):
         """Create a scrollable frame with canvas and scrollbar"""
         # Create main container
@@ -192,26 +422,94 @@ class BudgetTrackerApp:
                        relief=tk.FLAT)
 
     def load_data(self, show_message=False):
-        if os.path.exists(DATA_FILE):
-            try:
-                with open(DATA_FILE, 'r') as f:
-                    data = json.load(f)
-                    self.expenses = data.get('expenses', [])
-                    self.categories.update(data.get('categories', []))
-                if show_message:
-                    messagebox.showinfo("Loaded", "Data loaded successfully.")
-            except:
-                if show_message:
-                    messagebox.showerror("Error", "Failed to load data.")
+        try:
+            self.ledger.load()
+            if self.tree is not None:
+                self.refresh_categories()
+                self.refresh_view()
+            if self.startup_time is not None:
+                self.build_indexes()
+            if show_message:
+                messagebox.showinfo("Loaded", "Data loaded successfully.")
+        except Exception:
+            if show_message:
+                messagebox.showerror("Error", "Failed to load data.")
 
     def save_data(self):
-        data = {'expenses': self.expenses, 'categories': list(self.categories)}
+        """Queue a full save; the result shows up in the status bar"""
+        self.ledger.save()
+        self.set_status("💾 Saving...")
+
+    def set_status(self, text, color=COLORS['text_secondary']):
+        self.status_var.set(text)
+        self.status_label.config(fg=color)
+
+    def drain_writer_results(self):
+        for ok, message in self.ledger.writer_results():
+            stamp = datetime.now().strftime("%H:%M:%S")
+            if ok:
+                self.set_status(f"💾 {message} at {stamp}", COLORS['success'])
+            else:
+                self.set_status(f"⚠ Save failed at {stamp}: {message} (use File > Save to retry)",
+                                COLORS['danger'])
+
+    def poll_writer(self):
+        self.drain_writer_results()
+        self.merge_external_changes()
+        self.ledger.compact_if_needed()
+        self.root.after(200, self.poll_writer)
+
+    def merge_external_changes(self):
+        """Pick up what another window or the CLI wrote to the same ledger"""
+        try:
+            change = self.ledger.sync()
+        except (OSError, ValueError) as e:
+            self.set_status(f"⚠ Failed to read changes from another window: {e}", COLORS['danger'])
+            return
+        if change is None:
+            return
+        added, removed = change
+        if not added and not removed:
+            return
+        self.refresh_categories()
+        if self.tree is not None:
+            for key, _ in removed:
+                self.view_discard(key)
+            for rowid in added:
+                self.view_insert(rowid)
+            self.update_filter_label()
+        if (str(self.summary_tab) not in self.tab_builders
+                and self.tab_control.select() == str(self.summary_tab)):
+            self.show_summary()
+        stamp = datetime.now().strftime("%H:%M:%S")
+        self.set_status(f"🔄 Merged {len(added):,} added and {len(removed):,} removed expenses "
+                        f"from another window at {stamp}", COLORS['accent'])
+
+    def update_trace_readout(self):
+        """Show the slowest Tk callback and the busiest spans since the last readout"""
+        recent = TRACER.take_recent()
+        callbacks = {name: entry for name, entry in recent.items() if name.startswith('tk ')}
+        parts = []
+        if callbacks:
+            name, (_, _, longest) = max(callbacks.items(), key=lambda item: item[1][2])
+            count = sum(entry[0] for entry in callbacks.values())
+            parts.append(f"{count} Tk callbacks, slowest {name[3:]} {longest * 1000:.1f} ms")
+        spans = sorted((item for item in recent.items() if item[0] not in callbacks),
+                       key=lambda item: item[1][1], reverse=True)
+        for name, (count, total, _) in spans[:3]:
+            parts.append(f"{name} {total * 1000:.1f} ms" + (f" ×{count}" if count > 1 else ""))
+        if parts:
+            self.trace_var.set("⏱ " + "  ·  ".join(parts))
+        self.root.after(TRACE_READOUT_MS, self.update_trace_readout)
+
+    def on_exit(self):
         try:
-            with open(DATA_FILE, 'w') as f:
-                json.dump(data, f, indent=4)
-            messagebox.showinfo("Success", "💾 Data saved successfully!")
+            self.ledger.close()
         except Exception as e:
-            messagebox.showerror("Error", f"Failed to save data: {str(e)}")
+            if not messagebox.askyesno("Error", f"Failed to save data: {str(e)}\n\nExit anyway?"):
+                return
+        self.tasks.shutdown()
+        self.root.quit()
 
     def setup_add_tab(self):
         # Create scrollable frame
@@ -281,13 +579,13 @@ class BudgetTrackerApp:
         self.category_combo = ttk.Combobox(
             fields_frame,
             textvariable=self.category_var,
-            values=sorted(self.categories),
+            values=sorted(self.ledger.categories),
             font=FONTS['body'],
             width=29,
-            state='readonly',
             style='Custom.TCombobox'
         )
         self.category_combo.grid(row=1, column=1, padx=15, pady=12, ipady=6, sticky='ew')
+        self.category_combo.bind('<KeyRelease>', self.on_category_key)
         
         # Description field
         desc_label = tk.Label(
@@ -336,34 +634,538 @@ class BudgetTrackerApp:
             width=18
         )
         add_button.pack()
+        
+        # Past descriptions matching what has been typed, floating under the
+        # entry; picking one also fills in the usual category and amount
+        self.suggestion_list = tk.Listbox(
+            form_frame,
+            font=FONTS['body'],
+            height=SUGGESTION_COUNT,
+            activestyle='none',
+            exportselection=False,
+            relief=tk.FLAT,
+            bd=0,
+            highlightthickness=1,
+            highlightbackground=COLORS['border'],
+            bg=COLORS['bg_card'],
+            fg=COLORS['text_primary'],
+            selectbackground=COLORS['accent'],
+            selectforeground=COLORS['white']
+        )
+        self.suggestions_shown = False
+        self.suggestion_list.bind('<ButtonRelease-1>', lambda e: self.pick_suggestion())
+        self.desc_entry.bind('<KeyRelease>', self.on_desc_key)
+        self.desc_entry.bind('<Down>', lambda e: self.step_suggestion(1))
+        self.desc_entry.bind('<Up>', lambda e: self.step_suggestion(-1))
+        self.desc_entry.bind('<Return>', lambda e: self.pick_suggestion())
+        self.desc_entry.bind('<Escape>', lambda e: self.hide_suggestions())
+        # Hide a moment later so a click on the list still lands
+        self.desc_entry.bind('<FocusOut>', lambda e: self.root.after(200, self.hide_suggestions))
+
+    def build_indexes(self):
+        """Index past descriptions and duplicate keys on workers now rather
+        than on the first keystroke and the first add. The keystrokes never
+        build the suggestion index themselves, so one whose expenses changed
+        while it was built is built again."""
+        version = self.ledger.stats.version
+        expenses = self.ledger.expenses.copy()
+        if self.ledger.suggestions is None:
+            self.tasks.submit('suggestions', build_suggestion_index, expenses,
+                              on_done=lambda index: self.index_built(self.ledger.adopt_suggestion_index,
+                                                                     index, version))
+        if self.ledger.duplicates is None:
+            self.tasks.submit('duplicate index', build_duplicate_index, expenses,
+                              on_done=lambda index: self.index_built(self.ledger.adopt_duplicate_index,
+                                                                     index, version))
+        self.poll_tasks_soon()
+
+    def index_built(self, adopt, index, version):
+        adopt(index, version)
+        # Not adopted if an edit came in meanwhile; rebuild once neither build is running
+        if (not self.tasks.pending('suggestions') and not self.tasks.pending('duplicate index')
+                and (self.ledger.suggestions is None or self.ledger.duplicates is None)):
+            self.build_indexes()
+
+    def on_desc_key(self, event):
+        if event.keysym in SUGGESTION_KEYS or event.keysym.startswith(('Shift', 'Control', 'Alt')):
+            return
+        text = self.desc_entry.get()
+        suggestions = self.ledger.suggest(text, build=False) if text.strip() else []
+        if not suggestions or suggestions == [text]:
+            self.hide_suggestions()
+            return
+        self.suggestion_list.delete(0, tk.END)
+        self.suggestion_list.insert(tk.END, *suggestions)
+        self.suggestion_list.configure(height=len(suggestions))
+        self.suggestion_list.place(in_=self.desc_entry, x=0, rely=1.0, relwidth=1.0)
+        self.suggestion_list.lift()
+        self.suggestions_shown = True
+
+    def hide_suggestions(self):
+        if self.suggestions_shown:
+            self.suggestion_list.place_forget()
+            self.suggestions_shown = False
+
+    def step_suggestion(self, step):
+        if not self.suggestions_shown:
+            return
+        current = self.suggestion_list.curselection()
+        if current:
+            i = min(max(current[0] + step, 0), self.suggestion_list.size() - 1)
+        else:
+            i = 0 if step > 0 else self.suggestion_list.size() - 1
+        self.suggestion_list.selection_clear(0, tk.END)
+        self.suggestion_list.selection_set(i)
+        self.suggestion_list.see(i)
+        return 'break'
+
+    def pick_suggestion(self):
+        current = self.suggestion_list.curselection() if self.suggestions_shown else ()
+        if not current:
+            return
+        description = self.suggestion_list.get(current[0])
+        self.hide_suggestions()
+        self.desc_entry.delete(0, tk.END)
+        self.desc_entry.insert(0, description)
+        usual = self.ledger.usual_expense(description, build=False)
+        if usual:
+            category, amount = usual
+            self.category_var.set(category)
+            # Keep an amount that has already been typed
+            if not self.amount_entry.get().strip():
+                self.amount_entry.insert(0, f"{amount:.2f}")
+        self.desc_entry.focus_set()
+        self.desc_entry.icursor(tk.END)
+        return 'break'
+
+    def on_category_key(self, event):
+        """Narrow the category list to what has been typed and complete the
+        first match in place, selected so that typing on replaces it"""
+        typed = self.category_combo.get()[:self.category_combo.index(tk.INSERT)]
+        categories = sorted(self.ledger.categories)
+        matches = [cat for cat in categories if cat.casefold().startswith(typed.casefold())]
+        self.category_combo['values'] = matches or categories
+        if typed and matches and len(event.char) == 1 and event.char.isprintable():
+            self.category_var.set(matches[0])
+            self.category_combo.icursor(len(typed))
+            self.category_combo.selection_range(len(typed), tk.END)
 
     def add_expense(self):
         try:
-            amount = float(self.amount_entry.get())
-            category = self.category_var.get().strip().title()
-            desc = self.desc_entry.get().strip()
-            if amount <= 0 or not category or not desc:
-                raise ValueError
-            if category not in self.categories:
-                self.categories.add(category)
-                self.category_combo['values'] = sorted(self.categories)
-            date = datetime.now().strftime("%Y-%m-%d")
-            self.expenses.append({
-                'id': len(self.expenses) + 1,
-                'amount': amount,
-                'category': category,
-                'description': desc,
-                'date': date
-            })
-            self.save_data()
+            fields = (self.amount_entry.get(), self.category_var.get(), self.desc_entry.get())
+            duplicates = self.ledger.exact_duplicates(*fields)
+            if duplicates and not messagebox.askyesno(
+                    "Possible Duplicate",
+                    f"An expense of ${duplicates[0]['amount']:,.2f} for '{duplicates[0]['description']}' "
+                    f"was already recorded on {duplicates[0]['date']}.\n\nAdd anyway?"):
+                return
+            rowid, expense = self.ledger.add(*fields)
+            amount = expense['amount']
+            self.refresh_categories()
             self.amount_entry.delete(0, tk.END)
             self.desc_entry.delete(0, tk.END)
             self.category_var.set('')
-            messagebox.showinfo("Success", f"✅ Expense of ${amount:,.2f} added successfully!")
-            self.refresh_view()
+            self.hide_suggestions()
+            self.set_status(f"✅ Added ${amount:,.2f} for '{expense['description']}'", COLORS['success'])
+            # Ready for the next one
+            self.amount_entry.focus_set()
+            if self.tree is not None:
+                self.view_insert(rowid)
         except ValueError:
             messagebox.showerror("Error", "❌ Invalid input. Please check:\n• Amount must be a positive number\n• Category is required\n• Description is required")
 
+    def refresh_categories(self):
+        categories = sorted(self.ledger.categories)
+        self.category_combo['values'] = categories
+        if self.tree is not None:
+            self.filter_category['values'] = ["All"] + categories
+
+    def import_file(self):
+        """Stream a CSV or JSONL statement into the ledger in batches"""
+        if self.import_job:
+            messagebox.showerror("Error", "❌ An import is already running.")
+            return
+        path = filedialog.askopenfilename(
+            title="Import Expenses",
+            filetypes=[("Statements", "*.csv *.jsonl *.ndjson"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        self.import_job = ImportJob(path, datetime.now().strftime("%Y-%m-%d"))
+        
+        # Non-modal progress window
+        self.import_window = tk.Toplevel(self.root, bg=COLORS['bg_card'])
+        self.import_window.title("Importing")
+        self.import_window.resizable(False, False)
+        self.import_window.protocol("WM_DELETE_WINDOW", self.import_job.cancel)
+        self.import_label = tk.Label(
+            self.import_window,
+            text=f"Reading {os.path.basename(path)}...",
+            font=FONTS['body'],
+            bg=COLORS['bg_card'],
+            fg=COLORS['text_primary']
+        )
+        self.import_label.pack(padx=20, pady=(18, 8))
+        self.import_progress = ttk.Progressbar(self.import_window, length=320, maximum=100)
+        self.import_progress.pack(padx=20, pady=8)
+        tk.Button(
+            self.import_window,
+            text="Cancel",
+            command=self.import_job.cancel,
+            font=FONTS['button'],
+            bg=COLORS['danger'],
+            fg=COLORS['white'],
+            relief=tk.FLAT,
+            bd=0,
+            padx=20,
+            pady=6,
+            cursor='hand2',
+            activebackground='#E53E3E',
+            activeforeground=COLORS['white']
+        ).pack(pady=(8, 18))
+        
+        self.import_job.start()
+        self.root.after(100, self.poll_import)
+
+    def poll_import(self):
+        job = self.import_job
+        while True:
+            try:
+                message = job.messages.get_nowait()
+            except queue.Empty:
+                self.root.after(100, self.poll_import)
+                return
+            kind = message[0]
+            if kind == 'batch':
+                self.ledger.add_many(message[1])
+            elif kind == 'progress':
+                fraction, rows, rejected = message[1:]
+                self.import_progress['value'] = fraction * 100
+                self.import_label.config(text=f"Imported {rows:,} expenses ({rejected:,} skipped)")
+            else:
+                break
+        
+        self.import_window.destroy()
+        self.import_job = None
+        self.refresh_categories()
+        if self.tree is not None:
+            self.refresh_view()
+        if kind == 'error':
+            messagebox.showerror("Error", f"Import failed: {message[1]}")
+        else:
+            rows, rejected, cancelled = message[1:]
+            title = "Import Cancelled" if cancelled else "Import Complete"
+            messagebox.showinfo(title, f"✅ Imported {rows:,} expenses, skipped {rejected:,} invalid rows.")
+
+    def export_file(self):
+        """Ask for export filters, then stream matching expenses to a file"""
+        if self.export_job:
+            messagebox.showerror("Error", "❌ An export is already running.")
+            return
+        self.export_window = tk.Toplevel(self.root, bg=COLORS['bg_card'])
+        self.export_window.title("Export Expenses")
+        self.export_window.resizable(False, False)
+        fields_frame = tk.Frame(self.export_window, bg=COLORS['bg_card'])
+        fields_frame.pack(padx=20, pady=(18, 8))
+        self.export_fields = {}
+        for row, (name, text) in enumerate([('start', "From (YYYY-MM-DD)"),
+                                            ('end', "To (YYYY-MM-DD)"),
+                                            ('category', "Category")]):
+            tk.Label(
+                fields_frame,
+                text=text,
+                font=FONTS['label'],
+                bg=COLORS['bg_card'],
+                fg=COLORS['text_primary'],
+                anchor='w'
+            ).grid(row=row, column=0, padx=(0, 12), pady=6, sticky='w')
+            if name == 'category':
+                field = ttk.Combobox(
+                    fields_frame,
+                    values=["All"] + sorted(self.ledger.categories),
+                    font=FONTS['body'],
+                    width=20,
+                    state='readonly',
+                    style='Custom.TCombobox'
+                )
+                field.set("All")
+            else:
+                field = tk.Entry(
+                    fields_frame,
+                    font=FONTS['body'],
+                    relief=tk.FLAT,
+                    bd=0,
+                    highlightthickness=1,
+                    highlightcolor=COLORS['accent'],
+                    highlightbackground=COLORS['border'],
+                    width=22,
+                    bg=COLORS['bg_card'],
+                    insertbackground=COLORS['text_primary']
+                )
+            field.grid(row=row, column=1, pady=6, ipady=4, sticky='ew')
+            self.export_fields[name] = field
+        self.export_label = tk.Label(
+            self.export_window,
+            text="Leave a field empty to export everything.",
+            font=FONTS['body'],
+            bg=COLORS['bg_card'],
+            fg=COLORS['text_secondary']
+        )
+        self.export_label.pack(padx=20, pady=4)
+        self.export_progress = ttk.Progressbar(self.export_window, length=320, maximum=100)
+        self.export_progress.pack(padx=20, pady=8)
+        self.export_button = tk.Button(
+            self.export_window,
+            text="Export...",
+            command=self.start_export,
+            font=FONTS['button'],
+            bg=COLORS['accent'],
+            fg=COLORS['white'],
+            relief=tk.FLAT,
+            bd=0,
+            padx=20,
+            pady=6,
+            cursor='hand2',
+            activebackground=COLORS['accent_hover'],
+            activeforeground=COLORS['white']
+        )
+        self.export_button.pack(pady=(8, 18))
+
+    def start_export(self):
+        start = self.export_fields['start'].get().strip() or None
+        end = self.export_fields['end'].get().strip() or None
+        category = self.export_fields['category'].get()
+        try:
+            for text in (start, end):
+                if text:
+                    datetime.strptime(text, "%Y-%m-%d")
+        except ValueError:
+            messagebox.showerror("Error", "❌ Dates must be in YYYY-MM-DD format.")
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export Expenses",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("JSON Lines", "*.jsonl"),
+                       ("Columnar", "*.btcol"), ("All files", "*.*")]
+        )
+        if not path:
+            return
+        self.export_job = ExportJob(path, start, end, None if category == "All" else category)
+        self.export_chunks = self.ledger.expenses.chunks(EXPORT_CHUNK_SIZE)
+        self.export_pending = None
+        self.export_total = max(len(self.ledger.expenses), 1)
+        self.export_window.protocol("WM_DELETE_WINDOW", self.export_job.cancel)
+        self.export_button.config(text="Cancel", command=self.export_job.cancel,
+                                  bg=COLORS['danger'], activebackground='#E53E3E')
+        self.export_label.config(text=f"Writing {os.path.basename(path)}...")
+        self.export_job.start()
+        self.poll_export()
+
+    def poll_export(self):
+        job = self.export_job
+        # Hand the worker chunks until its queue is full; the ledger is only
+        # read here on the UI thread, so edits made meanwhile are safe
+        while self.export_chunks is not None and not job.cancelled.is_set():
+            if self.export_pending is None:
+                self.export_pending = next(self.export_chunks, None)
+            if self.export_pending is None:
+                if not job.finish():
+                    break
+                self.export_chunks = None
+            elif job.feed(self.export_pending):
+                self.export_pending = None
+            else:
+                break
+        while True:
+            try:
+                message = job.messages.get_nowait()
+            except queue.Empty:
+                self.root.after(50, self.poll_export)
+                return
+            kind = message[0]
+            if kind == 'progress':
+                scanned, written = message[1:]
+                self.export_progress['value'] = scanned / self.export_total * 100
+                self.export_label.config(text=f"Exported {written:,} of {scanned:,} expenses scanned")
+            else:
+                break
+        
+        self.export_window.destroy()
+        self.export_job = self.export_chunks = self.export_pending = None
+        if kind == 'error':
+            messagebox.showerror("Error", f"Export failed: {message[1]}")
+        elif message[2]:
+            messagebox.showinfo("Export Cancelled", "Export cancelled, no file was written.")
+        else:
+            messagebox.showinfo("Export Complete", f"✅ Exported {message[1]:,} expenses to {os.path.basename(job.path)}.")
+
+    def find_duplicates(self):
+        """Open the duplicate review window and scan for duplicates on a worker"""
+        if self.duplicates_window is not None:
+            self.duplicates_window.lift()
+            return
+        window = tk.Toplevel(self.root, bg=COLORS['bg_card'])
+        window.title("Duplicate Expenses")
+        window.geometry("820x480")
+        window.protocol("WM_DELETE_WINDOW", self.close_duplicates)
+        self.duplicates_window = window
+        self.duplicates_label = tk.Label(
+            window,
+            font=FONTS['body'],
+            bg=COLORS['bg_card'],
+            fg=COLORS['text_secondary'],
+            anchor='w'
+        )
+        self.duplicates_label.pack(fill=tk.X, padx=20, pady=(18, 8))
+        
+        tree_frame = tk.Frame(window, bg=COLORS['bg_card'])
+        tree_frame.pack(expand=True, fill=tk.BOTH, padx=20)
+        v_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        # One parent item per group with its expenses as children, the one
+        # kept on merging first
+        self.duplicates_tree = ttk.Treeview(
+            tree_frame,
+            columns=("ID", "Date", "Description", "Amount", "Category"),
+            show="tree headings",
+            style='Custom.Treeview',
+            yscrollcommand=v_scrollbar.set
+        )
+        v_scrollbar.config(command=self.duplicates_tree.yview)
+        self.duplicates_tree.heading("#0", text="Group")
+        self.duplicates_tree.heading("ID", text="ID")
+        self.duplicates_tree.heading("Date", text="Date")
+        self.duplicates_tree.heading("Description", text="Description")
+        self.duplicates_tree.heading("Amount", text="Amount")
+        self.duplicates_tree.heading("Category", text="Category")
+        self.duplicates_tree.column("#0", width=150, anchor='w')
+        self.duplicates_tree.column("ID", width=50, anchor='center')
+        self.duplicates_tree.column("Date", width=100, anchor='center')
+        self.duplicates_tree.column("Description", width=260, anchor='w')
+        self.duplicates_tree.column("Amount", width=100, anchor='e')
+        self.duplicates_tree.column("Category", width=120, anchor='center')
+        self.duplicates_tree.grid(row=0, column=0, sticky='nsew')
+        v_scrollbar.grid(row=0, column=1, sticky='ns')
+        tree_frame.grid_rowconfigure(0, weight=1)
+        tree_frame.grid_columnconfigure(0, weight=1)
+        
+        button_frame = tk.Frame(window, bg=COLORS['bg_card'])
+        button_frame.pack(pady=(8, 18))
+        for text, command in (("Merge Selected", self.merge_selected_duplicates),
+                              ("Merge All Exact", self.merge_exact_duplicates)):
+            tk.Button(
+                button_frame,
+                text=text,
+                command=command,
+                font=FONTS['button'],
+                bg=COLORS['danger'],
+                fg=COLORS['white'],
+                relief=tk.FLAT,
+                bd=0,
+                padx=20,
+                pady=6,
+                cursor='hand2',
+                activebackground='#E53E3E',
+                activeforeground=COLORS['white']
+            ).pack(side=tk.LEFT, padx=6)
+        self.scan_duplicates()
+
+    def close_duplicates(self):
+        self.tasks.cancel('duplicates')
+        self.duplicates_window.destroy()
+        self.duplicates_window = None
+
+    def scan_duplicates(self):
+        # Like the summary, the scan reads its own copy of the columns
+        self.duplicate_groups = []
+        self.duplicates_version = self.ledger.stats.version
+        self.duplicates_tree.delete(*self.duplicates_tree.get_children())
+        self.duplicates_label.config(
+            text=f"Looking for duplicates among {len(self.ledger.expenses):,} expenses…")
+        self.tasks.submit('duplicates', scan_duplicates, self.ledger.expenses.copy(),
+                          on_done=self.show_duplicates, on_error=self.on_duplicates_error)
+        self.poll_tasks_soon()
+
+    def on_duplicates_error(self, error):
+        self.duplicates_label.config(text=f"⚠ Failed to look for duplicates: {error}", fg=COLORS['danger'])
+
+    def show_duplicates(self, groups):
+        if self.duplicates_window is None:
+            return
+        if self.duplicates_version != self.ledger.stats.version:
+            # Expenses were added or deleted during the scan
+            self.scan_duplicates()
+            return
+        self.duplicate_groups = groups
+        self.fill_duplicates()
+
+    def fill_duplicates(self):
+        groups = self.duplicate_groups
+        tree = self.duplicates_tree
+        tree.delete(*tree.get_children())
+        for index, (rowids, exact) in enumerate(groups[:DUPLICATE_GROUPS_SHOWN]):
+            kind = "Exact" if len(exact) == len(rowids) - 1 else "Near"
+            parent = tree.insert("", tk.END, iid=f"group{index}", open=True, text=f"{kind} ×{len(rowids)}")
+            for rowid in rowids:
+                text = "Keep" if rowid == rowids[0] else "Exact" if rowid in exact else "Near"
+                tree.insert(parent, tk.END, text=text, values=self.expense_values(rowid))
+        if not groups:
+            text = f"No duplicates among {len(self.ledger.expenses):,} expenses."
+        else:
+            exact = len(duplicate_extras(groups, exact_only=True))
+            text = (f"{len(groups):,} groups of possible duplicates with {exact:,} exact copies. "
+                    f"Merging keeps the earliest expense of a group.")
+            if len(groups) > DUPLICATE_GROUPS_SHOWN:
+                text += f" Showing the first {DUPLICATE_GROUPS_SHOWN:,} groups."
+        self.duplicates_label.config(text=text, fg=COLORS['text_secondary'])
+
+    def merge_selected_duplicates(self):
+        tree = self.duplicates_tree
+        # A selected expense stands for its whole group
+        chosen = {int((tree.parent(item) or item)[len("group"):]) for item in tree.selection()}
+        if not chosen:
+            messagebox.showerror("Error", "❌ Please select a group to merge.", parent=self.duplicates_window)
+            return
+        self.merge_duplicates(sorted(chosen))
+
+    def merge_exact_duplicates(self):
+        chosen = [index for index, (_, exact) in enumerate(self.duplicate_groups) if exact]
+        if not chosen:
+            messagebox.showinfo("Merge Duplicates", "No exact duplicates to merge.", parent=self.duplicates_window)
+            return
+        self.merge_duplicates(chosen, exact_only=True)
+
+    def merge_duplicates(self, chosen, exact_only=False):
+        """Merge the groups at these indexes of duplicate_groups, deleting
+        every expense but the first or only the exact copies"""
+        if self.tasks.pending('duplicates'):
+            return
+        if self.duplicates_version != self.ledger.stats.version:
+            messagebox.showinfo("Merge Duplicates", "Expenses have changed since the scan, looking again.",
+                                parent=self.duplicates_window)
+            self.scan_duplicates()
+            return
+        groups = [self.duplicate_groups[index] for index in chosen]
+        deleted = set(duplicate_extras(groups, exact_only))
+        if not messagebox.askyesno("Merge Duplicates",
+                                   f"Delete {len(deleted):,} duplicate expenses, keeping the earliest of each group?",
+                                   parent=self.duplicates_window):
+            return
+        expenses = self.ledger.merge_duplicates(groups, exact_only)
+        if self.tree is not None:
+            self.view_remove_many(deleted)
+            self.update_filter_label()
+        # Every row left in a group still matches its first row, so what is
+        # left of the groups stays valid without a rescan
+        left = []
+        for rowids, exact in self.duplicate_groups:
+            rowids = [rowid for rowid in rowids if rowid not in deleted]
+            if len(rowids) > 1:
+                left.append((rowids, [rowid for rowid in exact if rowid not in deleted]))
+        self.duplicate_groups = left
+        self.duplicates_version = self.ledger.stats.version
+        self.fill_duplicates()
+        self.set_status(f"🗑 Merged {len(groups):,} groups of duplicates, deleted {len(expenses):,} expenses")
+
     def setup_view_tab(self):
         # Create scrollable frame
         scrollable_frame, canvas = self.create_scrollable_frame(self.view_tab)
@@ -382,12 +1184,84 @@ class BudgetTrackerApp:
         )
         title_label.pack(pady=(12, 18))
         
+        # Filter bar: description search, category and date range
+        filter_frame = tk.Frame(main_frame, bg=COLORS['bg_light'])
+        filter_frame.pack(fill=tk.X, padx=12)
+        self.filters = {}
+        self.filter_after = None
+        self.search_var = tk.StringVar()
+        self.filter_start_var = tk.StringVar()
+        self.filter_end_var = tk.StringVar()
+        self.filter_category = ttk.Combobox(
+            filter_frame,
+            values=["All"] + sorted(self.ledger.categories),
+            font=FONTS['body'],
+            width=14,
+            state='readonly',
+            style='Custom.TCombobox'
+        )
+        self.filter_category.set("All")
+        self.filter_category.bind('<<ComboboxSelected>>', lambda e: self.apply_filters())
+        for column, (text, widget) in enumerate([
+                ("Search", self.search_var),
+                ("Category", self.filter_category),
+                ("From", self.filter_start_var),
+                ("To", self.filter_end_var)]):
+            tk.Label(
+                filter_frame,
+                text=text,
+                font=FONTS['label'],
+                bg=COLORS['bg_light'],
+                fg=COLORS['text_primary']
+            ).grid(row=0, column=column * 2, padx=(0 if column == 0 else 12, 6), sticky='w')
+            if isinstance(widget, tk.StringVar):
+                widget.trace_add('write', lambda *args: self.schedule_filters())
+                widget = tk.Entry(
+                    filter_frame,
+                    textvariable=widget,
+                    font=FONTS['body'],
+                    relief=tk.FLAT,
+                    bd=0,
+                    highlightthickness=1,
+                    highlightcolor=COLORS['accent'],
+                    highlightbackground=COLORS['border'],
+                    width=24 if column == 0 else 11,
+                    bg=COLORS['bg_card'],
+                    insertbackground=COLORS['text_primary']
+                )
+            widget.grid(row=0, column=column * 2 + 1, ipady=4, sticky='ew')
+        filter_frame.grid_columnconfigure(1, weight=1)
+        tk.Button(
+            filter_frame,
+            text="Clear",
+            command=self.clear_filters,
+            font=FONTS['body_bold'],
+            bg=COLORS['bg_secondary'],
+            fg=COLORS['white'],
+            relief=tk.FLAT,
+            bd=0,
+            padx=12,
+            pady=3,
+            cursor='hand2',
+            activebackground=COLORS['bg_primary'],
+            activeforeground=COLORS['white']
+        ).grid(row=0, column=8, padx=(12, 0))
+        self.filter_label = tk.Label(
+            main_frame,
+            font=FONTS['body'],
+            bg=COLORS['bg_light'],
+            fg=COLORS['text_secondary'],
+            anchor='w'
+        )
+        self.filter_label.pack(fill=tk.X, padx=12, pady=(6, 0))
+        
         # Treeview container with elegant styling
         tree_frame = tk.Frame(main_frame, bg=COLORS['bg_card'], relief=tk.FLAT, bd=0)
         tree_frame.pack(expand=True, fill=tk.BOTH, padx=12, pady=12)
         
         # Scrollbars
         v_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        self.v_scrollbar = v_scrollbar
         h_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.HORIZONTAL)
         
         self.tree = ttk.Treeview(
@@ -395,7 +1269,7 @@ class BudgetTrackerApp:
             columns=("ID", "Date", "Description", "Amount", "Category"),
             show="headings",
             style='Custom.Treeview',
-            yscrollcommand=v_scrollbar.set,
+            yscrollcommand=self.on_tree_yscroll,
             xscrollcommand=h_scrollbar.set
         )
         
@@ -424,6 +1298,33 @@ class BudgetTrackerApp:
         tree_frame.grid_rowconfigure(0, weight=1)
         tree_frame.grid_columnconfigure(0, weight=1)
         
+        # Date-ordered index of the table rows, kept in step with the tree on
+        # add and delete: packed (-day, rowid) keys from ColumnarExpenses, so
+        # bisect finds a row's position and new rows land after older ones of
+        # the same date
+        self.view_keys = array('q')
+        self.item_by_id = {}
+        self.rowid_by_item = {}
+        # Virtual scrolling state: the row shown first, and the rowids
+        # selected, which may lie outside the rows shown
+        self.virtual = False
+        self.view_offset = 0
+        self.visible_rows = int(self.tree.cget('height'))
+        self.virtual_selected = set()
+        # Older years of a partitioned ledger are read once the table is
+        # scrolled to its end (see load_older)
+        self.loading_older = False
+        self.tree.bind('<Configure>', self.on_tree_resize)
+        self.tree.bind('<<TreeviewSelect>>', self.on_tree_select)
+        self.tree.bind('<Button-1>', self.on_tree_click)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll_rows(int(-1*(e.delta/120)) * 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll_rows(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_rows(3))
+        self.tree.bind('<Up>', lambda e: self.step_selection(-1))
+        self.tree.bind('<Down>', lambda e: self.step_selection(1))
+        self.tree.bind('<Prior>', lambda e: self.scroll_rows(-self.visible_rows))
+        self.tree.bind('<Next>', lambda e: self.scroll_rows(self.visible_rows))
+        
         self.refresh_view()
         
         # Button frame
@@ -448,34 +1349,300 @@ class BudgetTrackerApp:
         )
         delete_button.pack()
 
+    def expense_values(self, rowid):
+        exp = self.ledger.expenses.row(rowid)
+        return (
+            exp['id'],
+            exp['date'],
+            exp['description'],
+            f"${exp['amount']:,.2f}",
+            exp['category']
+        )
+
+    def schedule_filters(self):
+        # Debounce typing: only the last keystroke in a burst runs a search
+        if self.filter_after is not None:
+            self.root.after_cancel(self.filter_after)
+        self.filter_after = self.root.after(FILTER_DELAY_MS, self.apply_filters)
+
+    def apply_filters(self):
+        self.filter_after = None
+        filters = {}
+        text = self.search_var.get().strip()
+        if text:
+            filters['text'] = text
+        if self.filter_category.get() not in ("", "All"):
+            filters['category'] = self.filter_category.get()
+        bad_date = False
+        for name, var in (('start', self.filter_start_var), ('end', self.filter_end_var)):
+            value = var.get().strip()
+            if not value:
+                continue
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+                filters[name] = value
+            except ValueError:
+                bad_date = True  # probably still being typed; ignore it for now
+        if filters != self.filters:
+            self.filters = filters
+            self.refresh_view()
+        else:
+            self.update_filter_label()
+        if bad_date:
+            self.filter_label.config(text="Dates must be in YYYY-MM-DD format", fg=COLORS['danger'])
+
+    def clear_filters(self):
+        self.search_var.set("")
+        self.filter_start_var.set("")
+        self.filter_end_var.set("")
+        self.filter_category.set("All")
+        self.apply_filters()
+
+    def update_filter_label(self):
+        total = len(self.ledger.expenses)
+        if self.filters:
+            text = f"Showing {len(self.view_keys):,} of {total:,} expenses"
+        else:
+            text = f"{total:,} expenses"
+        self.filter_label.config(text=text, fg=COLORS['text_secondary'])
+
     def refresh_view(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        # Sort by date descending (newest first)
-        sorted_expenses = sorted(self.expenses, key=lambda x: x['date'], reverse=True)
-        for exp in sorted_expenses:
-            self.tree.insert("", tk.END, values=(
-                exp['id'],
-                exp['date'],
-                exp['description'],
-                f"${exp['amount']:,.2f}",
-                exp['category']
-            ))
+        """Rebuild the table from the expenses that pass the current filters"""
+        # Date order, newest first, straight from the ledger's search index
+        self.view_keys = self.ledger.search(**self.filters)
+        self.update_filter_label()
+        self.item_by_id = {}
+        self.rowid_by_item = {}
+        self.virtual_selected.clear()
+        if len(self.view_keys) > VIRTUAL_TABLE_THRESHOLD:
+            self.show_virtual()
+            return
+        if self.virtual:
+            self.virtual = False
+            self.tree.configure(yscrollcommand=self.on_tree_yscroll)
+            self.v_scrollbar.config(command=self.tree.yview)
+        with TRACER.span('view.fill'):
+            for i in self.tree.get_children():
+                self.tree.delete(i)
+            for key in self.view_keys:
+                self.add_tree_item(key_rowid(key), tk.END)
 
-    def delete_expense(self):
+    def add_tree_item(self, rowid, index):
+        values = self.expense_values(rowid)
+        item = self.tree.insert("", index, values=values)
+        self.item_by_id[values[0]] = item
+        self.rowid_by_item[item] = rowid
+
+    def view_insert(self, rowid):
+        """Insert one new row into the date index and the table"""
+        if self.filters and not self.ledger.search_index().matches(
+                self.ledger.expenses.row(rowid), **self.filters):
+            self.update_filter_label()
+            return
+        key = self.ledger.expenses.key(rowid)
+        pos = bisect.bisect_right(self.view_keys, key)
+        self.view_keys.insert(pos, key)
+        self.update_filter_label()
+        if self.virtual or len(self.view_keys) > VIRTUAL_TABLE_THRESHOLD:
+            self.show_virtual()
+            return
+        self.add_tree_item(rowid, pos)
+
+    def view_remove_many(self, rowids):
+        """Drop many deleted rows from the table in one pass"""
+        self.view_keys = array('q', [key for key in self.view_keys if key_rowid(key) not in rowids])
+        if self.virtual:
+            self.virtual_selected.difference_update(rowids)
+            self.render_virtual()
+            return
+        items = [item for item, rowid in self.rowid_by_item.items() if rowid in rowids]
+        for item in items:
+            exp_id = self.tree.item(item)['values'][0]
+            del self.rowid_by_item[item]
+            if self.item_by_id.get(exp_id) == item:
+                del self.item_by_id[exp_id]
+        self.tree.delete(*items)
+
+    def view_discard(self, key):
+        """Drop a row the ledger no longer has from the table, if it is shown"""
+        pos = bisect.bisect_left(self.view_keys, key)
+        if pos == len(self.view_keys) or self.view_keys[pos] != key:
+            return
+        self.view_keys.pop(pos)
+        if self.virtual:
+            self.virtual_selected.discard(key_rowid(key))
+            self.render_virtual()
+            return
+        item = self.tree.get_children()[pos]
+        exp_id = self.tree.item(item)['values'][0]
+        del self.rowid_by_item[item]
+        self.tree.delete(item)
+        if self.item_by_id.get(exp_id) == item:
+            del self.item_by_id[exp_id]
+
+    def show_virtual(self):
+        """Show view_keys through a fixed pool of Treeview items, one per visible row"""
+        if not self.virtual:
+            self.virtual = True
+            # The scrollbar now tracks the position in rows, not the tree's items
+            self.tree.configure(yscrollcommand='')
+            self.v_scrollbar.config(command=self.on_virtual_scroll)
+            self.tree.delete(*self.tree.get_children())
+            self.item_by_id = {}
+            self.rowid_by_item = {}
+            self.virtual_selected.clear()
+        self.render_virtual()
+
+    def render_virtual(self):
+        total = len(self.view_keys)
+        count = min(self.visible_rows, total)
+        self.view_offset = max(0, min(self.view_offset, total - count))
+        slots = self.tree.get_children()
+        if len(slots) > count:
+            self.tree.delete(*slots[count:])
+        for _ in range(len(slots), count):
+            self.tree.insert("", tk.END)
+        slots = self.tree.get_children()
+        selected = []
+        for slot, key in zip(slots, self.view_keys[self.view_offset:self.view_offset + count]):
+            rowid = key_rowid(key)
+            self.tree.item(slot, values=self.expense_values(rowid))
+            if rowid in self.virtual_selected:
+                selected.append(slot)
+        self.tree.selection_set(selected)
+        if total:
+            self.v_scrollbar.set(self.view_offset / total, (self.view_offset + count) / total)
+        else:
+            self.v_scrollbar.set(0, 1)
+        if self.view_offset + count >= total:
+            self.schedule_load_older()
+
+    def on_tree_yscroll(self, first, last):
+        self.v_scrollbar.set(first, last)
+        if float(last) >= 1.0:
+            self.schedule_load_older()
+
+    def schedule_load_older(self):
+        if not self.loading_older:
+            self.loading_older = True
+            self.root.after_idle(self.load_older)
+
+    def load_older(self):
+        """Read the next older year of a partitioned ledger into the table"""
+        self.loading_older = False
+        try:
+            rowids = self.ledger.load_older(self.filters.get('start'), self.filters.get('end'))
+        except (OSError, ValueError) as e:
+            self.set_status(f"⚠ Failed to load older expenses: {e}", COLORS['danger'])
+            return
+        if not rowids:
+            return
+        self.view_extend(rowids)
+        year = self.ledger.expenses.row(rowids[0])['date'][:4]
+        self.set_status(f"📂 Loaded {len(rowids):,} expenses from {year}")
+
+    def view_extend(self, rowids):
+        """Add many rows read from storage to the date index and the table at once"""
+        expenses = self.ledger.expenses
+        if self.filters:
+            index = self.ledger.search_index()
+            rowids = [rowid for rowid in rowids if index.matches(expenses.row(rowid), **self.filters)]
+        keys = sorted(expenses.key(rowid) for rowid in rowids)
+        if not keys:
+            self.update_filter_label()
+            return
+        # Older rows than any shown: the usual case, and a plain append
+        appended = not self.view_keys or keys[0] > self.view_keys[-1]
+        if appended:
+            self.view_keys.extend(keys)
+        else:
+            self.view_keys = array('q', sorted(self.view_keys.tolist() + keys))
+        self.update_filter_label()
+        if self.virtual or len(self.view_keys) > VIRTUAL_TABLE_THRESHOLD:
+            self.show_virtual()
+        elif appended:
+            for key in keys:
+                self.add_tree_item(key_rowid(key), tk.END)
+        else:
+            self.refresh_view()
+
+    def on_virtual_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.view_offset = int(float(amount) * len(self.view_keys))
+            self.render_virtual()
+        elif unit == 'pages':
+            self.scroll_rows(int(amount) * self.visible_rows)
+        else:
+            self.scroll_rows(int(amount))
+
+    def scroll_rows(self, delta):
+        if not self.virtual:
+            return None  # let the Treeview scroll itself
+        self.view_offset += delta
+        self.render_virtual()
+        return "break"
+
+    def step_selection(self, delta):
+        """Move the selection with the arrow keys, paging at the window edges"""
+        if not self.virtual:
+            return None
+        slots = self.tree.get_children()
         selected = self.tree.selection()
-        if not selected:
+        if not slots or not selected:
+            return None
+        index = slots.index(selected[0]) + delta
+        if 0 <= index < len(slots):
+            return None  # still inside the window; default handling is fine
+        row = self.view_offset + index
+        if 0 <= row < len(self.view_keys):
+            self.virtual_selected = {key_rowid(self.view_keys[row])}
+            self.scroll_rows(delta)
+        return "break"
+
+    def on_tree_click(self, event):
+        # A click without Shift or Control starts a new selection, dropping
+        # rows selected out of sight
+        if self.virtual and not event.state & 0x5:
+            self.virtual_selected.clear()
+
+    def on_tree_select(self, event=None):
+        if self.virtual:
+            # The tree only knows the rows shown; keep the selection outside them
+            shown = self.view_keys[self.view_offset:self.view_offset + len(self.tree.get_children())]
+            self.virtual_selected.difference_update(key_rowid(key) for key in shown)
+            for item in self.tree.selection():
+                row = self.view_offset + self.tree.index(item)
+                self.virtual_selected.add(key_rowid(self.view_keys[row]))
+
+    def on_tree_resize(self, event):
+        # Headings take roughly one row; rows are 24px high (Custom.Treeview)
+        rows = max(1, event.height // 24 - 1)
+        if rows != self.visible_rows:
+            self.visible_rows = rows
+            if self.virtual:
+                self.render_virtual()
+
+    def delete_expense(self):
+        if self.virtual:
+            rowids = set(self.virtual_selected)
+        else:
+            rowids = {self.rowid_by_item[item] for item in self.tree.selection()}
+        if not rowids:
             messagebox.showerror("Error", "❌ Please select an expense to delete.")
             return
-        item = self.tree.item(selected[0])
-        exp_id = item['values'][0]
-        exp_desc = item['values'][2]
-        self.expenses = [e for e in self.expenses if e['id'] != exp_id]
-        self.save_data()
-        self.refresh_view()
-        messagebox.showinfo("Deleted", f"✅ Expense '{exp_desc}' deleted successfully.")
+        if len(rowids) > 1 and not messagebox.askyesno(
+                "Delete Expenses", f"Delete the {len(rowids):,} selected expenses?"):
+            return
+        expenses = self.ledger.delete_many(rowids)
+        self.view_remove_many(rowids)
+        self.update_filter_label()
+        if len(expenses) == 1:
+            self.set_status(f"🗑 Deleted '{expenses[0]['description']}'")
+        else:
+            self.set_status(f"🗑 Deleted {len(expenses):,} expenses")
 
     def setup_summary_tab(self):
+        load_chart_libraries()
         # Create scrollable frame
         scrollable_frame, canvas = self.create_scrollable_frame(self.summary_tab)
         
@@ -493,6 +1660,56 @@ class BudgetTrackerApp:
         )
         title_label.pack(pady=(12, 18))
         
+        # Period selector: preset or custom date range, plus an optional
+        # breakdown by day, week, month or year
+        period_frame = tk.Frame(main_frame, bg=COLORS['bg_light'])
+        period_frame.pack(pady=(0, 6))
+        self.period_var = tk.StringVar(value="All time")
+        self.breakdown_var = tk.StringVar(value="None")
+        self.period_start_var = tk.StringVar()
+        self.period_end_var = tk.StringVar()
+        for column, (text, var, values) in enumerate([
+                ("Period", self.period_var, list(SUMMARY_PERIODS)),
+                ("From", self.period_start_var, None),
+                ("To", self.period_end_var, None),
+                ("Breakdown", self.breakdown_var, list(SUMMARY_BREAKDOWNS))]):
+            tk.Label(
+                period_frame,
+                text=text,
+                font=FONTS['label'],
+                bg=COLORS['bg_light'],
+                fg=COLORS['text_primary']
+            ).grid(row=0, column=column * 2, padx=(0 if column == 0 else 12, 6))
+            if values:
+                widget = ttk.Combobox(
+                    period_frame,
+                    textvariable=var,
+                    values=values,
+                    font=FONTS['body'],
+                    width=14,
+                    state='readonly',
+                    style='Custom.TCombobox'
+                )
+                widget.bind('<<ComboboxSelected>>', self.on_period_selected)
+            else:
+                widget = tk.Entry(
+                    period_frame,
+                    textvariable=var,
+                    font=FONTS['body'],
+                    relief=tk.FLAT,
+                    bd=0,
+                    highlightthickness=1,
+                    highlightcolor=COLORS['accent'],
+                    highlightbackground=COLORS['border'],
+                    width=11,
+                    bg=COLORS['bg_card'],
+                    insertbackground=COLORS['text_primary']
+                )
+                # Typing a date switches to a custom range
+                widget.bind('<KeyRelease>', lambda e: self.period_var.set("Custom"))
+                widget.bind('<Return>', lambda e: self.show_summary())
+            widget.grid(row=0, column=column * 2 + 1, ipady=4)
+        
         # Button frame
         button_frame = tk.Frame(main_frame, bg=COLORS['bg_light'])
         button_frame.pack(pady=10)
@@ -542,83 +1759,171 @@ class BudgetTrackerApp:
         if MATPLOTLIB:
             self.chart_frame = tk.Frame(main_frame, bg=COLORS['bg_card'], relief=tk.FLAT, bd=0)
             self.chart_frame.pack(fill=tk.BOTH, expand=True, padx=12, pady=12)
+            # The chart arrives as a PNG from render_chart
+            self.chart_label = tk.Label(self.chart_frame, bg=COLORS['bg_card'])
+            self.chart_image = None
+            self.chart_key = None
+
+    def on_period_selected(self, event=None):
+        if self.period_var.get() != "Custom":
+            start, end = period_bounds(self.period_var.get(), datetime.now().date())
+            self.period_start_var.set(start or "")
+            self.period_end_var.set(end or "")
+        self.show_summary()
 
     def show_summary(self):
-        if PANDAS:
-            df = pd.DataFrame(self.expenses)
-            total = df['amount'].sum() if not df.empty else 0
-            cat_totals = df.groupby('category')['amount'].sum().to_dict() if not df.empty else {}
+        start = self.period_start_var.get().strip() or None
+        end = self.period_end_var.get().strip() or None
+        period = SUMMARY_BREAKDOWNS[self.breakdown_var.get()]
+        # Running totals and prefix sums maintained on load, add and delete;
+        # percentiles, the largest expenses and the chart need a pass over
+        # the expenses and are left to worker threads
+        try:
+            total, rows = self.ledger.summary(start, end)
+            breakdown = self.ledger.report(period, start, end) if period and rows else []
+        except ValueError as e:
+            messagebox.showerror("Error", f"❌ {e}")
+            return
+        if VERIFY_AGGREGATES:
+            problems = self.ledger.stats.verify(self.ledger.expenses)
+            if problems:
+                messagebox.showerror("Error", "Summary totals out of sync:\n" + "\n".join(problems[:10]))
+        
+        self.summary = (start, end, total, rows, period, breakdown)
+        self.summary_version = None
+        if rows:
+            # The worker gets its own copy of the columns, so adds and deletes
+            # carry on while it runs; a change makes poll_tasks start over
+            stored_top = [] if start or end else self.ledger.stored_top_expenses(SUMMARY_TOP_EXPENSES)
+            self.tasks.submit('summary', summary_details, self.ledger.expenses.copy(), start, end, stored_top,
+                              on_done=self.on_summary_details, on_error=self.on_summary_error)
+            self.summary_version = self.ledger.stats.version
         else:
-            total = sum(e['amount'] for e in self.expenses)
-            cat_totals = {}
-            for e in self.expenses:
-                cat_totals[e['category']] = cat_totals.get(e['category'], 0) + e['amount']
+            self.tasks.cancel('summary')
+        self.write_summary(None)
         
+        if MATPLOTLIB:
+            self.request_chart({cat: amt for cat, amt, _ in rows}, (start, end))
+        self.poll_tasks_soon()
+
+    def on_summary_details(self, details):
+        self.summary_version = None
+        self.write_summary(details)
+
+    def on_summary_error(self, error):
+        self.summary_version = None
+        self.set_status(f"⚠ Failed to calculate the summary: {error}", COLORS['danger'])
+
+    def write_summary(self, details):
+        """Fill the summary text; details is (percentiles, largest expenses)
+        from summary_details, or None while they are being calculated"""
+        start, end, total, rows, period, breakdown = self.summary
         self.summary_text.delete(1.0, tk.END)
-        if not self.expenses:
+        if not rows and not self.ledger.count():
             self.summary_text.insert(tk.END, "No expenses recorded yet.\n\n", ('empty',))
             self.summary_text.insert(tk.END, "Add some expenses to see your budget summary here.", ('empty',))
             self.summary_text.tag_config('empty', foreground=COLORS['text_secondary'], font=FONTS['body'])
+        elif not rows:
+            self.summary_text.insert(tk.END, "No expenses in this period.", ('empty',))
+            self.summary_text.tag_config('empty', foreground=COLORS['text_secondary'], font=FONTS['body'])
         else:
             # Configure text tags for elegant formatting
             self.summary_text.tag_config('total', font=FONTS['body_bold'], foreground=COLORS['text_primary'])
             self.summary_text.tag_config('header', font=FONTS['body_bold'], foreground=COLORS['text_primary'])
             self.summary_text.tag_config('category', font=FONTS['body'], foreground=COLORS['text_primary'])
             self.summary_text.tag_config('amount', font=FONTS['body'], foreground=COLORS['accent'])
+            self.summary_text.tag_config('pending', font=FONTS['body'], foreground=COLORS['text_secondary'])
             
+            if start or end:
+                self.summary_text.insert(tk.END, f"{start or 'First expense'} to {end or 'latest'}\n\n", 'category')
             self.summary_text.insert(tk.END, "Total Spending: ", 'total')
             self.summary_text.insert(tk.END, f"${total:,.2f}\n\n", 'amount')
             self.summary_text.insert(tk.END, "Spending by Category:\n\n", 'header')
-            # Sort by amount descending
-            sorted_cats = sorted(cat_totals.items(), key=lambda x: x[1], reverse=True)
-            for cat, amt in sorted_cats:
-                percentage = (amt / total * 100) if total > 0 else 0
+            for cat, amt, percentage in rows:
                 self.summary_text.insert(tk.END, f"  • {cat}: ", 'category')
                 self.summary_text.insert(tk.END, f"${amt:,.2f} ", 'amount')
                 self.summary_text.insert(tk.END, f"({percentage:.1f}%)\n", 'category')
-        
-        # Clear previous chart
-        if MATPLOTLIB:
-            for widget in self.chart_frame.winfo_children():
-                widget.destroy()
-            
-            if cat_totals:
-                # Modern chart styling
-                try:
-                    plt.style.use('seaborn-v0_8-darkgrid')
-                except:
-                    try:
-                        plt.style.use('seaborn-darkgrid')
-                    except:
-                        pass
-                fig, ax = plt.subplots(figsize=(8, 6), facecolor='white')
-                
-                # Color palette
-                colors = ['#3498DB', '#27AE60', '#E74C3C', '#F39C12', '#9B59B6', '#1ABC9C', '#E67E22']
-                
-                wedges, texts, autotexts = ax.pie(
-                    cat_totals.values(),
-                    labels=cat_totals.keys(),
-                    autopct='%1.1f%%',
-                    colors=colors[:len(cat_totals)],
-                    startangle=90,
-                    textprops={'fontsize': 8, 'fontweight': 'bold'}
-                )
-                
-                ax.set_title("Spending by Category", fontsize=12, fontweight='bold', pad=20, 
-                            fontfamily='serif', color=COLORS['text_primary'])
-                
-                # Make percentage text more visible
-                for autotext in autotexts:
-                    autotext.set_color('white')
-                    autotext.set_fontweight('bold')
-                
-                plt.tight_layout()
-                canvas = FigureCanvasTkAgg(fig, master=self.chart_frame)
-                canvas.draw()
-                canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+            if details is None:
+                self.summary_text.insert(tk.END, "\nCalculating typical and largest expenses…\n", 'pending')
+            else:
+                typical, top = details
+                # Percentiles need every amount, so an all-time summary of a
+                # partitioned ledger only covers the years read so far
+                partial = not (start or end) and self.ledger.storage.unloaded_partitions()
+                if typical:
+                    self.summary_text.insert(
+                        tk.END, "\nTypical Expense (years loaded so far): " if partial else "\nTypical Expense: ",
+                        'header')
+                    self.summary_text.insert(tk.END, f"${typical[50]:,.2f} ", 'amount')
+                    self.summary_text.insert(tk.END, "median, ", 'category')
+                    self.summary_text.insert(tk.END, f"${typical[90]:,.2f} ", 'amount')
+                    self.summary_text.insert(tk.END, "90th percentile\n", 'category')
+                self.summary_text.insert(tk.END, "\nLargest Expenses:\n\n", 'header')
+                for exp in top:
+                    self.summary_text.insert(tk.END, f"  • {exp['date']} {exp['description']}: ", 'category')
+                    self.summary_text.insert(tk.END, f"${exp['amount']:,.2f}\n", 'amount')
+            if breakdown:
+                self.summary_text.insert(tk.END, f"\nSpending by {period.title()}:\n\n", 'header')
+                for label, count, amount in breakdown:
+                    self.summary_text.insert(tk.END, f"  • {label}: ", 'category')
+                    self.summary_text.insert(tk.END, f"${amount:,.2f} ", 'amount')
+                    self.summary_text.insert(tk.END, f"({count:,} expenses)\n", 'category')
+
+    def request_chart(self, cat_totals, period=None):
+        """Have the pie redrawn on a worker if the data has changed"""
+        key = (self.ledger.stats.version, period)
+        if self.chart_key == key:
+            return
+        self.chart_key = key
+        if not cat_totals:
+            self.tasks.cancel('chart')
+            self.chart_label.pack_forget()
+            return
+        self.tasks.submit('chart', render_chart, cat_totals, on_done=self.show_chart, on_error=self.on_chart_error)
+
+    def show_chart(self, png):
+        # Keep a reference: Tk drops the image when the PhotoImage is collected
+        self.chart_image = tk.PhotoImage(data=base64.b64encode(png))
+        self.chart_label.configure(image=self.chart_image)
+        self.chart_label.pack(fill=tk.BOTH, expand=True)
+
+    def on_chart_error(self, error):
+        self.chart_key = None
+        self.set_status(f"⚠ Failed to draw the chart: {error}", COLORS['danger'])
+
+    def poll_tasks_soon(self):
+        if not self.polling_tasks:
+            self.polling_tasks = True
+            self.root.after(TASK_POLL_MS, self.poll_tasks)
+
+    def poll_tasks(self):
+        """Hand finished background tasks to the Tk thread"""
+        if self.summary_version is not None and self.summary_version != self.ledger.stats.version:
+            # Expenses were added or deleted since the summary was asked for:
+            # drop the stale work and start again
+            self.show_summary()
+        if self.tasks.poll():
+            self.root.after(TASK_POLL_MS, self.poll_tasks)
+        else:
+            self.polling_tasks = False
+
 
 if __name__ == "__main__":
+    if TRACE:
+        TRACER.enable(keep_events=TRACE_FILE is not None)
+    if PROFILE_FILE:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
     root = tk.Tk()
     app = BudgetTrackerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    if PROFILE_FILE:
+        profiler.disable()
+        profiler.dump_stats(PROFILE_FILE)
+        print(f"Profile written to {PROFILE_FILE}")
+    if TRACE:
+        print(TRACER.report())
+    if TRACE_FILE:
+        TRACER.write_chrome_trace(TRACE_FILE)
+        print(f"Trace written to {TRACE_FILE}")
\ No newline at end of file
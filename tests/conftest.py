@@ -0,0 +1,54 @@
+"""Lets the tests import the top-level budget_* modules, and shared fixtures"""
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from budget_core import Ledger  # noqa: E402
+
+CATEGORIES = ['Food', 'Transport', 'Entertainment', 'Utilities']
+# Over SUGGESTION_SCAN_LIMIT descriptions start with 'shop', so its
+# ranking is cached in SuggestionIndex.top and has to be kept up to date
+DESCRIPTIONS = ['Coffee', 'coffee  beans', 'Taxi home', 'Rent', 'Cinema'] + [f'Shop {n}' for n in range(260)]
+
+
+def random_expense(rng):
+    return (f"{rng.choice([2.5, 4.0, 10.0, 99.99])}", rng.choice(CATEGORIES), rng.choice(DESCRIPTIONS),
+            f"2024-{rng.randint(1, 4):02d}-{rng.randint(1, 28):02d}")
+
+
+@pytest.fixture
+def busy_ledger(tmp_path):
+    """A journal ledger of 600 random expenses"""
+    ledger = Ledger('journal', str(tmp_path / 'budget_data.json'), str(tmp_path / 'budget_data.db'), save_delay=0)
+    ledger.load()
+    rng = random.Random(7)
+    rows = [random_expense(rng) for _ in range(600)]
+    ledger.add_many([{'amount': float(amount), 'category': category, 'description': description, 'date': date}
+                     for amount, category, description, date in rows])
+    yield ledger
+    ledger.close()
+
+
+@pytest.fixture(params=[1, 2])
+def churned_ledger(busy_ledger, request):
+    """busy_ledger with every index built, then rows added and deleted through the ledger"""
+    ledger = busy_ledger
+    ledger.search_index()
+    ledger.id_index()
+    ledger.suggestion_index()
+    ledger.duplicate_index()
+    # Fills the cached ranking for the prefix
+    ledger.suggest('shop')
+    assert 'shop' in ledger.suggestions.top
+    rng = random.Random(request.param)
+    for _ in range(50):
+        ledger.add(*random_expense(rng))
+    for _ in range(30):
+        ledger.delete(rng.choice(ledger.expenses.rowids))
+    ledger.delete_many(rng.sample(list(ledger.expenses.rowids), 100))
+    ledger.add_many([{'amount': 1.0, 'category': 'Food', 'description': 'Shop 999', 'date': '2024-04-30'}])
+    return ledger
@@ -0,0 +1,41 @@
+import pytest
+
+from budget_analytics import Analytics
+
+pytest.importorskip('numpy')
+
+FILTERS = [{}, {'start': '2024-02-10', 'end': '2024-03-20'}, {'category': 'Food'},
+           {'start': '2024-03-01', 'category': 'Transport'}, {'category': 'Nothing'},
+           {'start': '2025-01-01'}]
+
+
+def both(ledger):
+    fast = Analytics(ledger.expenses)
+    assert fast.use_numpy
+    return fast, Analytics(ledger.expenses, use_numpy=False)
+
+
+def test_pivot_parity(churned_ledger):
+    fast, slow = both(churned_ledger)
+    for query in FILTERS:
+        query = {k: v for k, v in query.items() if k != 'category'}
+        # Both paths add the amounts in store order, so even the floats match
+        assert fast.category_month_pivot(**query) == slow.category_month_pivot(**query)
+
+
+@pytest.mark.parametrize('query', FILTERS)
+def test_percentiles_and_top_parity(churned_ledger, query):
+    fast, slow = both(churned_ledger)
+    assert fast.percentiles((0, 25, 50, 90, 100), **query) == slow.percentiles((0, 25, 50, 90, 100), **query)
+    # Many amounts tie, so this checks the older-first tie order too
+    for n in (1, 10, 1000):
+        assert fast.top_expenses(n, **query) == slow.top_expenses(n, **query)
+
+
+@pytest.mark.parametrize('query', FILTERS)
+def test_rolling_average_parity(churned_ledger, query):
+    fast, slow = both(churned_ledger)
+    for window in (1, 7, 30):
+        assert fast.rolling_average(window, **query) == slow.rolling_average(window, **query)
+    with pytest.raises(ValueError):
+        fast.rolling_average(0)
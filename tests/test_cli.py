@@ -0,0 +1,27 @@
+import sys
+
+import pytest
+
+import budget_cli
+
+
+def cli(tmp_path, *argv):
+    return budget_cli.main(['--backend', 'journal', '--data', str(tmp_path / 'budget_data.json'),
+                            '--db', str(tmp_path / 'budget_data.db')] + list(argv))
+
+
+def test_summary_chart(tmp_path, capsys):
+    pytest.importorskip('matplotlib')
+    assert cli(tmp_path, 'add', '12.50', 'food', 'Lunch', '--date', '2024-05-01') == 0
+    assert cli(tmp_path, 'summary', '--chart', str(tmp_path / 'chart.png')) == 0
+    assert (tmp_path / 'chart.png').stat().st_size > 0
+
+
+def test_summary_chart_without_matplotlib(tmp_path, capsys, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'matplotlib', None)
+    monkeypatch.setitem(sys.modules, 'matplotlib.figure', None)
+    assert cli(tmp_path, 'add', '12.50', 'food', 'Lunch', '--date', '2024-05-01') == 0
+    capsys.readouterr()
+    assert cli(tmp_path, 'summary', '--chart', str(tmp_path / 'chart.png')) == 1
+    assert capsys.readouterr().err == "error: matplotlib is required for --chart\n"
+    assert not (tmp_path / 'chart.png').exists()
@@ -0,0 +1,70 @@
+from budget_columns import ColumnarExpenses, day_ordinal
+from budget_duplicates import DuplicateIndex, duplicate_extras, find_duplicates
+from budget_search import normalize_description
+
+
+def expense(expense_id, amount, description, date, category='Food'):
+    return {'id': expense_id, 'amount': amount, 'category': category,
+            'description': description, 'date': date}
+
+
+def test_exact_copies_of_a_near_match_are_exact():
+    store = ColumnarExpenses([
+        expense(1, 5.0, "Starbucks Coffee", '2024-01-01'),
+        expense(2, 5.0, "Starbucks Coffee", '2024-01-02'),
+        expense(3, 5.0, "starbucks  coffee", '2024-01-02'),
+    ])
+    groups = find_duplicates(store)
+    assert groups == [([0, 1, 2], [2])]
+    assert duplicate_extras(groups, exact_only=True) == [2]
+    assert duplicate_extras(groups) == [1, 2]
+    assert find_duplicates(store, near=False) == [([1, 2], [2])]
+
+
+def test_exact_extras_match_grouping_by_key():
+    descriptions = ['Starbucks', 'STARBUCKS #12', 'Shell', 'Tesco', 'Rent']
+    amounts = [4.5, 4.55, 10.0, 50.0]
+    rows = [expense(k, amounts[k * 7 % 4], descriptions[k * 3 % 5], f'2024-01-{k % 9 + 1:02d}')
+            for k in range(300)]
+    keys = {(exp['date'], round(exp['amount'] * 100), exp['description'].lower()) for exp in rows}
+    for near in (True, False):
+        groups = find_duplicates(ColumnarExpenses(rows), near=near)
+        assert len(duplicate_extras(groups, exact_only=True)) == len(rows) - len(keys)
+        grouped = [rowid for rowids, _ in groups for rowid in rowids]
+        assert len(grouped) == len(set(grouped))
+
+
+def test_near_duplicates_within_the_window():
+    store = ColumnarExpenses([
+        expense(1, 12.50, "Lunch at Cafe", '2024-03-01'),
+        expense(2, 12.60, "Lunch at Cafe!", '2024-03-02'),
+        expense(3, 12.50, "Lunch at Cafe", '2024-03-10'),
+        expense(4, 40.00, "Taxi", '2024-03-01', 'Transport'),
+    ])
+    assert find_duplicates(store) == [([0, 1], [])]
+
+
+def test_duplicate_index_after_add_and_remove():
+    store = ColumnarExpenses([expense(1, 5.0, "Coffee", '2024-01-01')])
+    index = DuplicateIndex(store)
+    day = day_ordinal('2024-01-01')
+    assert index.lookup(day, 5.0, " COFFEE ") == (0,)
+    index.add(1, day, 5.0, "coffee")
+    assert index.lookup(day, 5.0, "Coffee") == (0, 1)
+    index.remove(0, day, 5.0, "Coffee")
+    assert index.lookup(day, 5.0, "Coffee") == (1,)
+    index.remove(1, day, 5.0, "coffee")
+    assert index.lookup(day, 5.0, "Coffee") == ()
+    assert index.lookup(day, 5.01, "Coffee") == ()
+
+
+def test_ledger_duplicate_index_after_add_and_delete(churned_ledger):
+    ledger = churned_ledger
+    assert ledger.duplicate_index().rowids == DuplicateIndex(ledger.expenses).rowids
+    exp = ledger.expenses.row(ledger.expenses.rowids[0])
+    found = ledger.exact_duplicates(exp['amount'], exp['category'], exp['description'].upper(), exp['date'])
+    assert exp in found
+    assert all(normalize_description(other['description']) == normalize_description(exp['description'])
+               and other['date'] == exp['date'] for other in found)
+    day = day_ordinal(exp['date'])
+    assert ledger.duplicate_index().lookup(day, exp['amount'] + 0.01, exp['description']) == ()
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+from budget_core import Ledger
+from budget_search import IdIndex
+from budget_storage import BACKENDS, IDS_SUFFIX
+
+
+def open_ledger(tmp_path, backend):
+    ledger = Ledger(backend, str(tmp_path / 'budget_data.json'), str(tmp_path / 'budget_data.db'), save_delay=0)
+    ledger.load()
+    ledger.ensure_loaded()
+    return ledger
+
+
+def ids(ledger):
+    return sorted(exp['id'] for exp in ledger.expenses)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_ids_are_never_reused(tmp_path, backend):
+    ledger = open_ledger(tmp_path, backend)
+    for day in range(1, 6):
+        ledger.add('1', 'Food', f'Lunch {day}', f'2024-01-0{day}')
+    ledger.delete(ledger.rowid_of(5))
+    ledger.delete_many([ledger.rowid_of(3), ledger.rowid_of(4)])
+    ledger.close()
+    ledger = open_ledger(tmp_path, backend)
+    assert ids(ledger) == [1, 2]
+    # 3 to 5 were used once, even though the highest id left is 2
+    ledger.add('1', 'Food', 'Dinner', '2024-01-06')
+    assert ids(ledger) == [1, 2, 6]
+    with pytest.raises(KeyError):
+        ledger.rowid_of(5)
+    ledger.close()
+
+
+def test_instances_sharing_a_ledger_never_share_ids(tmp_path):
+    first = open_ledger(tmp_path, 'journal')
+    second = open_ledger(tmp_path, 'journal')
+    for n in range(100):
+        (first if n % 3 else second).add('1', 'Food', f'Lunch {n}', '2024-01-01')
+    first.writer.flush()
+    second.writer.flush()
+    first.sync()
+    assert len(ids(first)) == len(set(ids(first))) == 100
+    first.close()
+    second.close()
+
+
+def test_ledgers_without_a_counter_continue_after_their_highest_id(tmp_path):
+    ledger = open_ledger(tmp_path, 'json')
+    for day in range(1, 4):
+        ledger.add('1', 'Food', f'Lunch {day}', f'2024-01-0{day}')
+    ledger.close()
+    # As left by a version from before the counter file
+    os.remove(str(tmp_path / 'budget_data.json') + IDS_SUFFIX)
+    ledger = open_ledger(tmp_path, 'json')
+    ledger.add('1', 'Food', 'Dinner', '2024-01-04')
+    assert ids(ledger) == [1, 2, 3, 4]
+    ledger.close()
+
+
+def test_id_index_after_add_and_delete(churned_ledger):
+    ledger = churned_ledger
+    assert ledger.id_index().rowids == IdIndex(ledger.expenses).rowids
+    for rowid in ledger.expenses.rowids:
+        assert ledger.rowid_of(ledger.expenses.row(rowid)['id']) == rowid
@@ -0,0 +1,144 @@
+import json
+import time
+
+import pytest
+
+import budget_io
+from budget_core import Ledger
+from budget_io import ExportJob, ImportJob, read_records
+
+STATEMENT = """Date,Description,Amount,Category
+2024-03-05,Coffee,$3.50,food
+2024-3-6,Taxi,"1,200",transport
+2024/03/07,Lunch,12,Food
+2024-03-08,,5,Food
+2024-03-09,Book,-1,Books
+,Bus,2,Transport
+"""
+
+
+def open_ledger(tmp_path):
+    ledger = Ledger('journal', str(tmp_path / 'budget_data.json'), str(tmp_path / 'budget_data.db'), save_delay=0)
+    ledger.load()
+    return ledger
+
+
+def contents(ledger):
+    return sorted((exp['date'], exp['description'], exp['amount'], exp['category'])
+                  for exp in ledger.expenses)
+
+
+def test_import_normalizes_dates_and_skips_invalid_rows(tmp_path):
+    path = tmp_path / 'statement.csv'
+    path.write_text(STATEMENT)
+    ledger = open_ledger(tmp_path)
+    rows, rejected = ledger.import_file(str(path), '2024-03-10')
+    assert rows == 3
+    # Slashed dates, empty descriptions and negative amounts are refused
+    assert [number for number, _ in rejected] == [3, 4, 5]
+    expected = [('2024-03-05', 'Coffee', 3.5, 'Food'),
+                ('2024-03-06', 'Taxi', 1200.0, 'Transport'),
+                ('2024-03-10', 'Bus', 2.0, 'Transport')]
+    assert contents(ledger) == expected
+    assert ledger.report('month') == [('2024-03', 3, 1205.5)]
+    ledger.close()
+    assert contents(open_ledger(tmp_path)) == expected
+
+
+def test_import_job_streams_batches_then_done(tmp_path):
+    path = tmp_path / 'statement.jsonl'
+    with open(path, 'w') as f:
+        for day in range(1, 6):
+            f.write(json.dumps({'Amount': day, 'Type': 'food', 'Memo': f'Lunch {day}',
+                                'Date': f'2024-05-0{day}'}) + '\n')
+        f.write(json.dumps({'Amount': 'n/a', 'Type': 'food', 'Memo': 'Bad'}) + '\n')
+    job = ImportJob(str(path), '2024-05-31', batch_size=2)
+    job.start()
+    batches = []
+    while True:
+        message = job.messages.get(timeout=5)
+        if message[0] == 'batch':
+            batches.append(message[1])
+        elif message[0] != 'progress':
+            break
+    assert message == ('done', 5, 1, False)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert batches[0][0] == {'amount': 1.0, 'category': 'Food', 'description': 'Lunch 1', 'date': '2024-05-01'}
+
+
+def test_import_job_stops_when_nobody_polls(tmp_path, monkeypatch):
+    monkeypatch.setattr(budget_io, 'FINAL_MESSAGE_WAIT', 0.2)
+    path = tmp_path / 'statement.csv'
+    path.write_text('amount,category,description\n' + '1,Food,Lunch\n' * 50)
+    job = ImportJob(str(path), '2024-05-31', batch_size=1)
+    job.start()
+    deadline = time.monotonic() + 5
+    while not job.messages.full():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    # The window was closed: cancelled, and the queue is never drained again
+    job.cancel()
+    job._thread.join(timeout=5)
+    assert not job._thread.is_alive()
+
+
+def filled_ledger(tmp_path):
+    tmp_path.mkdir()
+    ledger = open_ledger(tmp_path)
+    ledger.add_many([{'amount': float(day), 'category': 'Food' if day % 2 else 'Rent',
+                      'description': f'Caf\u00e9, day {day}', 'date': f'2024-04-{day:02d}'}
+                     for day in range(1, 29)])
+    return ledger
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.jsonl', '.btcol'])
+def test_export_round_trips_through_import(tmp_path, suffix):
+    ledger = filled_ledger(tmp_path / 'a')
+    path = str(tmp_path / ('export' + suffix))
+    assert ledger.export_file(path, '2024-04-10', '2024-04-20', 'food') == 5
+    assert sorted(int(record['id']) for record in read_records(path)) == [11, 13, 15, 17, 19]
+    (tmp_path / 'b').mkdir()
+    copy = open_ledger(tmp_path / 'b')
+    assert copy.import_file(path) == (5, [])
+    assert contents(copy) == [row for row in contents(ledger)
+                              if '2024-04-10' <= row[0] <= '2024-04-20' and row[3] == 'Food']
+
+
+def run_export(job, chunks):
+    job.start()
+    chunks = iter(chunks)
+    pending = next(chunks, None)
+    deadline = time.monotonic() + 5
+    while True:
+        while pending is not None and job.feed(pending):
+            pending = next(chunks, None)
+        if pending is None:
+            job.finish()
+        message = job.messages.get(timeout=5)
+        if message[0] != 'progress':
+            return message
+        assert time.monotonic() < deadline
+
+
+def test_export_job_writes_the_filtered_rows(tmp_path):
+    ledger = filled_ledger(tmp_path / 'a')
+    path = tmp_path / 'rent.csv'
+    job = ExportJob(str(path), category='Rent')
+    assert run_export(job, ledger.expenses.chunks(5)) == ('done', 14, False)
+    assert [record['category'] for record in read_records(str(path))] == ['Rent'] * 14
+
+
+def test_cancelled_export_job_writes_nothing_and_stops(tmp_path, monkeypatch):
+    monkeypatch.setattr(budget_io, 'FINAL_MESSAGE_WAIT', 0.2)
+    ledger = filled_ledger(tmp_path / 'a')
+    path = tmp_path / 'all.jsonl'
+    job = ExportJob(str(path))
+    job.start()
+    for chunk in ledger.expenses.chunks(2):
+        if not job.feed(chunk):
+            break
+    # Cancelled from a closed window: nothing reads the messages any more
+    job.cancel()
+    job._thread.join(timeout=5)
+    assert not job._thread.is_alive()
+    assert not path.exists() and not (tmp_path / 'all.jsonl.tmp').exists()
@@ -0,0 +1,33 @@
+from budget_columns import key_rowid
+from budget_search import SearchIndex
+
+SEARCHES = [{}, {'text': 'coffee'}, {'text': 'sho'}, {'text': 'shop 1'}, {'category': 'Food'},
+            {'start': '2024-02-01', 'end': '2024-03-31'}, {'text': 'c', 'category': 'Entertainment'}]
+
+
+def test_search_index_after_add_and_delete(churned_ledger):
+    ledger = churned_ledger
+    fresh = SearchIndex(ledger.expenses)
+    kept = ledger.search_index()
+    assert list(kept.keys) == list(fresh.keys)
+    for query in SEARCHES:
+        assert list(kept.search(**query)) == list(fresh.search(**query))
+    assert list(ledger.search('shop 999')) == list(fresh.search('shop 999'))
+    assert len(ledger.search('shop 999')) == 1
+
+
+def test_search_matches_words_in_any_order_and_a_last_prefix(busy_ledger):
+    ledger = busy_ledger
+    ledger.add('3', 'Food', 'Coffee at the station', '2024-05-02')
+    found = [ledger.expenses.row(key_rowid(key)) for key in ledger.search('station cof')]
+    assert [exp['description'] for exp in found] == ['Coffee at the station']
+    assert not ledger.search('stat coffee')
+    assert not ledger.search('coffee', category='Transport', start='2024-05-01')
+
+
+def test_load_resets_indexes(churned_ledger):
+    ledger = churned_ledger
+    expected = sorted(exp['id'] for exp in ledger.expenses)
+    ledger.load()
+    assert ledger.index is ledger.by_id is ledger.suggestions is ledger.duplicates is None
+    assert sorted(exp['id'] for exp in ledger.expenses) == expected
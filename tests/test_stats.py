@@ -0,0 +1,109 @@
+import random
+from datetime import date
+
+import pytest
+
+from budget_columns import day_ordinal
+from budget_stats import PrefixSums, SummaryAggregates, period_ranges
+
+DAY = day_ordinal('2024-01-01')
+
+
+def brute_total(days, first, last):
+    picked = [(amount, count) for day, amount, count in days
+              if (first is None or day >= first) and (last is None or day <= last)]
+    return sum(amount for amount, _ in picked), sum(count for _, count in picked)
+
+
+def test_prefix_sums_match_a_brute_force_total():
+    rng = random.Random(5)
+    sums = PrefixSums()
+    days = []
+    # Days arrive out of order, so the trees grow both ways
+    for _ in range(400):
+        day = DAY + rng.randint(-200, 200)
+        amount = rng.choice([1.0, 2.5, 10.0])
+        sums.add(day, amount)
+        days.append((day, amount, 1))
+        if rng.random() < 0.3:
+            day, amount, _ = days.pop(rng.randrange(len(days)))
+            sums.add(day, -amount, -1)
+    for _ in range(200):
+        first = rng.choice([None, DAY + rng.randint(-250, 250)])
+        last = rng.choice([None, DAY + rng.randint(-250, 250)])
+        amount, count = sums.total(first, last)
+        expected_amount, expected_count = brute_total(days, first, last)
+        assert count == expected_count
+        assert amount == pytest.approx(expected_amount)
+
+
+def test_prefix_sums_build_matches_adds():
+    built = PrefixSums({DAY: 5.0, DAY + 3: 2.0}, {DAY: 2, DAY + 3: 1})
+    added = PrefixSums()
+    for day, amount in ((DAY + 3, 2.0), (DAY, 3.0), (DAY, 2.0)):
+        added.add(day, amount)
+    for first, last in ((None, None), (DAY, DAY), (DAY + 1, DAY + 3), (DAY + 4, None), (None, DAY - 1)):
+        assert built.total(first, last) == added.total(first, last)
+    assert built.total(DAY + 1, DAY + 2) == (0.0, 0)
+
+
+def test_period_ranges_clip_to_the_range():
+    first, last = day_ordinal('2024-02-27'), day_ordinal('2024-03-05')
+    assert [(label, date.fromordinal(lo).isoformat(), date.fromordinal(hi).isoformat())
+            for label, lo, hi in period_ranges('week', first, last)] == [
+        ('2024-W09', '2024-02-27', '2024-03-03'), ('2024-W10', '2024-03-04', '2024-03-05')]
+    assert [label for label, _, _ in period_ranges('month', first, last)] == ['2024-02', '2024-03']
+    assert [label for label, _, _ in period_ranges('year', day_ordinal('2023-12-31'), last)] == ['2023', '2024']
+    assert len(list(period_ranges('day', first, last))) == 8
+    with pytest.raises(ValueError):
+        list(period_ranges('fortnight', first, last))
+
+
+def rollup_by_hand(expenses, label_of, start, end):
+    rows = {}
+    for exp in expenses:
+        if start <= exp['date'] <= end:
+            count, amount = rows.get(label_of(exp['date']), (0, 0.0))
+            rows[label_of(exp['date'])] = (count + 1, amount + exp['amount'])
+    return sorted((label, count, amount) for label, (count, amount) in rows.items())
+
+
+def week_label(text):
+    year, week, _ = date.fromisoformat(text).isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+@pytest.mark.parametrize('period, label_of', [('day', lambda text: text), ('week', week_label),
+                                              ('month', lambda text: text[:7]), ('year', lambda text: text[:4])])
+def test_rollups_after_add_and_delete(churned_ledger, period, label_of):
+    stats = churned_ledger.stats
+    expenses = list(churned_ledger.expenses)
+    assert stats.verify(churned_ledger.expenses) == []
+    for start, end in (('2024-01-01', '2024-12-31'), ('2024-02-10', '2024-03-20')):
+        rows = stats.rollup(period, start, end)
+        expected = rollup_by_hand(expenses, label_of, start, end)
+        assert [(label, count) for label, count, _ in rows] == [(label, count) for label, count, _ in expected]
+        assert [amount for _, _, amount in rows] == pytest.approx([amount for _, _, amount in expected])
+
+
+def test_range_category_totals(churned_ledger):
+    stats = churned_ledger.stats
+    start, end = '2024-02-10', '2024-03-20'
+    expected = {}
+    for exp in churned_ledger.expenses:
+        if start <= exp['date'] <= end:
+            amount, count = expected.get(exp['category'], (0.0, 0))
+            expected[exp['category']] = (amount + exp['amount'], count + 1)
+    totals = stats.range_category_totals(start, end)
+    assert sorted(totals) == sorted(expected)
+    for category, (amount, count) in totals.items():
+        assert count == expected[category][1]
+        assert amount == pytest.approx(expected[category][0])
+    assert stats.range_total(start, end)[1] == sum(count for _, count in expected.values())
+
+
+def test_columns_and_dicts_build_the_same_aggregates(churned_ledger):
+    from_columns = SummaryAggregates(churned_ledger.expenses)
+    from_dicts = SummaryAggregates(list(churned_ledger.expenses))
+    assert from_columns.verify(list(churned_ledger.expenses)) == []
+    assert from_columns.rollup('month') == pytest.approx(from_dicts.rollup('month'))
@@ -0,0 +1,228 @@
+import errno
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import date
+
+import pytest
+
+import budget_storage
+from budget_core import Ledger
+from budget_snapshot import read_snapshot
+from budget_storage import BACKENDS, convert_ledger
+
+EXPENSES = [
+    ('12.50', 'Food', 'Lunch at Cafe', '2023-06-01'),
+    ('40', 'Transport', 'Taxi', '2024-01-15'),
+    ('9.99', 'Entertainment', 'Cinema ticket', '2024-02-03'),
+    ('1200', 'Utilities', 'Rent', '2024-02-28'),
+]
+
+
+def open_ledger(tmp_path, backend):
+    ledger = Ledger(backend, str(tmp_path / 'budget_data.json'), str(tmp_path / 'budget_data.db'), save_delay=0)
+    ledger.load()
+    # A partitioned ledger starts with this year only
+    ledger.ensure_loaded()
+    return ledger
+
+
+def contents(ledger):
+    return sorted((exp['id'], exp['amount'], exp['category'], exp['description'], exp['date'])
+                  for exp in ledger.expenses)
+
+
+def descriptions(ledger):
+    return sorted(exp['description'] for exp in ledger.expenses)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_round_trip(tmp_path, backend):
+    ledger = open_ledger(tmp_path, backend)
+    for amount, category, description, date in EXPENSES:
+        ledger.add(amount, category, description, date)
+    ledger.add_many([{'amount': 3.0, 'category': 'Books', 'description': 'Novel', 'date': '2024-03-01'}])
+    ledger.delete(ledger.rowid_of(2))
+    ledger.delete_many([ledger.rowid_of(1), ledger.rowid_of(4)])
+    expected = contents(ledger)
+    ledger.close()
+
+    reopened = open_ledger(tmp_path, backend)
+    assert contents(reopened) == expected == [
+        (3, 9.99, 'Entertainment', 'Cinema ticket', '2024-02-03'),
+        (5, 3.0, 'Books', 'Novel', '2024-03-01'),
+    ]
+    assert 'Books' in reopened.categories
+    reopened.close()
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_full_save_then_delete(tmp_path, backend):
+    ledger = open_ledger(tmp_path, backend)
+    for amount, category, description, date in EXPENSES:
+        ledger.add(amount, category, description, date)
+    ledger.save()
+    ledger.delete(ledger.rowid_of(3))
+    expected = contents(ledger)
+    ledger.close()
+    assert contents(open_ledger(tmp_path, backend)) == expected
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_sync_converges(tmp_path, backend):
+    first = open_ledger(tmp_path, backend)
+    for amount, category, description, date in EXPENSES:
+        first.add(amount, category, description, date)
+    first.writer.flush()
+    second = open_ledger(tmp_path, backend)
+    assert contents(second) == contents(first)
+    assert second.sync() is None
+
+    first.add('5', 'Books', 'Novel', '2024-01-20')
+    first.delete(first.rowid_of(1))
+    second.add('7.25', 'Food', 'Bakery', '2024-02-10')
+    second.delete_many([second.rowid_of(4)])
+    for _ in range(2):
+        for ledger in (first, second):
+            ledger.writer.flush()
+            ledger.sync()
+
+    assert contents(first) == contents(second)
+    assert descriptions(first) == ['Bakery', 'Cinema ticket', 'Novel', 'Taxi']
+    # Ids handed out by the two instances don't collide
+    assert len({exp[0] for exp in contents(first)}) == 4
+    # Totals follow the merged rows
+    assert first.summary()[0] == pytest.approx(sum(exp[1] for exp in contents(first)))
+    first.close()
+    second.close()
+    assert contents(open_ledger(tmp_path, backend)) == contents(first)
+
+def test_journal_replays_on_load_and_ignores_a_torn_write(tmp_path):
+    ledger = open_ledger(tmp_path, 'journal')
+    for amount, category, description, date in EXPENSES:
+        ledger.add(amount, category, description, date)
+    ledger.delete(ledger.rowid_of(2))
+    ledger.writer.flush()
+    journal = tmp_path / 'budget_data.json.journal'
+    assert journal.exists()
+    # A crash part way through an append leaves half a line behind
+    with open(journal, 'a') as f:
+        f.write('{"op": "add", "expense": {"id": 9')
+    reopened = open_ledger(tmp_path, 'journal')
+    assert descriptions(reopened) == ['Cinema ticket', 'Lunch at Cafe', 'Rent']
+    reopened.close()
+    ledger.close()
+
+
+def test_journal_is_folded_into_the_snapshot(tmp_path):
+    ledger = open_ledger(tmp_path, 'journal')
+    for amount, category, description, date in EXPENSES:
+        ledger.add(amount, category, description, date)
+    ledger.close()
+    # close() folds the journal back into the JSON file
+    with open(tmp_path / 'budget_data.json') as f:
+        saved = json.load(f)['expenses']
+    assert sorted(exp['description'] for exp in saved) == sorted(exp[2] for exp in EXPENSES)
+
+
+def test_sqlite_migrates_a_json_ledger_once(tmp_path):
+    ledger = open_ledger(tmp_path, 'json')
+    for amount, category, description, date in EXPENSES:
+        ledger.add(amount, category, description, date)
+    expected = contents(ledger)
+    ledger.close()
+    migrated = open_ledger(tmp_path, 'sqlite')
+    assert contents(migrated) == expected
+    migrated.delete(migrated.rowid_of(1))
+    migrated.close()
+    # The database is the ledger from now on, not the JSON file
+    assert contents(open_ledger(tmp_path, 'sqlite')) == expected[1:]
+    with sqlite3.connect(tmp_path / 'budget_data.db') as db:
+        indexes = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_expenses_date', 'idx_expenses_category'} <= indexes
+
+
+def test_replace_atomic_keeps_the_original_error(tmp_path, monkeypatch):
+    def no_space(*args, **kwargs):
+        raise OSError(errno.ENOSPC, 'No space left on device')
+    monkeypatch.setattr(budget_storage, 'open', no_space, raising=False)
+    # The temp file was never created, so cleanup must not mask the real error
+    with pytest.raises(OSError) as excinfo:
+        budget_storage.write_atomic(str(tmp_path / 'budget_data.json'), {})
+    assert excinfo.value.errno == errno.ENOSPC
+
+
+def test_partitions_load_on_demand(tmp_path):
+    this_year = str(date.today().year)
+    ledger = open_ledger(tmp_path, 'partitioned')
+    for amount, category, description, day in EXPENSES:
+        ledger.add(amount, category, description, day)
+    ledger.add('20', 'Food', 'Groceries', this_year + '-01-02')
+    expected = contents(ledger)
+    ledger.close()
+    names = sorted(os.listdir(tmp_path))
+    assert {'budget_data.2023.json', 'budget_data.2024.json', f'budget_data.{this_year}.json',
+            'budget_data.manifest.json'} <= set(names)
+
+    ledger = Ledger('partitioned', str(tmp_path / 'budget_data.json'), str(tmp_path / 'budget_data.db'), save_delay=0)
+    ledger.load()
+    # Only this year is read; the older years are answered from the manifest
+    assert descriptions(ledger) == ['Groceries']
+    assert ledger.count() == 5
+    assert ledger.summary()[0] == pytest.approx(sum(exp[1] for exp in expected))
+    assert [row[0] for row in ledger.report('year')] == ['2023', '2024', this_year]
+    ledger.ensure_loaded('2024-01-01', '2024-12-31')
+    assert descriptions(ledger) == ['Cinema ticket', 'Groceries', 'Rent', 'Taxi']
+    ledger.delete(ledger.rowid_of(2))
+    ledger.close()
+
+    ledger = open_ledger(tmp_path, 'partitioned')
+    assert contents(ledger) == [exp for exp in expected if exp[0] != 2]
+
+
+def test_snapshot_conversion_is_lossless(tmp_path):
+    ledger = open_ledger(tmp_path, 'json')
+    for amount, category, description, day in EXPENSES:
+        ledger.add(amount, category, description, day)
+    ledger.add_many([{'amount': 0.1 + 0.2, 'category': 'Caf\u00e9s', 'description': 'Flat white \u2615, "to go"',
+                      'date': '1999-12-31'},
+                     {'amount': 12345678.91, 'category': 'Travel', 'description': '\u6771\u4eac', 'date': '2099-01-01'}])
+    ledger.delete(ledger.rowid_of(2))
+    ledger.categories.add('Unused')
+    ledger.save()
+    expected, categories = contents(ledger), sorted(ledger.categories)
+    ledger.close()
+
+    snapshot = str(tmp_path / 'copy.btsnap')
+    assert convert_ledger(str(tmp_path / 'budget_data.json'), snapshot) == 5
+    expenses, snapshot_categories, _ = read_snapshot(snapshot)
+    assert sorted(snapshot_categories) == categories
+    assert sorted((exp['id'], exp['amount'], exp['category'], exp['description'], exp['date'])
+                  for exp in expenses) == expected
+    # And back again through the command line converter
+    back = tmp_path / 'back'
+    back.mkdir()
+    result = subprocess.run([sys.executable, budget_storage.__file__, snapshot, str(back / 'budget_data.json')],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith('Converted 5 expenses')
+    ledger = open_ledger(back, 'json')
+    assert contents(ledger) == expected
+    assert sorted(ledger.categories) == categories
+    # Never overwrites an existing ledger
+    with pytest.raises(FileExistsError):
+        convert_ledger(snapshot, str(back / 'budget_data.json'))
+
+
+def test_truncated_snapshot_is_rejected(tmp_path):
+    ledger = open_ledger(tmp_path, 'binary')
+    for amount, category, description, day in EXPENSES:
+        ledger.add(amount, category, description, day)
+    ledger.close()
+    path = tmp_path / 'budget_data.btsnap'
+    data = path.read_bytes()
+    path.write_bytes(data[:-5])
+    with pytest.raises(ValueError):
+        read_snapshot(str(path))
@@ -0,0 +1,39 @@
+from budget_search import SuggestionIndex
+
+PREFIXES = ['c', 'co', 'coffee ', 'shop', 'shop 2', 'sh', 'r', 'taxi']
+
+
+def test_suggestion_index_after_add_and_delete(churned_ledger):
+    ledger = churned_ledger
+    fresh = SuggestionIndex(ledger.expenses)
+    kept = ledger.suggestion_index()
+    assert kept.keys == fresh.keys
+    for prefix in PREFIXES:
+        assert kept.suggest(prefix) == fresh.suggest(prefix)
+    for description in ['Coffee', 'coffee  beans', 'Taxi home', 'Rent', 'Cinema']:
+        assert kept.recent_rows(description, 5) == fresh.recent_rows(description, 5)
+
+
+def test_usual_expense(busy_ledger):
+    ledger = busy_ledger
+    for amount, category, date in (('3', 'Food', '2024-05-01'), ('4', 'Drinks', '2024-05-02'),
+                                   ('4', 'Drinks', '2024-05-03'), ('5', 'Drinks', '2024-05-04')):
+        ledger.add(amount, category, 'Flat white', date)
+    assert ledger.usual_expense('flat  WHITE') == ('Drinks', 4.0)
+    assert ledger.usual_expense('Espresso') is None
+
+
+def test_lookups_without_building_wait_for_an_adopted_index(busy_ledger):
+    ledger = busy_ledger
+    index = SuggestionIndex(ledger.expenses.copy())
+    assert ledger.suggest('coff', build=False) == []
+    assert ledger.usual_expense('Coffee', build=False) is None
+    assert ledger.suggestions is None
+    # Built from expenses that have changed since: not adopted
+    ledger.add('2', 'Food', 'Coffee to go', '2024-05-01')
+    ledger.adopt_suggestion_index(index, ledger.stats.version - 1)
+    assert ledger.suggestions is None
+    ledger.adopt_suggestion_index(SuggestionIndex(ledger.expenses.copy()), ledger.stats.version)
+    assert ledger.suggest('coff', build=False) == ledger.suggest('coff')
+    assert 'Coffee to go' in ledger.suggest('coff', build=False)
+    assert ledger.usual_expense('Coffee to go', build=False) == ('Food', 2.0)
@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from budget_tasks import TaskRunner
+
+
+def wait(runner):
+    deadline = time.monotonic() + 5
+    while runner.poll():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_results_come_back_through_poll():
+    runner = TaskRunner()
+    results = []
+    runner.submit('sum', lambda cancelled, a, b: a + b, 2, 3, on_done=results.append)
+    assert runner.pending('sum')
+    wait(runner)
+    assert results == [5]
+    assert not runner.pending()
+    runner.shutdown()
+
+
+def test_resubmitting_cancels_the_older_task():
+    runner = TaskRunner()
+    started = threading.Event()
+    seen = []
+
+    def slow(cancelled):
+        started.set()
+        cancelled.wait(5)
+        return 'old' if not cancelled.is_set() else 'cancelled'
+
+    runner.submit('job', slow, on_done=seen.append)
+    started.wait(5)
+    runner.submit('job', lambda cancelled: 'new', on_done=seen.append)
+    wait(runner)
+    assert seen == ['new']
+    runner.shutdown()
+
+
+def test_errors_go_to_on_error_or_are_raised():
+    runner = TaskRunner()
+    errors = []
+
+    def fail(cancelled):
+        raise ValueError('bad')
+
+    runner.submit('a', fail, on_done=errors.append, on_error=errors.append)
+    wait(runner)
+    assert isinstance(errors[0], ValueError)
+    runner.submit('b', fail, on_done=errors.append)
+    with pytest.raises(ValueError):
+        wait(runner)
+    runner.shutdown()
+
+
+def test_a_queued_task_is_dropped_when_cancelled():
+    runner = TaskRunner(workers=1)
+    release = threading.Event()
+    ran = []
+    runner.submit('busy', lambda cancelled: release.wait(5), on_done=ran.append)
+    runner.submit('queued', lambda cancelled: ran.append('queued'), on_done=ran.append)
+    runner.cancel('queued')
+    assert not runner.pending('queued')
+    release.set()
+    wait(runner)
+    assert ran == [True]
+    runner.shutdown()
+
+
+def test_tasks_with_different_names_all_finish():
+    runner = TaskRunner()
+    results = {}
+    for name in ('summary', 'chart', 'suggestions'):
+        runner.submit(name, lambda cancelled, name: name.upper(), name,
+                      on_done=lambda result, name=name: results.__setitem__(name, result))
+    wait(runner)
+    assert results == {'summary': 'SUMMARY', 'chart': 'CHART', 'suggestions': 'SUGGESTIONS'}
+    runner.shutdown()
+
+
+def test_shutdown_tells_running_tasks_and_skips_their_callbacks():
+    runner = TaskRunner()
+    started = threading.Event()
+    stopped = threading.Event()
+    seen = []
+
+    def loop(cancelled):
+        started.set()
+        while not cancelled.wait(0.01):
+            pass
+        stopped.set()
+
+    runner.submit('loop', loop, on_done=seen.append)
+    started.wait(5)
+    runner.shutdown()
+    assert stopped.wait(5)
+    assert not runner.poll()
+    assert seen == []
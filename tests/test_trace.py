@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import budget_cli
+import budget_trace
+from budget_trace import NULL_SPAN, TRACER, Tracer
+
+
+@pytest.fixture
+def quiet_tracer(monkeypatch):
+    """Puts the shared TRACER back the way it was after the test"""
+    for name, value in (('enabled', False), ('keep_events', False), ('totals', {}),
+                        ('recent', {}), ('events', []), ('dropped', 0)):
+        monkeypatch.setattr(TRACER, name, value)
+    return TRACER
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+
+    def add(a, b):
+        return a + b
+    assert tracer.span('work') is NULL_SPAN
+    assert tracer.wrap(add) is add
+    with tracer.span('work'):
+        pass
+    assert tracer.totals == {} and tracer.events == []
+
+
+def test_spans_are_counted_and_reported():
+    tracer = Tracer()
+    tracer.enable()
+    for _ in range(3):
+        with tracer.span('fast'):
+            pass
+    traced = tracer.wrap(lambda: 'ok', 'slow')
+    assert traced() == 'ok'
+    tracer.record('slow', 0.0, 0.5)
+    assert tracer.totals['fast'][0] == 3
+    count, total, longest = tracer.totals['slow']
+    assert count == 2 and longest == 0.5 and total >= 0.5
+    assert tracer.events == []
+    assert set(tracer.take_recent()) == {'fast', 'slow'}
+    assert tracer.recent == {} and set(tracer.totals) == {'fast', 'slow'}
+    lines = tracer.report().splitlines()
+    assert lines[0].split() == ['Span', 'Count', 'Total', 'ms', 'Mean', 'ms', 'Max', 'ms']
+    # Most total time first
+    assert [line.split()[0] for line in lines[1:]] == ['slow', 'fast']
+
+
+def test_chrome_trace(tmp_path, monkeypatch):
+    monkeypatch.setattr(budget_trace, 'MAX_EVENTS', 2)
+    tracer = Tracer()
+    tracer.enable(keep_events=True)
+    for name in ('first', 'second', 'third'):
+        with tracer.span(name):
+            pass
+    path = tmp_path / 'trace.json'
+    tracer.write_chrome_trace(str(path))
+    with open(path) as f:
+        trace = json.load(f)
+    assert [event['name'] for event in trace['traceEvents']] == ['first', 'second']
+    assert all(event['ph'] == 'X' and event['dur'] >= 0 for event in trace['traceEvents'])
+    assert trace['traceEvents'][0]['ts'] <= trace['traceEvents'][1]['ts']
+    assert trace['otherData'] == {'dropped_events': 1}
+    assert tracer.totals['third'][0] == 1
+
+
+def test_cli_trace_file(tmp_path, capsys, quiet_tracer):
+    path = tmp_path / 'trace.json'
+    assert budget_cli.main(['--backend', 'journal', '--data', str(tmp_path / 'budget_data.json'),
+                            '--trace-file', str(path), 'search', 'coffee']) == 0
+    report = capsys.readouterr().err
+    assert report.startswith('Span')
+    with open(path) as f:
+        names = {event['name'] for event in json.load(f)['traceEvents']}
+    assert 'storage.load' in names
+    assert all(name in report for name in names)